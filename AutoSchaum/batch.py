@@ -0,0 +1,180 @@
+""" Solves many netlists at once in a pool of worker processes and streams one JSON result per circuit.
+        python batch.py resources/*.crt
+        python batch.py --processes 8 --timeout 30 --mode numeric 'homework/*.crt' > results.jsonl
+    Each result is a JSON object on its own line. A netlist that fails or runs past its timeout is reported with its
+    status and error rather than stopping the batch
+"""
+import argparse
+import glob
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+import traceback
+
+import cache
+import helper_funcs
+import solver
+
+OK = 'ok'
+ERROR = 'error'
+TIMEOUT = 'timeout'
+
+topology_cache = cache.TopologyCache()  # one per worker process, shared by every netlist the worker solves
+
+
+class SolveTimeout(BaseException):
+    pass  # not an Exception, so a broad except inside sympy cannot swallow it
+
+
+def expand_netlists(patterns):
+    """
+    :type patterns: list[str]
+    :param patterns: netlist filenames, glob patterns or directories (every .crt file directly inside is taken)
+    :return: the matching filenames in the order given, each once
+    :rtype: list[str]
+    """
+    filenames = []
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(glob.glob(os.path.join(pattern, '*.crt')))
+        else:
+            matches = sorted(glob.glob(pattern)) or [pattern]  # a missing file is reported as an error by its result
+        for filename in matches:
+            if filename not in seen:
+                seen.add(filename)
+                filenames.append(filename)
+    return filenames
+
+
+def node_voltages(my_solver):
+    """
+    :return: the voltage of every node whose voltage was found, keyed by V(<node_num>). Only the results recorded on
+        the steps are read, so this works for a solver loaded from a cache.SolutionCache
+    :rtype: dict[str, complex]
+    """
+    step = my_solver.solution[-1]
+    if my_solver.mode == 'numeric':
+        return dict((helper_funcs.voltage_name(name), complex(voltage))
+                    for name, voltage in zip(step.node_names, step.node_voltages))
+    voltages = {}
+    for replayed_step, known_voltages, known_currents in my_solver.replay():
+        voltages = known_voltages
+    voltages = dict((helper_funcs.voltage_name(node_num), complex(voltage)) for node_num, voltage in voltages.items())
+    voltages.update((str(var), complex(value)) for var, value in step.solved_subbed_eq.items())
+    return voltages
+
+
+def _raise_timeout(signum, frame):
+    raise SolveTimeout()
+
+
+def solve_netlist(filename, mode='symbolic', timeout=None, cache_dir=None):
+    """
+    Solves a single netlist. Never raises: failures are reported in the result so one bad netlist cannot stop a batch.
+    Netlists sharing a topology with one already solved in this process only have their values evaluated
+    :type filename: str
+    :type mode: str
+    :param mode: the Solver mode
+    :type timeout: float
+    :param timeout: seconds the solve may take before it is abandoned. Enforced with SIGALRM, so only on platforms
+        that have it and only in the main thread of the process
+    :type cache_dir: str
+    :param cache_dir: directory of a cache.SolutionCache to look the solution up in and store it in
+    :return: the JSON ready result, with the netlist, status, seconds taken and either the node voltages as
+        [real, imag] pairs or the error
+    :rtype: dict
+    """
+    result = {'netlist': filename, 'mode': mode}
+    start = time.time()
+    alarm = timeout and hasattr(signal, 'setitimer')
+    if alarm:
+        previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        if cache_dir is None:
+            my_solver = solver.Solver(solver.prepare_circuit(filename, mode), mode=mode, keep_history=False,
+                                      topology_cache=topology_cache)
+            my_solver.solve()
+        else:
+            my_solver = cache.SolutionCache(cache_dir).solve(filename, mode)
+        voltages = node_voltages(my_solver)
+        result['status'] = OK
+        result['node_voltages'] = dict((name, [value.real, value.imag]) for name, value in voltages.items())
+    except SolveTimeout:
+        result['status'] = TIMEOUT
+        result['error'] = 'no solution after {0} s'.format(timeout)
+    except Exception as e:
+        result['status'] = ERROR
+        result['error'] = '{0}: {1}'.format(type(e).__name__, e)
+        result['traceback'] = traceback.format_exc()
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+    result['seconds'] = time.time() - start
+    return result
+
+
+def _solve_task(task):
+    return solve_netlist(*task)
+
+
+def solve_netlists(filenames, mode='symbolic', processes=None, timeout=None, ordered=False, maxtasksperchild=100,
+                   cache_dir=None):
+    """
+    Solves many netlists in a pool of worker processes
+    :type filenames: list[str]
+    :type processes: int
+    :param processes: size of the pool, one per CPU if None. With 1 every netlist is solved in this process
+    :type timeout: float
+    :param timeout: seconds each netlist may take, see solve_netlist
+    :type ordered: bool
+    :param ordered: yield the results in the order of filenames rather than as soon as each is done
+    :type maxtasksperchild: int
+    :param maxtasksperchild: netlists a worker solves before it is replaced, which bounds the memory a worker can
+        hold on to (sympy caches grow with every circuit)
+    :type cache_dir: str
+    :param cache_dir: see solve_netlist. Workers share the cache directory
+    :return: yields the result of solve_netlist for each netlist
+    :rtype: collections.Iterable[dict]
+    """
+    tasks = [(filename, mode, timeout, cache_dir) for filename in filenames]
+    if processes == 1:
+        for result in itertools.imap(_solve_task, tasks):
+            yield result
+        return
+    pool = multiprocessing.Pool(processes, maxtasksperchild=maxtasksperchild)
+    try:
+        mapper = pool.imap if ordered else pool.imap_unordered
+        for result in mapper(_solve_task, tasks, chunksize=1):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve many netlists and print one JSON result per line")
+    parser.add_argument('netlists', nargs='+', help="netlist files, glob patterns or directories of .crt files")
+    parser.add_argument('--mode', choices=['symbolic', 'numeric'], default='symbolic')
+    parser.add_argument('--processes', type=int, default=None, help="worker processes, one per CPU by default")
+    parser.add_argument('--timeout', type=float, default=None, help="seconds allowed per netlist")
+    parser.add_argument('--ordered', action='store_true', help="print results in the order the netlists were given")
+    parser.add_argument('--cache', default=None, help="directory of a solution cache shared across runs")
+    args = parser.parse_args(argv)
+    failed = 0
+    for result in solve_netlists(expand_netlists(args.netlists), args.mode, args.processes, args.timeout,
+                                 args.ordered, cache_dir=args.cache):
+        failed += result['status'] != OK
+        sys.stdout.write(json.dumps(result, sort_keys=True) + '\n')
+        sys.stdout.flush()
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,3 @@
+""" Benchmarks for AutoSchaum. Each benchmark is a module run from the AutoSchaum directory, for example:
+        python -m benchmarks.bench_cursors
+"""
@@ -0,0 +1,42 @@
+""" Times a depth first walk of a Cursor over every component of ladders of growing length. The time per
+    component should stay flat as the ladder grows, i.e. a traversal is linear in the size of the circuit.
+        python -m benchmarks.bench_cursors
+"""
+import time
+
+import cursors
+import generators
+
+LENGTHS = [1000, 2000, 4000, 8000, 16000]
+
+
+def walk(start_node):
+    """
+    Visits every component reachable from start_node
+    :return: the number of steps taken
+    """
+    cursor = cursors.Cursor(start_node)
+    steps = 0
+    while True:
+        if cursor.unseen_connected():
+            cursor.step_down_unseen_comp()
+        elif cursor.breadcrumbs:
+            cursor.step_back()
+        else:
+            break
+        steps += 1
+    return steps
+
+
+def main():
+    print("{0:>8} {1:>11} {2:>10} {3:>16}".format("length", "components", "seconds", "us per component"))
+    for length in LENGTHS:
+        ladder = generators.build_circuit(generators.ladder(length))
+        start = time.time()
+        walk(ladder.nodedict[0])
+        elapsed = time.time() - start
+        num_comps = len(ladder.component_list)
+        print("{0:>8} {1:>11} {2:>10.4f} {3:>16.2f}".format(length, num_comps, elapsed, 1e6*elapsed/num_comps))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+""" Times a cold import of the modules a headless solve needs, each in a fresh interpreter, and guards that none of
+    the heavy optional modules (drawing, plotting, symbolic algebra) are loaded along the way. Exits with status 1 if
+    one of them is.
+        python -m benchmarks.bench_import
+"""
+import os
+import subprocess
+import sys
+import time
+
+HEADLESS_MODULES = ['circuit', 'solver']
+FORBIDDEN_MODULES = ['SchemDraw', 'matplotlib', 'sympy']
+RUNS = 5
+
+SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def loaded_modules(modules):
+    """
+    Imports modules in a fresh interpreter
+    :type modules: list[str]
+    :return: the names of the top level packages that ended up loaded
+    :rtype: set[str]
+    """
+    script = "import sys\nimport {0}\nprint('\\n'.join(sys.modules))".format(", ".join(modules))
+    output = subprocess.check_output([sys.executable, '-c', script], cwd=SOURCE_DIR)
+    return set(line.split('.')[0] for line in output.decode().split())
+
+
+def forbidden_imports(modules=HEADLESS_MODULES):
+    """
+    :return: the forbidden modules loaded by importing modules
+    :rtype: list[str]
+    """
+    loaded = loaded_modules(modules)
+    return [module for module in FORBIDDEN_MODULES if module in loaded]
+
+
+def import_time(modules):
+    """
+    :return: the best wall time over RUNS of starting an interpreter and importing modules
+    :rtype: float
+    """
+    best = float('inf')
+    for run in range(RUNS):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', "import {0}".format(", ".join(modules))], cwd=SOURCE_DIR)
+        best = min(best, time.time() - start)
+    return best
+
+
+def main():
+    print("{0:>24} {1:>10}".format("imports", "seconds"))
+    for modules in [[], HEADLESS_MODULES, HEADLESS_MODULES + ['drawer']]:
+        print("{0:>24} {1:>10.4f}".format(", ".join(modules) or "(interpreter)", import_time(modules or ['sys'])))
+    forbidden = forbidden_imports()
+    if forbidden:
+        print("Importing {0} loads {1}".format(", ".join(HEADLESS_MODULES), ", ".join(forbidden)))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+""" Measures the memory a circuit takes per component once its nodes are populated, for ladders of growing length.
+    Each size is loaded in a fresh interpreter so that its peak resident size is not polluted by the others.
+        python -m benchmarks.bench_memory
+"""
+import os
+import resource
+import subprocess
+import sys
+
+LENGTHS = [10000, 100000, 300000]
+SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_kb():
+    """
+    :return: peak resident set size of this process in kB
+    :rtype: int
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(length):
+    """
+    Run in a fresh interpreter: loads a ladder and prints the number of components and the bytes taken per
+    component by the netlist, the nodes and components, and the branches
+    """
+    import generators
+    lines = generators.ladder(length)
+    before = peak_kb()
+    ladder = generators.build_circuit(lines)
+    populated = peak_kb()
+    ladder.identify_nontrivial_nodes()
+    ladder.create_branches()
+    branched = peak_kb()
+    num_comps = len(ladder.component_list)
+    print("{0} {1} {2}".format(num_comps, 1024.*(populated - before)/num_comps, 1024.*(branched - populated)/num_comps))
+
+
+def main():
+    print("{0:>11} {1:>18} {2:>18}".format("components", "bytes/component", "+branches"))
+    for length in LENGTHS:
+        output = subprocess.check_output([sys.executable, '-c', "from benchmarks import bench_memory; "
+                                          "bench_memory.measure({0})".format(length)], cwd=SOURCE_DIR)
+        num_comps, populated, branched = output.split()
+        print("{0:>11} {1:>18.0f} {2:>18.0f}".format(int(num_comps), float(populated), float(branched)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+""" Times every stage of loading and solving generated circuits, and the peak memory each circuit takes. Every case
+    runs in a fresh interpreter and prints one JSON object per line, tagged with the commit it ran on, so runs on
+    different commits can be kept and compared:
+        python -m benchmarks.bench_stages > before.jsonl
+        python -m benchmarks.bench_stages --compare before.jsonl
+        python -m benchmarks.bench_stages --cases ladder,star
+    With --compare, the stages that got slower (or cases that took more memory) than the given run by more than
+    --threshold are listed on stderr and the exit status is 1.
+    The symbolic solver stages are only timed on circuits of at most SYMBOLIC_NODE_LIMIT nodes.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import traceback
+
+SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CIRCUIT_STAGES = ['create_nodes', 'populate_nodes', 'identify_nontrivial_nodes', 'create_branches',
+                  'create_supernodes', 'identify_nontrivial_nonsuper_nodes']
+SOLVER_STAGES = ['identify_voltages', 'identify_currents', 'gen_node_voltage_eq', 'determine_known_vars',
+                 'sub_into_eqs', 'solve_subbed_eqs']
+SYMBOLIC_NODE_LIMIT = 40
+CASES = [  # (name of the generator, its arguments)
+    ('ladder', {'length': 8}),
+    ('ladder', {'length': 50000}),
+    ('grid', {'rows': 4, 'cols': 4}),
+    ('grid', {'rows': 150, 'cols': 150}),
+    ('random_mesh', {'num_nodes': 12, 'extra_edges': 8}),
+    ('random_mesh', {'num_nodes': 20000, 'extra_edges': 20000}),
+    ('star', {'fanout': 12}),
+    ('star', {'fanout': 50000}),
+    ('source_chain', {'length': 6}),
+    ('source_chain', {'length': 20000}),
+]
+MIN_SECONDS = 0.005  # stages quicker than this in both runs are too noisy to compare
+
+
+def commit():
+    """
+    :return: the commit checked out in the source tree, or None outside of a git checkout
+    :rtype: str
+    """
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=SOURCE_DIR,
+                                           stderr=devnull).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timed(stages, name, func, *args):
+    start = time.time()
+    result = func(*args)
+    stages[name] = time.time() - start
+    return result
+
+
+def run_case(case_num):
+    """
+    Run in a fresh interpreter: generates the circuit of CASES[case_num], runs every stage on it and prints the
+    result as JSON
+    :type case_num: int
+    """
+    import circuit
+    import generators
+    import solver
+    generator, params = CASES[case_num]
+    result = {'case': generator, 'params': params, 'stages': {}, 'status': 'ok'}
+    stages = result['stages']
+    filename = generators.write_netlist(getattr(generators, generator)(**params))
+    result['baseline_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        new_circuit = timed(stages, 'load_netlist', circuit.Circuit, filename)
+        for stage in CIRCUIT_STAGES:
+            timed(stages, stage, getattr(new_circuit, stage))
+        result['nodes'], result['components'] = new_circuit.num_nodes, len(new_circuit.component_list)
+        if new_circuit.num_nodes <= SYMBOLIC_NODE_LIMIT:
+            my_solver = solver.Solver(new_circuit)
+            my_solver.set_reference_voltage(new_circuit.nodedict[0])
+            for stage in SOLVER_STAGES:
+                timed(stages, stage, getattr(my_solver, stage))
+    except Exception as e:  # the stages that ran are still reported
+        result['status'] = 'error'
+        result['error'] = '{0}: {1}'.format(type(e).__name__, e)
+        result['traceback'] = traceback.format_exc()
+    finally:
+        os.remove(filename)
+    result['peak_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps(result, sort_keys=True))
+
+
+def case_key(result):
+    return result['case'], json.dumps(result['params'], sort_keys=True)
+
+
+def regressions(results, baseline, threshold):
+    """
+    :type results: list[dict]
+    :type baseline: list[dict]
+    :param baseline: results of an earlier run
+    :type threshold: float
+    :return: a line describing each stage (or peak memory) of a case that takes more than threshold times what it
+        took in baseline
+    :rtype: list[str]
+    """
+    before = dict((case_key(result), result) for result in baseline)
+    found = []
+    for result in results:
+        old = before.get(case_key(result))
+        if old is None:
+            continue
+        name = '{0} {1}'.format(*case_key(result))
+        for stage, seconds in sorted(result['stages'].items()):
+            old_seconds = old['stages'].get(stage)
+            if old_seconds is None or max(seconds, old_seconds) < MIN_SECONDS:
+                continue
+            if seconds > threshold*old_seconds:
+                found.append('{0} {1}: {2:.4f} s -> {3:.4f} s'.format(name, stage, old_seconds, seconds))
+        old_kb, new_kb = old['peak_kb'] - old['baseline_kb'], result['peak_kb'] - result['baseline_kb']
+        if old_kb > 0 and new_kb > threshold*old_kb:
+            found.append('{0} peak memory: {1} kB -> {2} kB'.format(name, old_kb, new_kb))
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every stage on generated circuits, one JSON result per line")
+    parser.add_argument('--cases', default=None, help="comma separated generators to run, all of them by default")
+    parser.add_argument('--compare', default=None, help="JSON lines of an earlier run to check for regressions")
+    parser.add_argument('--threshold', type=float, default=1.25, help="slowdown counted as a regression")
+    args = parser.parse_args(argv)
+    wanted = args.cases.split(',') if args.cases else None
+    revision = commit()
+    results = []
+    for case_num, (generator, params) in enumerate(CASES):
+        if wanted is not None and generator not in wanted:
+            continue
+        output = subprocess.check_output([sys.executable, '-c', "from benchmarks import bench_stages; "
+                                          "bench_stages.run_case({0})".format(case_num)], cwd=SOURCE_DIR)
+        result = json.loads(output.splitlines()[-1])
+        result['commit'] = revision
+        result['python'] = '{0}.{1}.{2}'.format(*sys.version_info[:3])
+        results.append(result)
+        sys.stdout.write(json.dumps(result, sort_keys=True) + '\n')
+        sys.stdout.flush()
+    if args.compare:
+        with open(args.compare, 'r') as baseline_file:
+            baseline = [json.loads(line) for line in baseline_file if line.strip()]
+        found = regressions(results, baseline, args.threshold)
+        for line in found:
+            sys.stderr.write(line + '\n')
+        return 1 if found else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+""" Times Solver.update_value, which changes one component of a solved circuit through a low rank update of the
+    existing factorization, against factorizing and solving the whole system again, on grids of growing size.
+        python -m benchmarks.bench_update
+"""
+import random
+import time
+
+import numpy
+
+import solver
+import generators
+
+SIZES = [10, 30, 100]
+UPDATES = 200
+TUNED = 8  # components changed over and over, as when tuning a circuit by hand
+
+
+def median_ms(my_solver, names, currents):
+    times = []
+    for update in range(UPDATES):
+        start = time.time()
+        my_solver.update_value(random.choice(names), random.uniform(1, 10), currents)
+        times.append(time.time() - start)
+    return 1000*numpy.median(times)
+
+
+def main():
+    random.seed(0)
+    print("{0:>7} {1:>12} {2:>12} {3:>12} {4:>12}".format("nodes", "solve ms", "any ms", "tuned ms",
+                                                          "voltages ms"))
+    for size in SIZES:
+        circuit = generators.build_circuit(generators.grid(size, size))
+        my_solver = solver.Solver(circuit, mode='numeric', keep_history=False)
+        my_solver.set_reference_voltage(circuit.nodedict[0])
+        my_solver.nodal_system()
+        start = time.time()
+        my_solver.solve_numeric()
+        solve_ms = 1000*(time.time() - start)
+        names = [comp.refdes for comp in circuit.component_list if comp.refdes.startswith('R')]
+        my_solver.update_value(names[0], 1)  # factorizes
+        any_ms = median_ms(my_solver, names, True)
+        my_solver.nodal_system().factorize()
+        tuned_ms = median_ms(my_solver, names[:TUNED], True)
+        voltages_ms = median_ms(my_solver, names[:TUNED], False)
+        print("{0:>7} {1:>12.3f} {2:>12.3f} {3:>12.3f} {4:>12.3f}".format(circuit.num_nodes, solve_ms, any_ms,
+                                                                          tuned_ms, voltages_ms))
+
+if __name__ == "__main__":
+    main()
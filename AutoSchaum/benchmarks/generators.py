@@ -0,0 +1,123 @@
+""" Synthetic circuits for the benchmarks. Each generator returns the lines of a netlist """
+import os
+import random
+import tempfile
+
+import circuit
+
+
+def ladder(length, r=1):
+    """
+    A ladder network. The top rail runs through nodes 1..length and the bottom rail through nodes 0,
+    length+1..2*length-1, both made of series resistors. Rungs join the rails at every position past the first and a
+    voltage source drives the first position. No node has more than four components connected
+    :type length: int
+    :rtype: list[str]
+    """
+    bottom = [0] + range(length + 1, 2*length)
+    lines = ["Ladder {0}".format(length), "V1 0 1 1"]
+    for i in range(1, length):
+        lines.append("RT{0} {0} {1} {2}".format(i, i + 1, r))
+        lines.append("RB{0} {1} {2} {3}".format(i, bottom[i - 1], bottom[i], r))
+        lines.append("RR{0} {0} {1} {2}".format(i + 1, bottom[i], 2*r))
+    return lines
+
+
+def grid(rows, cols, r=1):
+    """
+    A rows x cols mesh of resistors over nodes 1..rows*cols, numbered row by row, with node 0 as ground. A voltage
+    source drives the first node and the last node is tied to ground through a resistor. The resistances cycle
+    through r..7r so the node voltages are not symmetric
+    :type rows: int
+    :type cols: int
+    :rtype: list[str]
+    """
+    lines = ["Grid {0}x{1}".format(rows, cols), "V1 0 1 1", "RG 0 {0} {1}".format(rows*cols, r)]
+    count = 0
+    for i in range(rows):
+        for j in range(cols):
+            node = i*cols + j + 1
+            if j < cols - 1:
+                count += 1
+                lines.append("R{0} {1} {2} {3}".format(count, node, node + 1, r*(count % 7 + 1)))
+            if i < rows - 1:
+                count += 1
+                lines.append("R{0} {1} {2} {3}".format(count, node, node + cols, r*(count % 7 + 1)))
+    return lines
+
+
+def random_mesh(num_nodes, extra_edges, seed=0, r=1):
+    """
+    A connected mesh of resistors over nodes 0..num_nodes-1: a random spanning tree (each node joins a random node
+    before it) plus extra_edges resistors between random pairs of nodes. A voltage source drives node 1. The same
+    seed always gives the same netlist
+    :type num_nodes: int
+    :type extra_edges: int
+    :type seed: int
+    :rtype: list[str]
+    """
+    rng = random.Random(seed)
+    lines = ["Random mesh {0}+{1} seed {2}".format(num_nodes, extra_edges, seed), "V1 0 1 1"]
+    edges = [(rng.randrange(node), node) for node in range(1, num_nodes)]
+    while len(edges) < num_nodes - 1 + extra_edges:
+        neg, pos = rng.sample(range(num_nodes), 2)
+        edges.append((neg, pos))
+    for count, (neg, pos) in enumerate(edges, 1):
+        lines.append("R{0} {1} {2} {3}".format(count, neg, pos, r*rng.randint(1, 9)))
+    return lines
+
+
+def star(fanout, r=1):
+    """
+    A hub node 1 with fanout resistors out to leaf nodes 2..fanout+1, each leaf tied to ground through a resistor of
+    its own. A voltage source drives the hub, so node 1 and node 0 both have fanout+1 components connected
+    :type fanout: int
+    :rtype: list[str]
+    """
+    lines = ["Star {0}".format(fanout), "V1 0 1 1"]
+    for leaf in range(2, fanout + 2):
+        lines.append("RS{0} 1 {0} {1}".format(leaf, r*(leaf % 5 + 1)))
+        lines.append("RG{0} {0} 0 {1}".format(leaf, r))
+    return lines
+
+
+def source_chain(length, r=1):
+    """
+    length voltage sources in series from node 0 through nodes 1..length, with a resistor from every node of the
+    chain to ground. The sources form branches of their own that join into a single supernode
+    :type length: int
+    :rtype: list[str]
+    """
+    lines = ["Source chain {0}".format(length)]
+    for node in range(1, length + 1):
+        lines.append("V{0} {1} {0} 1".format(node, node - 1))
+        lines.append("R{0} {0} 0 {1}".format(node, r*(node % 3 + 1)))
+    return lines
+
+
+def write_netlist(lines):
+    """
+    :type lines: list[str]
+    :return: the name of a temporary file holding the netlist, for the caller to remove
+    :rtype: str
+    """
+    handle, filename = tempfile.mkstemp(suffix='.crt')
+    with os.fdopen(handle, 'w') as netlist_file:
+        netlist_file.write('\n'.join(lines))
+    return filename
+
+
+def build_circuit(lines):
+    """
+    Writes a generated netlist to a temporary file and loads it into a Circuit with its nodes populated
+    :type lines: list[str]
+    :rtype: circuit.Circuit
+    """
+    filename = write_netlist(lines)
+    try:
+        new_circuit = circuit.Circuit(filename)
+    finally:
+        os.remove(filename)
+    new_circuit.create_nodes()
+    new_circuit.populate_nodes()
+    return new_circuit
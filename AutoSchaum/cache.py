@@ -0,0 +1,248 @@
+""" Caches of solved circuits.
+    Solvers are stored on disk under a hash of the canonical form of their netlist: the circuit name, comments,
+    whitespace and the order of the element lines do not change the key, nor does writing 'gnd' for node 0. A hit
+    loads the solved Solver (detached from its circuit, see solver.SolutionStep.__getstate__) without parsing the
+    netlist or running any solver step, and can still be explained by a Teacher.
+    The solver version is part of the key, so results from an older solver are never returned. The cache directory
+    is kept under a size bound by evicting the least recently used entries.
+    Since the key ignores the order of the element lines, the numeric results of a hit (arrays indexed by Node.index)
+    are in the order of the netlist that was first solved. SolutionStep.node_names gives that order.
+    TopologyCache keeps the closed form solutions of circuits in memory by topology alone, so that circuits which
+    only differ in their component values are solved symbolically once.
+"""
+import collections
+import hashlib
+import os
+import sys
+import tempfile
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import netlist
+import solver
+
+DEFAULT_MAX_BYTES = 256*2**20
+ENTRY_SUFFIX = '.pickle'
+
+
+def canonical_netlist(lines):
+    """
+    :type lines: collections.Iterable[str]
+    :param lines: the lines of a netlist, the first one being the circuit name
+    :return: the element and instance lines with their tokens separated by single spaces, their node names
+        normalized and the lines sorted. The lines of each subcircuit are sorted within their .SUBCKT block, and
+        the blocks are sorted after the lines of the circuit
+    :rtype: str
+    """
+    lines = iter(lines)
+    next(lines, None)  # the circuit name does not change the solution
+    elements = top = []  # the lines of the circuit, or of the subcircuit being read
+    blocks, header = [], None
+    for line_num, tokens in netlist.tokenize(lines):
+        keyword = tokens[0].upper()
+        if keyword == '.SUBCKT':
+            elements, header = [], tokens[:2] + [str(netlist.node_name(token)) for token in tokens[2:]]
+            continue
+        if keyword == '.ENDS':
+            blocks.append('\n'.join([' '.join(header or [])] + sorted(elements) + ['.ENDS']))
+            elements, header = top, None
+            continue
+        if keyword == '.END':
+            continue
+        if keyword[0] == 'X':
+            tokens[1:-1] = [str(netlist.node_name(token)) for token in tokens[1:-1]]
+        elif len(tokens) == 4:
+            tokens[1], tokens[2] = str(netlist.node_name(tokens[1])), str(netlist.node_name(tokens[2]))
+        elements.append(' '.join(tokens))
+    return '\n'.join(sorted(top) + sorted(blocks))
+
+
+def netlist_key(netlist_filename, mode='symbolic'):
+    """
+    :type netlist_filename: str
+    :type mode: str
+    :return: the cache key of the solution of a netlist in the given solver mode
+    :rtype: str
+    """
+    with open(netlist_filename, 'r') as netlist_file:
+        canonical = canonical_netlist(netlist_file)
+    version = 'solver {0} python {1}.{2} {3}\n'.format(solver.SOLVER_VERSION, sys.version_info[0],
+                                                       sys.version_info[1], mode)
+    return hashlib.sha1(version + canonical).hexdigest()
+
+
+class SolutionCache(object):
+    """
+    A directory of pickled solvers, one file per key
+    :type directory: str
+    :type max_bytes: int
+    """
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        :type directory: str
+        :param directory: created if it does not exist
+        :type max_bytes: int
+        :param max_bytes: the least recently used entries are evicted once the entries take up more than this
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        """
+        :type key: str
+        :return: the solver stored under key or None. A hit marks the entry as recently used
+        :rtype: solver.Solver
+        """
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as entry:
+                cached = pickle.load(entry)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        os.utime(path, None)
+        self.hits += 1
+        return cached
+
+    def put(self, key, solved):
+        """
+        Stores a solver under key. The entry is written to a temporary file and renamed into place, so concurrent
+        readers (e.g. the workers of a batch) never see part of an entry
+        :type key: str
+        :type solved: solver.Solver
+        """
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as entry:
+                pickle.dump(solved, entry, pickle.HIGHEST_PROTOCOL)
+            os.rename(temp_path, self.path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.evict()
+
+    def entries(self):
+        """
+        :return: the path, size and last use of every entry, least recently used first
+        :rtype: list[(str, int, float)]
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(ENTRY_SUFFIX):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:  # evicted by another process
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self):
+        """ Removes the least recently used entries until the cache fits in max_bytes """
+        entries = self.entries()
+        total = sum(size for path, size, used in entries)
+        for path, size, used in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def solve(self, netlist_filename, mode='symbolic'):
+        """
+        Returns the cached solution of a netlist, solving it and storing the solution on a miss
+        :type netlist_filename: str
+        :type mode: str
+        :param mode: the Solver mode
+        :rtype: solver.Solver
+        """
+        key = netlist_key(netlist_filename, mode)
+        solved = self.get(key)
+        if solved is None:
+            solved = solver.Solver(solver.prepare_circuit(netlist_filename, mode), mode=mode)
+            solved.solve()
+            self.put(key, solved)
+        return solved
+
+
+class TopologyCache(object):
+    """
+    The closed form node voltages of solved circuits, keyed by topology: which component (by type and refdes)
+    connects which nodes, and the reference node. Component values are not part of the key since the solutions are
+    in terms of the refdes symbols, so every circuit differing only in its values shares one solution, and one
+    compiled solution to evaluate it. Give the same cache to many Solvers (see Solver.solve_by_topology).
+    Entries live in memory, the least recently used being dropped past max_entries
+    :type hits: int
+    :type misses: int
+    """
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.entries = collections.OrderedDict()
+        """:type : collections.OrderedDict[tuple, list]"""  # key -> [solved, compiled solution or None]
+
+    @staticmethod
+    def key(circuit, ref_node_num):
+        """
+        :type circuit: circuit.Circuit
+        :type ref_node_num: int | str
+        :rtype: tuple
+        """
+        connections = sorted((type(comp).__name__, comp.refdes, str(comp.neg.node_num), str(comp.pos.node_num))
+                             for comp in circuit.component_list)
+        return str(ref_node_num), tuple(connections)
+
+    def peek(self, key):
+        """
+        :return: the solution stored under key, without counting a hit or miss or marking it as used
+        :rtype: dict[sympy.Symbol, sympy.Expr]
+        """
+        entry = self.entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def get(self, key):
+        """
+        :return: the solution stored under key or None
+        :rtype: dict[sympy.Symbol, sympy.Expr]
+        """
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries[key] = entry  # moved to the most recently used end
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, solved):
+        """
+        :type solved: dict[sympy.Symbol, sympy.Expr]
+        :param solved: the closed form node voltages, as found by Solver.solve_eqs
+        """
+        self.entries.pop(key, None)
+        self.entries[key] = [solved, None]
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def compiled(self, key):
+        """
+        :return: the compiled form of the solution stored under key, compiled the first time it is asked for
+        :rtype: symbolic.CompiledSolution
+        """
+        import symbolic
+        entry = self.entries[key]
+        if entry[1] is None:
+            entry[1] = symbolic.CompiledSolution(entry[0])
+        return entry[1]
@@ -14,6 +14,8 @@
         -Current controlled current source 'CCIS'
     Default units are:
         -Impedance: Ohms
+        -Capacitance: F
+        -Inductance: H
         -Voltage source: V
         -Current Source: A
     Each circuit has a corresponding admittance matrix and current injection vector:
@@ -23,13 +25,14 @@
         those here wherever I can and wherever I remember to.
 """
 import components
+import instrument
+import netlist
+import numeric
 from cursors import *
 
 import math
 import cmath
-import itertools
-import sympy
-import copy
+import collections
 
 
 class Node(object):
@@ -39,22 +42,35 @@ class Node(object):
     :type num_comp_connected: int
     :type y_connected: int
     :type connected_comps: list[components.Component]
+    :type adjacent: dict[int, list[int]]
+    :type adjacent_nodes: list[Node]
     :type voltage: float
-    :type node_num: int
+    :type node_num: int | str
+    :type index: int
     """
+    __slots__ = ('y_connected', 'connected_comps', 'adjacent', 'adjacent_nodes', 'voltage', 'node_num', 'index',
+                 'branchlist')
 
-    def __init__(self, node_num):
+    def __init__(self, node_num, index=None):
         """
         instantiates a node object. An empty node is created and then components are connected using class methods
+        :param node_num: The name of the node in the netlist
+        :param index: The compact index of the node, used to address arrays. Defaults to node_num
         :return: Init functions do not return a value
         """
         self.y_connected = 0  # sum of admittances connected
         """:type : int"""
         self.connected_comps = []  # connected components
         """:type : list[components.Component]"""
+        self.adjacent = {}  # Node.index of each adjacent node -> positions in connected_comps of the components to it
+        """:type : dict[int, list[int]]"""
+        self.adjacent_nodes = []  # each adjacent node once, in the order they were connected
+        """:type : list[Node]"""
         self.voltage = float('NaN')
         """:type : complex"""
         self.node_num = node_num
+        """:type : int | str"""
+        self.index = node_num if index is None else index
         """:type : int"""
         self.branchlist = []
         """:type : list[Branch]"""
@@ -66,6 +82,32 @@ class Node(object):
         """
         return len(self.connected_comps)
 
+    @property
+    def neighbors(self):
+        """
+        Built from the adjacency index each time it is asked for, rather than kept on every node as a map of
+        component lists
+        :return: adjacent node -> components connecting it to this node, in the order they were connected
+        :rtype: collections.OrderedDict[Node, list[components.Component]]
+        """
+        return collections.OrderedDict((node, self.connecting(node)) for node in self.adjacent_nodes)
+
+    def neighbor_nodes(self):
+        """
+        :return: the adjacent nodes, each once, in the order they were connected
+        :rtype: list[Node]
+        """
+        return list(self.adjacent_nodes)
+
+    def connecting(self, node):
+        """
+        :type node: Node
+        :return: the components connecting this node to node, in the order they were connected, looked up in the
+            adjacency index kept by add_comp
+        :rtype: list[components.Component]
+        """
+        return [self.connected_comps[position] for position in self.adjacent.get(node.index, ())]
+
     def add_comp(self, comp):
         """
         add a component that is connected to this node
@@ -76,6 +118,12 @@ class Node(object):
         :return: returns the node
         :rtype Node:
         """
+        other = helper_funcs.other_node(comp, self)
+        positions = self.adjacent.get(other.index)
+        if positions is None:
+            positions = self.adjacent[other.index] = []
+            self.adjacent_nodes.append(other)
+        positions.append(len(self.connected_comps))
         self.connected_comps.append(comp)
         if isinstance(comp, components.Impedance):
             self.y_connected += comp.y
@@ -123,15 +171,23 @@ class Node(object):
         unknown_branch_current.current = sum(current_leaving_node)
         return current_leaving_node
 
-    def node_voltage_kcl(self):
+    def node_voltage_kcl(self, symbols=None, reductions=None):
         """
-        Creates the KCL equations for node analysis and sets the current expression, current exps string and sympy eqs
-        for that branch
+        Creates the KCL equations for node analysis and sets the current expression for that branch
+        :type symbols: SymbolTable
+        :param symbols: the symbol table of the circuit, shared by every current expression
+        :type reductions: dict[Branch, Reduction]
+        :param reductions: branches whose impedances stand in the equations as an equivalent impedance (see
+            Circuit.reduce_series_parallel). Branches in parallel give a single current expression
         :return: Returns a list containing the expressions for the currents leaving the node
         :rtype: list[CurrentExp]
         """
         current_leaving_node = []
+        reductions = reductions or {}
         for branch in self.branchlist:
+            reduction = reductions.get(branch)
+            if reduction is not None and branch is not reduction.branches[0]:
+                continue  # in parallel with the first branch of the reduction, which carries the current of all of them
             branch_impedances = []
             branch_voltages = [Voltage(self)]
             kcl_cursor = KCLCursor(branch, self)
@@ -144,14 +200,14 @@ class Node(object):
                     current_leaving_node.append(branch.current)
                 continue
             elif branch.current_exp_is_defined():
-                new_current_exp = copy.deepcopy(branch.current_expression)
+                new_current_exp = branch.current_expression.copy()
                 if flip_direction:
                     new_current_exp.flip_dir()
                 #current_leaving_node.append(new_current_exp)
                 #continue
             while True:
                 new_comp = kcl_cursor.step_down_branch()[0]  #assuming only one component
-                if isinstance(new_comp, components.Resistor):
+                if isinstance(new_comp, components.Impedance):
                     branch_impedances.append(new_comp)
                 if isinstance(new_comp, components.VoltageSource):
                     directionality = 1
@@ -161,12 +217,14 @@ class Node(object):
                 if kcl_cursor.at_branch_end:
                     branch_voltages.append(Voltage(kcl_cursor.location))  # we interperate this as a voltage to gnd
                     break
-            current_leaving_node.append(CurrentExp(branch_voltages, branch_impedances))
-            branchs_perspective_voltage = copy.deepcopy(branch_voltages)
-            branch.current_expression = CurrentExp(branchs_perspective_voltage, branch_impedances)
+            if reduction is not None:
+                branch_impedances = [reduction]
+            current_leaving_node.append(CurrentExp(branch_voltages, branch_impedances, symbols))
+            if reduction is not None and reduction.kind == 'parallel':
+                continue  # the expression is the current of every branch of the reduction, not of this one
+            branch.current_expression = current_leaving_node[-1].copy()
             if flip_direction:
                 branch.current_expression.flip_dir()
-            branch.current = branch.current_expression.into_sympy()
         return current_leaving_node
 
 # TODO write a function for flipping the current direction using the node_current_in
@@ -182,22 +240,23 @@ class Supernode(object):
         are interfaced only through the supernode class instance. The voltage and node number of the supernode are
         identical to those of the master node.
     """
+    __slots__ = ('nodelist', 'node_set', 'branchlist', 'master_node')
 
     def __init__(self, branches):
         """
             :type branches: list[Branch]
             :return:
         """
-        # self.nodedict = {connected_nodes[i].node_num : connected_nodes[i] for i in range(len(connected_nodes))}  # list of nodes that are a part of the supernode
-        self.nodelist = [node for node in list(itertools.chain(*[branch.nodelist for branch in branches]))]
+        self.nodelist = []  # nodes of the supernode in the order they were inserted
         """:type : list[Node]"""
-        self.master_node = self.nodelist[0]  # the master node is the first node that inserted into the supernode
-        """:type : Node"""
+        self.node_set = set()
+        """:type : set[Node]"""
         self.branchlist = []
         """:type : list[Branch]"""
         for branch in branches:
-            branch.supernode = self
             self.add_branch(branch)
+        self.master_node = self.nodelist[0]  # the master node is the first node that inserted into the supernode
+        """:type : Node"""
 
     @property
     def voltage_is_defined(self):
@@ -227,9 +286,19 @@ class Supernode(object):
             cursor = Cursor(self.master_node)
 
     def add_branch(self, branch):
+        branch.supernode = self
         self.branchlist.append(branch)
-        self.nodelist.extend(branch.nodelist)
-        self.nodelist = list(set(self.nodelist))
+        for node in branch.nodelist:
+            if node not in self.node_set:
+                self.node_set.add(node)
+                self.nodelist.append(node)
+
+    def internal_nodes(self):
+        """
+        :return: the nodes of the supernode other than the master node
+        :rtype: list[Node]
+        """
+        return self.nodelist[1:]
 
 
 class Branch(object):
@@ -244,6 +313,7 @@ class Branch(object):
     :type component_list: list[components.Component]
     :type branch_num: int
     """
+    __slots__ = ('nodelist', 'component_list', 'branch_num', 'supernode', 'current', 'current_expression')
 
     def __init__(self, branch_number):
         self.nodelist = []
@@ -312,29 +382,171 @@ class Branch(object):
         else:
             return True
 
-    def add_comp(self, comp):
+    def add_comp(self, comp, node_current_in=None):
         """
         :type comp: components.Component
+        :type node_current_in: Node
+        :param node_current_in: The node of comp on the nodelist[0] side of the branch. When not given it is found
+            by walking the circuit (see Component.high_node)
         :return:
         """
         if comp.has_branch():  # TODO change this and modify create_branches to exit branch creation
             return
-        if comp in self.component_list:
-            return
         self.component_list.append(comp)
         comp.branch = self
-        comp.node_current_in = comp.high_node(self.node_current_in)
+        if node_current_in is None:
+            node_current_in = comp.high_node(self.node_current_in)
+        comp.node_current_in = node_current_in
         return comp
 
+    def impedances(self):
+        """
+        :rtype: list[components.Impedance]
+        """
+        return helper_funcs.only_impedances(self.component_list)
+
+    def sources(self):
+        """
+        :return: each voltage source of the branch with the sign of the drop across it along the branch current: 1
+            where the current enters its pos node, -1 where it enters its neg node
+        :rtype: list[(components.VoltageSource, int)]
+        """
+        return [(source, 1 if source.node_current_in is source.pos else -1)
+                for source in helper_funcs.only_vsources(self.component_list)]
+
+    def set_from_end_voltages(self):
+        """
+        Sets the current of the branch from the voltages of its ending nodes, then the voltage of every node inside it
+        by stepping over its components from nodelist[0]. Values that are already defined are kept
+        :return: the nodes that were given a voltage and whether the current was set
+        :rtype: (list[Node], bool)
+        """
+        start, end = self.nodelist[0], self.nodelist[-1]
+        emf = sum((sign*source.v for source, sign in self.sources()), 0j)
+        current = (start.voltage - emf - end.voltage)/sum(comp.z for comp in self.impedances())
+        set_current = not self.current_is_defined()
+        if set_current:
+            self.current = current
+        set_nodes = []
+        voltage = start.voltage
+        for comp, node in zip(self.component_list, self.nodelist[1:-1]):
+            if isinstance(comp, components.VoltageSource):
+                voltage -= comp.v if comp.node_current_in is comp.pos else -comp.v
+            else:
+                voltage -= comp.z*current
+            if not node.voltage_is_defined():
+                node.voltage = voltage
+                set_nodes.append(node)
+        return set_nodes, set_current
+
+
+class Reduction(object):
+    """
+    Branches that stand in the node voltage equations as a single equivalent impedance named refdes: either the
+    impedances of one branch in series, or branches made only of impedances in parallel between the same two nodes.
+    The branches keep their components, so the current and voltage of each of them are recovered once the equations
+    are solved (see Branch.set_from_end_voltages)
+    :type refdes: str
+    :type branches: list[Branch]
+    """
+    __slots__ = ('refdes', 'branches')
+
+    def __init__(self, refdes, branches):
+        self.refdes = refdes
+        """:type : str"""
+        self.branches = branches
+        """:type : list[Branch]"""
+
+    @property
+    def kind(self):
+        """
+        :return: 'series' or 'parallel'
+        :rtype: str
+        """
+        return 'parallel' if len(self.branches) > 1 else 'series'
+
+    @property
+    def z(self):
+        """
+        :return: the value of the equivalent impedance
+        :rtype: complex
+        """
+        sums = [sum(comp.z for comp in branch.impedances()) for branch in self.branches]
+        return sums[0] if len(sums) == 1 else 1/sum(1/z for z in sums)
+
+    def impedance_names(self):
+        """
+        :return: the refdes of the impedances of each branch in netlist order, the branches ordered by their first
+            impedance in the netlist
+        :rtype: list[list[str]]
+        """
+        indices = sorted(sorted(comp.index for comp in branch.impedances()) for branch in self.branches)
+        return [[self.branches[0].component_list[0].store.refdes[index] for index in branch] for branch in indices]
+
+    def expression(self, symbols):
+        """
+        :type symbols: SymbolTable
+        :return: the equivalent impedance in terms of the symbols of the impedances it stands for
+        :rtype: sympy.Expr
+        """
+        import sympy
+        sums = [sympy.Add(*[symbols.value(comp) for comp in branch.impedances()]) for branch in self.branches]
+        return sums[0] if len(sums) == 1 else 1/sympy.Add(*[1/z for z in sums])
+
+
+class Loop(object):
+    """
+    An independent loop of the circuit: a branch left out of a spanning tree of the branches (the chord of the
+    loop) closed through the tree. The loop current circulates along the branch current of the chord
+    self.branches gives the branches in the order the loop runs through them, each with the direction it runs
+        through it: 1 along the branch current (from nodelist[0] to nodelist[-1]), -1 against it
+    :type loop_num: int
+    :type branches: list[(Branch, int)]
+    """
+    __slots__ = ('loop_num', 'branches')
+
+    def __init__(self, loop_number):
+        self.loop_num = loop_number
+        """:type : int"""
+        self.branches = []
+        """:type : list[(Branch, int)]"""
+
+    @property
+    def chord(self):
+        """
+        :rtype: Branch
+        """
+        return self.branches[0][0]
+
+
+class Instance(object):
+    """
+    A placed subcircuit. Its nodes are the nodes of the circuit its ports connect to, in the order of
+    definition.port_indices
+    :type refdes: str
+    :type nodes: list[Node]
+    :type definition: netlist.Subcircuit
+    """
+    __slots__ = ('refdes', 'nodes', 'definition')
+
+    def __init__(self, refdes, nodes, definition):
+        self.refdes = refdes
+        """:type : str"""
+        self.nodes = nodes
+        """:type : list[Node]"""
+        self.definition = definition
+        """:type : netlist.Subcircuit"""
+
 
 class Circuit(object):
-    def __init__(self, netlist_filename):
+    def __init__(self, netlist_filename=None):
         """
         the input circuit is in the form of a SPICE netlist
         This implies that each impedance (admittance) is specified by a impedance and two nodes that connect it
         Additionally, each voltage or current source is defined by a constant or an expression of other values
         :type netlist_filename: String
-        :param netlist_filename: The filename of the netlist
+        :param netlist_filename: The filename of the netlist. Without one the circuit is left empty, for a netlist
+            that has already been parsed to be set as self.netlist (the body of a subcircuit, see subcircuit.py)
         A typical netlist looks like:
         CIRCUIT NAME
         V1 0 1 5
@@ -343,98 +555,145 @@ class Circuit(object):
         R3 1 2 1
         A Circuit contains all the information which is relevant to the representation of a circuit
         """
-        self.netlist_file = None
-        """:type : file"""
         self.netlist = None
-        """:type : str"""
+        """:type : netlist.Netlist"""
+        self.symbols = SymbolTable()
+        """:type : SymbolTable"""
         self.name = None
         """:type : str"""
-        self.netlist = None
-        """:type : str"""
         self.nodedict = {}
-        """:type : dict[int, Node]"""
+        """:type : dict[int | str, Node]"""
+        self.nodelist = []
+        """:type : list[Node]"""  # indexed by Node.index
         self.nontrivial_nodedict = {}
         """:type : dict[int, Node]"""
         self.reduced_nodedict = {}
         """:type : dict[int, Node]"""
         self.non_trivial_reduced_nodedict = {}
         """:type : dict[int, Node]"""
+        self.store = components.ComponentStore()
+        """:type : components.ComponentStore"""  # the values of the components, one row per component
         self.component_list = []
-        """:type : [components.Component]"""
+        """:type : [components.Component]"""  # in the order of the rows of self.store
         self.supernode_list = []
         """:type : list[Supernode]"""
         self.branchlist = []
         """:type : list[Branch]"""
-        self.ym = [[]]
-        """:type : list[list[int]]"""
+        self.looplist = []
+        """:type : list[Loop]"""
+        self.instance_list = []
+        """:type : list[Instance]"""
+        self.reductions = []
+        """:type : list[Reduction]"""
+        self.reduced_branches = {}
+        """:type : dict[Branch, Reduction]"""
+        self.ym = None
+        """:type : scipy.sparse.csr_matrix"""
         self.num_nodes = 0
         """:type : int"""
-        self.load_netlist(open(netlist_filename, 'r'))
+        if netlist_filename is not None:
+            with open(netlist_filename, 'r') as netlist_file:
+                self.load_netlist(netlist_file)
 
+    @instrument.stage
     def load_netlist(self, netlist_file):
-        self.netlist = netlist_file.read().split('\n')
-        self.name = self.netlist[0]
-        self.netlist = self.netlist[1:]
+        """
+        Streams the netlist file into self.netlist
+        :type netlist_file: file
+        """
+        self.netlist = netlist.parse_netlist(netlist_file)
+        self.name = self.netlist.name
+
+    @instrument.stage
+    def flatten_instances(self):
+        """
+        Expands the subcircuit instances of the netlist into their elements (see netlist.Netlist.flattened) for the
+        symbolic solver, which writes its equations over components rather than port equivalents. Must run before
+        create_nodes
+        """
+        if self.netlist.instances:
+            self.netlist = self.netlist.flattened()
 
     @property
     def num_branches(self):
         return len(self.branchlist)
 
+    def sizes(self):
+        """
+        :return: the number of nodes, components, branches, supernodes, loops and subcircuit instances, as reported by
+            instrumented stages
+        :rtype: dict[str, int]
+        """
+        return {'nodes': self.num_nodes, 'components': len(self.component_list), 'branches': self.num_branches,
+                'supernodes': len(self.supernode_list), 'loops': len(self.looplist),
+                'instances': len(self.instance_list)}
+
+    @instrument.stage
     def create_nodes(self):
         """
-        parses self.netlist to create nodes
+        creates a node for every node name interned by the netlist
         :return:
         """
-        self.num_nodes = max([max(int(comp.split(' ')[1]), int(comp.split(' ')[2])) for comp in self.netlist]) + 1
-        # this compensates for zero indexing
-        for i in range(self.num_nodes):
-            self.nodedict[i] = Node(i)
+        for index, name in enumerate(self.netlist.node_names):
+            self.nodelist.append(Node(name, index))
+            self.nodedict[name] = self.nodelist[-1]
+        self.num_nodes = len(self.nodelist)
 
+    @instrument.stage
     def create_supernodes(self):
         """
-        Creates supernodes for the given circuit
+        Creates supernodes for the given circuit. Every group of branches made only of voltage sources that share
+        nodes becomes one supernode. The groups are found with a disjoint set over the nodes of those branches, so
+        this is near linear in the number of branches. The master node of each supernode is the first node of the
+        first branch in its group. reduced_nodedict is filled in as part of the same pass
         :return:
         """
-        # create list of all branches which contain voltage sources
-        v_source_branches = [comp.branch for comp in self.component_list if isinstance(comp, components.VoltageSource)]
+        v_source_branches = []
         """:type : list[Branch]"""
-        # create list of all branches which contain only voltage sources
-        v_source_branches = [branch for branch in v_source_branches if all([isinstance(
-            branch.component_list[i], components.VoltageSource) for i in range(len(branch.component_list))])]
-        if len(v_source_branches) == 1:
-            self.supernode_list.append(Supernode([v_source_branches[0]]))
-            return
+        seen_branches = set()
+        for comp in self.component_list:  # branches containing only voltage sources, in component order
+            branch = comp.branch
+            if (isinstance(comp, components.VoltageSource) and branch is not None and branch not in seen_branches and
+                    all(isinstance(branch_comp, components.VoltageSource) for branch_comp in branch.component_list)):
+                seen_branches.add(branch)
+                v_source_branches.append(branch)
+        groups = helper_funcs.DisjointSet()
+        for branch in v_source_branches:
+            for node in branch.nodelist[1:]:
+                groups.union(branch.nodelist[0], node)
+        group_branches = collections.OrderedDict()
         for branch in v_source_branches:
-            for comparison in list(set(v_source_branches) - set([branch])):
-                assert isinstance(comparison, Branch)
-                for node in branch.ending_nodes():
-                    if node in comparison.ending_nodes():
-                        if branch.supernode is None and comparison.supernode is None:
-                            self.supernode_list.append(Supernode([branch]))
-                            self.supernode_list.append(Supernode([comparison]))
-                        elif branch.supernode is not None:
-                            branch.supernode.add_branch(comparison)
-                        elif comparison.supernode is not None:
-                            comparison.supernode.add_branch(branch)
+            group_branches.setdefault(groups.find(branch.nodelist[0]), []).append(branch)
+        for branches in group_branches.values():
+            self.supernode_list.append(Supernode(branches))
+        self.sub_super_nodes()
 
+    @instrument.stage
     def sub_super_nodes(self):
-        internal_nodes = []
+        """
+        Fills reduced_nodedict with every node that is not internal to a supernode (master nodes are kept)
+        :return:
+        """
+        internal_nodes = set()
         for sn in self.supernode_list:
-            internal_nodes.extend(list(set(sn.nodelist)-set([sn.master_node])))
-        for node in self.nodedict:
-            if self.nodedict[node] not in internal_nodes:
-                self.reduced_nodedict[node] = self.nodedict[node]
+            internal_nodes.update(sn.internal_nodes())
+        self.reduced_nodedict = {}
+        for node_num, node in self.nodedict.items():
+            if node not in internal_nodes:
+                self.reduced_nodedict[node_num] = node
 
 
+    @instrument.stage
     def populate_nodes(self):
-        for comp in self.netlist:
-            data = comp.split(' ')
-            """:type : list[str]"""
-            new_comp = components.create_component(data[0], self.component_list, data[3],
-                                                   (self.nodedict[int(data[1])],
-                                                    self.nodedict[int(data[2])]))
-            """:type : components.Component"""
-
+        self.store.reserve(len(self.netlist.elements))
+        for element in self.netlist.elements:
+            components.create_component(element.refdes, self.component_list, element.value,
+                                        (self.nodelist[element.neg], self.nodelist[element.pos]), self.store)
+        for instance in self.netlist.instances:
+            self.instance_list.append(Instance(instance.refdes, [self.nodelist[index] for index in instance.nodes],
+                                               self.netlist.subcircuits[instance.subckt]))
+
+    @instrument.stage
     def identify_nontrivial_nodes(self):
         """
         This function identifies the nontrivial nodes of a circuit. Specifically, this means all nodes that are
@@ -445,46 +704,48 @@ class Circuit(object):
             if node.num_comp_connected > 2:
                 self.nontrivial_nodedict[node.node_num] = node
 
+    @instrument.stage
     def identify_nontrivial_nonsuper_nodes(self):
         for node in self.reduced_nodedict.values():
             if node.num_comp_connected > 2:
                 self.non_trivial_reduced_nodedict[node.node_num] = node
 
+    @instrument.stage
     def create_branches(self):
-        if len(self.nontrivial_nodedict.values()) == 0:
-            current_branch = Branch(self.num_branches+1)
-            for node in self.nodedict.values():
-                current_branch.add_node(node)
-            for comp in self.component_list:
-                current_branch.add_comp(comp)
-        for node in self.nontrivial_nodedict.values():
-            if not helper_funcs.only_branchless(node.connected_comps):  # if all conncomps have branches
-                # TODO maybe wrap in a function^
-                continue
-            new_branch = Branch(self.num_branches+1)
+        """
+        Splits the circuit into branches in a single O(V+E) pass. Each component that is not yet part of a branch
+        is followed from a nontrivial node through the trivial nodes (nodes with two components) after it until
+        another nontrivial node is reached. The orientation of each component is recorded as it is stepped over.
+        A circuit without nontrivial nodes is a single loop and becomes a single branch
+        :return:
+        """
+        start_nodes = self.nontrivial_nodedict.values()
+        if not start_nodes:
+            start_nodes = self.nodelist
+        for node in start_nodes:
+            for comp in node.connected_comps:
+                if not comp.has_branch():
+                    self.branchlist.append(self.trace_branch(node, comp))
+
+    def trace_branch(self, start_node, first_comp):
+        """
+        Follows a chain of components from start_node until a node which does not have exactly two components
+        connected, or until the chain returns to start_node
+        :type start_node: Node
+        :type first_comp: components.Component
+        :param first_comp: The component connected to start_node that begins the branch
+        :rtype: Branch
+        """
+        new_branch = Branch(self.num_branches+1)
+        new_branch.add_node(start_node)
+        node, comp = start_node, first_comp
+        while True:
+            new_branch.add_comp(comp, node)  # current enters comp from the node it is stepped over from
+            node = helper_funcs.other_node(comp, node)
             new_branch.add_node(node)
-            branch_cursor = BranchCreatorCursor(node, new_branch)
-            while helper_funcs.only_branchless(node.connected_comps):  # no more branchless conncomps
-                while True:
-                    branch_cursor.step_along_branch()
-                    if new_branch.is_complete_branch():
-                        break
-                if new_branch not in self.branchlist:
-                    if new_branch.component_list:  #if not empty
-                        self.branchlist.append(new_branch)
-                    else:
-                        for undo_node in new_branch.nodelist:
-                            undo_node.branchlist.pop()  # TODO oh... this is ugly. fix it. plz
-                else:
-                    for undo_node in new_branch.nodelist:
-                        undo_node.branchlist.pop()  # TODO oh... this is ugly. fix it. plz
-                if not helper_funcs.only_branchless(node.connected_comps):  # if all conncomps have branches
-                    # TODO maybe wrap in a function^
-                    break
-                new_branch = Branch(self.num_branches+1)
-                new_branch.add_node(node)
-                branch_cursor.branch = new_branch  # TODO wrap in method?
-                branch_cursor.location = node
+            if node.num_comp_connected != 2 or node is start_node:
+                return new_branch
+            comp = node.connected_comps[1] if node.connected_comps[0] is comp else node.connected_comps[0]
 
 # TODO more general equality method for branches and fix ramifications
 
@@ -495,24 +756,155 @@ class Circuit(object):
         for comp in self.component_list:
             print("Current through {0} is {1} A".format(comp.refdes, comp.current))
 
-    def calc_admittance_matrix(self):
-        self.ym = [[complex(0, 0) for i in range(self.num_nodes)] for j in range(self.num_nodes)]
-        for node1 in self.nodedict.values():
-            for node2 in self.nodedict.values():
-                if node1 == node2:
-                    for comp in node1.connected_comps:
-                        if isinstance(comp, components.Impedance):
-                            self.ym[node1.node_num][node1.node_num] += comp.y
-                        else:
-                            continue
-                else:
-                    for comp in helper_funcs.connecting(node1, node2):
-                        if isinstance(comp, components.Impedance):
-                            self.ym[node1.node_num][node2.node_num] -= comp.y
-
-
+    @instrument.stage
+    def set_frequency(self, frequency):
+        """
+        Sets the frequency every capacitor and inductor is evaluated at (components.DEFAULT_OMEGA until set)
+        :type frequency: float
+        :param frequency: in Hz
+        """
+        self.store.omega = 2*math.pi*frequency
+        for node in self.nodelist:
+            node.y_connected = sum(comp.y for comp in helper_funcs.only_impedances(node.connected_comps))
 
+    @instrument.stage
+    def reduce_series_parallel(self):
+        """
+        Finds the branches whose impedances can stand in the node voltage equations as one equivalent impedance (see
+        Reduction), in a single pass over the branches: every group of branches made only of impedances that join
+        the same two nodes is combined in parallel, and the impedances of any other branch with more than one are
+        combined in series. Branches whose current is already known, or holding anything but impedances and voltage
+        sources, are left as they are
+        :return:
+        """
+        self.reductions, self.reduced_branches = [], {}
+        names = set(comp.refdes for comp in self.component_list)
+        groups = collections.OrderedDict()  # ending nodes -> branches made only of impedances between them
+        series = []
+        for branch in self.branchlist:
+            impedances = branch.impedances()
+            if branch.current_is_defined() or branch.nodelist[0] is branch.nodelist[-1] or not impedances or \
+                    len(impedances) + len(branch.sources()) != len(branch.component_list):  # e.g. a current source
+                continue
+            if len(impedances) == len(branch.component_list):
+                groups.setdefault(frozenset(branch.ending_nodes()), []).append(branch)
+            elif len(impedances) > 1:
+                series.append(branch)
+        for branches in groups.values():
+            if len(branches) == 1 and len(branches[0].component_list) > 1:
+                series.append(branches[0])
+        candidates = [branches for branches in groups.values() if len(branches) > 1] + [[branch] for branch in series]
+        candidates.sort(key=lambda branches: branches[0].branch_num)
+        count = 0
+        for branches in candidates:
+            count += 1
+            while "Zeq{0}".format(count) in names:
+                count += 1
+            self.reductions.append(Reduction("Zeq{0}".format(count), branches))
+            for branch in branches:
+                self.reduced_branches[branch] = self.reductions[-1]
+
+    @instrument.stage
+    def create_loops(self):
+        """
+        Finds a fundamental loop basis of the circuit (E - V + 1 loops for each connected part, E and V counting
+        branches and the nodes they end on) in time linear in the number of branches plus the length of the loops.
+        A breadth first spanning forest is grown over the branches, then each branch left out of it is closed into
+        a loop through the forest, by walking up from both of its ends to their common ancestor
+        :return:
+        """
+        adjacent = collections.OrderedDict()  # node -> branches ending on it
+        for branch in self.branchlist:
+            adjacent.setdefault(branch.nodelist[0], []).append(branch)
+            adjacent.setdefault(branch.nodelist[-1], []).append(branch)
+        parent = {}  # node -> (branch to its parent, parent node), None for the root of each tree
+        depth = {}
+        for root in adjacent:
+            if root in depth:
+                continue
+            parent[root], depth[root] = None, 0
+            queue = collections.deque([root])
+            while queue:
+                node = queue.popleft()
+                for branch in adjacent[node]:
+                    other = branch.nodelist[-1] if branch.nodelist[0] is node else branch.nodelist[0]
+                    if other not in depth:
+                        parent[other], depth[other] = (branch, node), depth[node] + 1
+                        queue.append(other)
+        tree = set(id(edge[0]) for edge in parent.values() if edge is not None)
+        for branch in self.branchlist:
+            if id(branch) in tree:
+                continue
+            loop = Loop(len(self.looplist) + 1)
+            loop.branches.append((branch, 1))
+            # back from the end of the chord to its start: up from the end, then down to the start
+            up, down = [], []
+            node, start = branch.nodelist[-1], branch.nodelist[0]
+            while node is not start:
+                if depth[node] >= depth[start]:
+                    tree_branch, above = parent[node]
+                    up.append((tree_branch, 1 if tree_branch.nodelist[0] is node else -1))
+                    node = above
+                else:
+                    tree_branch, above = parent[start]
+                    down.append((tree_branch, 1 if tree_branch.nodelist[-1] is start else -1))
+                    start = above
+            loop.branches.extend(up + down[::-1])
+            self.looplist.append(loop)
 
+    def set_loop_currents(self, loop_currents, ref):
+        """
+        Sets the current of every branch from the loop currents, then the voltage of every node by stepping over
+        each component from ref (whose voltage is 0) outwards. Nodes and branches whose value is already defined
+        keep it
+        :type loop_currents: list[complex]
+        :param loop_currents: the current of each loop of self.looplist
+        :type ref: Node
+        :return: the nodes and branches that were given a value
+        :rtype: (list[Node], list[Branch])
+        """
+        through = helper_funcs.loops_through(self.looplist)
+        currents = dict((id(branch), sum((direction*loop_currents[i] for i, direction in through.get(branch, ())), 0j))
+                        for branch in self.branchlist)
+        set_branches = []
+        for branch in self.branchlist:
+            if not branch.current_is_defined():
+                branch.current = currents[id(branch)]
+                set_branches.append(branch)
+        voltages = {}
+        for root in [ref] + self.nodelist:
+            if root in voltages:
+                continue
+            voltages[root] = 0j
+            queue = collections.deque([root])
+            while queue:
+                node = queue.popleft()
+                for comp in node.connected_comps:
+                    other = helper_funcs.other_node(comp, node)
+                    if other in voltages:
+                        continue
+                    current = currents[id(comp.branch)]
+                    if isinstance(comp, components.VoltageSource):
+                        drop = comp.v if comp.node_current_in is comp.pos else -comp.v
+                    else:
+                        drop = comp.z*current
+                    # the drop is from the node the current enters the component at to the other node
+                    voltages[other] = voltages[node] - drop if node is comp.node_current_in else voltages[node] + drop
+                    queue.append(other)
+        set_nodes = []
+        for node in self.nodelist:
+            if not node.voltage_is_defined():
+                node.voltage = voltages[node]
+                set_nodes.append(node)
+        return set_nodes, set_branches
+
+    @instrument.stage
+    def calc_admittance_matrix(self):
+        """
+        Assembles the sparse admittance matrix in a single pass over the component list
+        :return:
+        """
+        self.ym = numeric.admittance_matrix(self)
 
 
 class Direction(object):
@@ -520,53 +912,141 @@ class Direction(object):
     pass
 
 
+class SymbolTable(object):
+    """
+    The sympy symbols of a circuit: one for the voltage of each node and one for the value of each component. Each
+    symbol is created the first time it is asked for and reused by every expression after that. Node voltages are
+    named V(<node_num>) (see helper_funcs.voltage_name), so they never share a symbol with a component such as V2
+    """
+    def __init__(self):
+        self.symbols = {}
+        """:type : dict[str, sympy.Symbol]"""
+
+    def symbol(self, name):
+        """
+        :type name: str
+        :rtype: sympy.Symbol
+        """
+        try:
+            return self.symbols[name]
+        except KeyError:
+            import sympy  # only loaded once a symbolic stage runs
+            self.symbols[name] = sympy.Symbol(name)
+            return self.symbols[name]
+
+    def voltage(self, node):
+        """
+        :type node: Node
+        :return: the symbol of the voltage of node, V(<node_num>)
+        :rtype: sympy.Symbol
+        """
+        return self.symbol(helper_funcs.voltage_name(node.node_num))
+
+    def value(self, comp):
+        """
+        :type comp: components.Component
+        :return: the symbol of the value of comp, named by its refdes
+        :rtype: sympy.Symbol
+        """
+        return self.symbol(comp.refdes)
+
+
 class Voltage(Direction):
     def __init__(self, v_source_or_node, dir_encountered=1):
         self.voltage = v_source_or_node
         self.direction = dir_encountered
 
-    def into_sympy(self):
-        pass
+    def into_sympy(self, symbols):
+        """
+        :type symbols: SymbolTable
+        :return: the voltage of the node, or the voltage of the source in the direction it was encountered
+        :rtype: sympy.Expr
+        """
+        if isinstance(self.voltage, components.Component):
+            return self.direction*symbols.value(self.voltage)
+        return symbols.voltage(self.voltage)
 
 # TODO maybe a Current class should be created which is just a value or current expression and node
 class CurrentExp(Direction):
-    def __init__(self, voltage_list, impedances):
+    def __init__(self, voltage_list, impedances, symbols=None):
         """
         :param voltages: Voltages in the form: Start Node, Vsource encountered..., End Node
         :param impedances:
+        :type symbols: SymbolTable
+        :param symbols: symbol table the sympy expression is built from. A table of its own by default
         :return:
         """
         self.voltages = voltage_list
         """:type : list[Voltage]"""
         self.impedances = impedances
         """:type : list[components.Impedance]"""
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        """:type : SymbolTable"""
         self.denominator = ""
         """:type : str"""
         self.numerator = ""
         """:type : str"""
-        self.str_expr = None
-        """:type : str"""
-        self.sympy_expr = None
+        self._str_expr = None
+        self._sympy_expr = None
+
+    @property
+    def str_expr(self):
+        """
+        The string form of the expression, only built when something asks for it (see Teacher)
+        :rtype: str
+        """
+        if self._str_expr is None:
+            self.into_str()
+        return self._str_expr
+
+    @property
+    def sympy_expr(self):
+        """
+        :rtype: sympy.Expr
+        """
+        if self._sympy_expr is None:
+            self.into_sympy()
+        return self._sympy_expr
+
+    def copy(self):
+        """
+        :return: A copy with its own Voltage objects, so it can be flipped independently. The nodes, sources,
+            impedances and symbol table are shared with this expression
+        :rtype: CurrentExp
+        """
+        return CurrentExp([Voltage(emf.voltage, emf.direction) for emf in self.voltages], list(self.impedances),
+                          self.symbols)
 
     def flip_dir(self):
         for emf in self.voltages:
             emf.direction *= -1
+        self._str_expr = self._sympy_expr = None
 
     def into_str(self):
-        numerator = "(V{0}".format(self.voltages[0].voltage.node_num)
+        numerator = "(" + helper_funcs.voltage_name(self.voltages[0].voltage.node_num)
         for emf in self.voltages[1:-1]:
             if emf.direction == -1:
                 numerator += "- "
             numerator += "-" + emf.voltage.refdes
-        numerator += "- V{0})/".format(self.voltages[-1].voltage.node_num)
+        numerator += "- {0})/".format(helper_funcs.voltage_name(self.voltages[-1].voltage.node_num))
         denom = "("
         for impedance in self.impedances:
             denom += "+" + impedance.refdes
         denom += ")"
         self.numerator = numerator
         self.denominator = denom
-        self.str_expr = numerator+denom
-        return self.str_expr
+        self._str_expr = numerator+denom
+        return self._str_expr
 
     def into_sympy(self):
-        self.sympy_expr = sympy.sympify(self.str_expr)
+        """
+        Builds (V_start - sources - V_end)/(impedances) straight from the symbols of the circuit, the same
+        expression sympify would parse out of str_expr
+        :rtype: sympy.Expr
+        """
+        import sympy
+        numerator = [emf.into_sympy(self.symbols) for emf in self.voltages]
+        numerator = sympy.Add(numerator[0], *[-term for term in numerator[1:]])
+        denominator = sympy.Add(*[self.symbols.value(impedance) for impedance in self.impedances])
+        self._sympy_expr = numerator/denominator
+        return self._sympy_expr
@@ -1,38 +1,140 @@
 import cursors
 import helper_funcs
-from SchemDraw import elements as e
+import netlist
+
+import numpy
+
+DEFAULT_OMEGA = 1.0  # angular frequency (rad/s) capacitors and inductors are evaluated at, see Circuit.set_frequency
+
+
+class ComponentStore(object):
+    """
+    The components of a circuit stored column-wise: one row per component, in order of creation, holding its type
+    code, the index of its neg and pos nodes (Node.index) and its value as written in the netlist (the impedance of
+    resistors and complex impedances, the capacitance or inductance, the source voltage). Component objects are
+    slotted facades reading and writing their row, so a component costs a few dozen bytes rather than an instance
+    dict, and the numeric engine reads whole columns at once (see numeric.NodalSystem)
+    :type size: int
+    :type refdes: list[str]
+    :type omega: float
+    """
+    def __init__(self, capacity=16):
+        """
+        :type capacity: int
+        :param capacity: number of rows allocated up front, the columns double in size when they fill up
+        """
+        self.size = 0
+        self.refdes = []
+        self.kind = numpy.zeros(capacity, dtype=numpy.int8)
+        self.neg = numpy.zeros(capacity, dtype=numpy.intp)
+        self.pos = numpy.zeros(capacity, dtype=numpy.intp)
+        self.value = numpy.zeros(capacity, dtype=complex)
+        self.omega = DEFAULT_OMEGA  # shared by every capacitor and inductor of the store
+
+    def reserve(self, capacity):
+        """
+        Grows the columns to hold at least capacity rows
+        :type capacity: int
+        """
+        if capacity > len(self.kind):
+            for column in ('kind', 'neg', 'pos', 'value'):
+                old = getattr(self, column)
+                new = numpy.zeros(capacity, dtype=old.dtype)
+                new[:self.size] = old[:self.size]
+                setattr(self, column, new)
+
+    def add(self, comp, name, value):
+        """
+        Appends a row for comp
+        :type comp: Component
+        :type name: str
+        :type value: complex
+        :return: the index of the row
+        :rtype: int
+        """
+        if self.size == len(self.kind):
+            self.reserve(2*self.size)
+        index = self.size
+        self.kind[index] = comp.kind
+        self.neg[index] = comp.neg.index
+        self.pos[index] = comp.pos.index
+        self.value[index] = value
+        self.refdes.append(name)
+        self.size += 1
+        return index
+
+    def admittances(self, rows, omegas=None, values=None):
+        """
+        :type rows: numpy.ndarray
+        :param rows: rows of impedances
+        :param omegas: N angular frequencies in rad/s, defaults to self.omega
+        :param values: (N, len(rows)) values to read in place of the stored ones, in the units of self.value
+        :return: the admittance of each row, or an (N, len(rows)) array of them at each frequency or set of values
+        :rtype: numpy.ndarray
+        """
+        kind = self.kind[rows]
+        value = self.value[rows] if values is None else numpy.asarray(values, dtype=complex)
+        omega = self.omega if omegas is None else numpy.asarray(omegas, dtype=float).reshape(-1, 1)
+        y = numpy.empty(numpy.broadcast(omega, value).shape, dtype=complex)
+        y[...] = 1/value
+        capacitors, inductors = kind == Capacitor.kind, kind == Inductor.kind
+        y[..., capacitors] = 1j*omega*value[..., capacitors].real
+        y[..., inductors] = 1/(1j*omega*value[..., inductors].real)
+        return y
+
 
 class Component(object):
     """
-    :type nodes: list[circuit.Node]
-    :type name: str
+    A facade over one row of a ComponentStore
+    :type store: ComponentStore
+    :type index: int
+    :type neg: circuit.Node
+    :type pos: circuit.Node
     :type branch: circuit.Branch
     """
-    def __init__(self, nodes, name):
-        self.nodes = nodes
-        self.refdes = name
+    __slots__ = ('store', 'index', 'neg', 'pos', 'branch', 'node_current_in')
+    kind = 0  # type code of the component in ComponentStore.kind
+    schem_sym_name = 'RBOX'  # name of the SchemDraw element drawn for this type of component, see schem_sym
+
+    def __init__(self, nodes, name, value=0, store=None):
+        """
+        :param nodes: (neg_node, pos_node)
+        :type store: ComponentStore
+        :param store: the store of the circuit the component belongs to. A component created on its own gets a store
+            of its own
+        """
+        self.neg, self.pos = nodes
         self.branch = None
         self.node_current_in = None
         """:type : circuit.Node"""
-        self.schem_sym = e.RBOX
-        """:type : dict"""
         # node_current_in gives node where current enters (passive sign convention)
+        self.store = store if store is not None else ComponentStore(capacity=1)
+        self.index = self.store.add(self, name, value)
 
     @property
-    def neg(self):
+    def refdes(self):
         """
-        :rtype: circuit.Node
-        :return:
+        :rtype: str
         """
-        return self.nodes[0]
+        return self.store.refdes[self.index]
 
     @property
-    def pos(self):
+    def nodes(self):
         """
-        :rtype: circuit.Node
-        :return:
+        :return: (neg_node, pos_node)
+        :rtype: (circuit.Node, circuit.Node)
         """
-        return self.nodes[1]
+        return self.neg, self.pos
+
+    @property
+    def schem_sym(self):
+        """
+        The SchemDraw element for this component. SchemDraw (and matplotlib with it) is only imported here, when a
+        schematic is drawn, so solving a circuit never loads it
+        :rtype: dict
+        """
+        from SchemDraw import elements
+        return getattr(elements, self.schem_sym_name)
 
     @property
     def voltage(self):
@@ -69,16 +171,10 @@ class Component(object):
 
     def parallel(self):
         """
+        Components connected across the same two nodes as this one (this component included)
         :rtype : list[Component]
         """
-        parallel_comps = []
-        for comp in self.pos.connected_comps:
-            if helper_funcs.other_node(comp, self.pos) == self.neg:
-                parallel_comps.append(comp)
-        for comp in self.neg.connected_comps:
-            if helper_funcs.other_node(comp, self.neg) == self.pos:
-                parallel_comps.append(comp)
-        return parallel_comps
+        return helper_funcs.connecting(self.pos, self.neg)
 
     def has_branch(self):
         if self.branch:
@@ -108,76 +204,174 @@ class Component(object):
         else:
             return node2
 
+
 class Impedance(Component):
-    def __init__(self, real, reactive, nodes, name):
+    __slots__ = ()
+    kind = 1
+
+    def __init__(self, real, reactive, nodes, name, store=None):
         """
         nodes should be in the form (neg_node, pos_node)
         """
-        self.z = complex(real, reactive)
-        self.y = 1/self.z
-        self.nodes = nodes
-        self.refdes = name
-        self.branch = None
-        self.schem_sym = e.RBOX
+        super(Impedance, self).__init__(nodes, name, complex(real, reactive), store)
+
+    @property
+    def omega(self):
+        """
+        Angular frequency in rad/s, shared by the components of a circuit. Only capacitors and inductors depend on it
+        :rtype: float
+        """
+        return self.store.omega
+
+    @property
+    def z(self):
+        return complex(self.store.value[self.index])
+
+    @z.setter
+    def z(self, z):
+        self.store.value[self.index] = z
+
+    @property
+    def y(self):
+        return 1/self.z
+
+    @y.setter
+    def y(self, y):
+        self.z = 1/complex(y)
+
+    def set_value(self, value):
+        """
+        Changes the value of the component in place, as it would be written in the netlist (an impedance in Ohms
+        here). The admittance connected to each of its nodes is kept up to date
+        :type value: complex
+        """
+        old_y = self.y
+        self.store.value[self.index] = value
+        for node in self.nodes:
+            node.y_connected += self.y - old_y
+
+    def admittance_at(self, omega):
+        """
+        :type omega: float | numpy.ndarray
+        :param omega: angular frequency in rad/s, or an array of them
+        :return: the admittance at each frequency
+        :rtype: complex | numpy.ndarray
+        """
+        return self.y + 0*omega
 
 
 class Resistor(Impedance):
-    def __init__(self, real, nodes, name):
-        self.z = complex(real,0)
-        self.y = 1/self.z
-        self.nodes = nodes
-        self.refdes = name
-        self.branch = None
-        self.schem_sym = e.RES
+    __slots__ = ()
+    kind = 2
+    schem_sym_name = 'RES'
+
+    def __init__(self, real, nodes, name, store=None):
+        super(Resistor, self).__init__(real, 0, nodes, name, store)
 
 
 class Capacitor(Impedance):
-    def __init__(self, reactive, nodes, name):
-        self.z = complex(0, reactive)
-        self.y = 1/self.z
-        self.nodes = nodes
-        self.refdes = name
-        self.branch = None
-        self.schem_sym = e.CAP
+    __slots__ = ()
+    kind = 3
+    schem_sym_name = 'CAP'
+
+    def __init__(self, capacitance, nodes, name, store=None):
+        """
+        :type capacitance: float
+        :param capacitance: in F
+        """
+        Component.__init__(self, nodes, name, capacitance, store)
+
+    @property
+    def capacitance(self):
+        return self.store.value[self.index].real
+
+    @property
+    def z(self):
+        return 1/self.y
+
+    @property
+    def y(self):
+        return self.admittance_at(self.omega)
+
+    def admittance_at(self, omega):
+        return 1j*omega*self.capacitance
 
 
 class Inductor(Impedance):
-    def __init__(self, reactive, nodes, name):
-        self.z = complex(0, reactive)
-        self.y = 1/self.z
-        self.nodes = nodes
-        self.refdes = name
-        self.branch = None
-        self.schem_sym = e.INDUCTOR
+    __slots__ = ()
+    kind = 4
+    schem_sym_name = 'INDUCTOR'
+
+    def __init__(self, inductance, nodes, name, store=None):
+        """
+        :type inductance: float
+        :param inductance: in H. An inductor is a short circuit at DC, so omega must not be 0
+        """
+        Component.__init__(self, nodes, name, inductance, store)
+
+    @property
+    def inductance(self):
+        return self.store.value[self.index].real
+
+    @property
+    def z(self):
+        return 1j*self.omega*self.inductance
+
+    @property
+    def y(self):
+        return 1/self.z
+
+    def admittance_at(self, omega):
+        return 1/(1j*omega*self.inductance)
 
 
 class CurrentSource(Component):
-    pass
+    __slots__ = ()
+    kind = 6
 
 
 class VCVS(Component):
-    pass
+    __slots__ = ()
+    kind = 7
 
 
 class CCVS(Component):
-    pass
+    __slots__ = ()
+    kind = 8
 
 
 class VCIS(Component):
-    pass
+    __slots__ = ()
+    kind = 9
 
 
 class ICIS(Component):
-    pass
+    __slots__ = ()
+    kind = 10
 
 
 class VoltageSource(Component):
-    def __init__(self, real, reactive, nodes, name):
-        self.v = complex(real, reactive)
-        self.nodes = nodes
-        self.refdes = name
-        self.branch = None
-        self.schem_sym = e.SOURCE_V
+    __slots__ = ()
+    kind = 5
+    schem_sym_name = 'SOURCE_V'
+
+    def __init__(self, real, reactive, nodes, name, store=None):
+        super(VoltageSource, self).__init__(nodes, name, complex(real, reactive), store)
+
+    @property
+    def v(self):
+        return complex(self.store.value[self.index])
+
+    @v.setter
+    def v(self, v):
+        self.store.value[self.index] = v
+
+    def set_value(self, value):
+        """
+        :type value: complex
+        :param value: the new source voltage
+        """
+        self.v = value
 
     def set_other_node_voltage(self):
         """
@@ -196,7 +390,7 @@ component_types = {'R':Resistor, 'C':Capacitor, 'L':Inductor, 'Z':Impedance, 'V'
     'VCVS':VCVS, 'CCVS':CCVS, 'VCIS':VCIS, 'ICIS':ICIS}
 
 
-def create_component(name, comp_list, value, nodes):
+def create_component(name, comp_list, value, nodes, store=None):
     """
     :rtype: Component
     :type name: string
@@ -206,18 +400,20 @@ def create_component(name, comp_list, value, nodes):
     :param comp_list: the dictionary that keeps track of the list of components
     :type nodes: type([circuit.Node])
     :param nodes: the list of nodes that the device connects to (pos, neg)
+    :type store: ComponentStore
+    :param store: where the values of the component are kept, see Component
     :return: returns a refrence to the component that has been created
     """
     if name[0] == 'R':
-        comp_list.append(Resistor(float(value), nodes, name))
+        comp_list.append(Resistor(netlist.parse_value(value), nodes, name, store))
     elif name[0] == 'C':
-        pass
+        comp_list.append(Capacitor(netlist.parse_value(value), nodes, name, store))
     elif name[0] == 'L':
-        pass
+        comp_list.append(Inductor(netlist.parse_value(value), nodes, name, store))
     elif name[0] == 'Z':
-        comp_list.append(Impedance(complex(value).real, complex(value).imag, nodes, name))
+        comp_list.append(Impedance(complex(value).real, complex(value).imag, nodes, name, store))
     elif name[0] == 'V':
-        comp_list.append(VoltageSource(complex(value).real, complex(value).imag, nodes, name))
+        comp_list.append(VoltageSource(complex(value).real, complex(value).imag, nodes, name, store))
     elif name[0] == 'I':
         pass
     elif name[0:4] == "VCVS":
@@ -7,6 +7,8 @@ class Cursor(object):
     In order to traverse a circuit it becomes easier and more intuitive to imagine a cursor moving along branches and
     loops and between nodes. It will make it easier to solve circuits using node voltage and mesh analysis. It will
     also simplify the use of KVL and KCL.
+    What the cursor has seen is kept in sets so checking whether a component or node has been seen is O(1) and a
+    traversal stays linear in the size of the circuit. The order nodes were visited in is kept in node_history.
     """
     def __init__(self, node):
         """
@@ -16,10 +18,12 @@ class Cursor(object):
         """
         self.location = node
         """:type : Node"""
-        self.nodes_seen = []
+        self.nodes_seen = set()
+        """:type : set[Node]"""
+        self.node_history = []  # nodes_seen in the order they were visited
         """:type : list[Node]"""
-        self.components_seen = []
-        """:type : list[components.Component]"""
+        self.components_seen = set()
+        """:type : set[components.Component]"""
         self.breadcrumbs = []  # Keep track where you came from
         """:type : list[Node]"""
 
@@ -31,7 +35,15 @@ class Cursor(object):
         Returns the last node seen by the cursor. If the cursor has not been moved, no nodes have been
         seen, raises IndexError.
         """
-        return self.nodes_seen[-1]
+        return self.node_history[-1]
+
+    def see_node(self, node):
+        """
+        Marks node as seen
+        :type node: Node
+        """
+        self.nodes_seen.add(node)
+        self.node_history.append(node)
 
     def vsources_connected(self):
         """
@@ -53,11 +65,11 @@ class Cursor(object):
         :return: the list of components stepped over (connecting to the current node and the next node)
         """
         connecting_list = helper_funcs.connecting(node, self.location)
-        if node not in self.directions():
+        if not connecting_list:
             return self.location
         self.location = node
-        self.components_seen.extend(connecting_list)
-        self.nodes_seen.append(self.location)
+        self.components_seen.update(connecting_list)
+        self.see_node(self.location)
         return connecting_list
 
     def unseen(self, comp_list):
@@ -80,14 +92,15 @@ class Cursor(object):
         :type node: Node
         :return: the component stepped along (the one marked as seen)
         """
-        unseen_connecting_list = self.unseen(helper_funcs.connecting(node, self.location))
-        if node not in self.directions():
+        connecting_list = helper_funcs.connecting(node, self.location)
+        if not connecting_list:
             raise ValueError
+        unseen_connecting_list = self.unseen(connecting_list)
         self.location = node
         if not unseen_connecting_list:
             return []
-        self.components_seen.append(unseen_connecting_list[0])
-        self.nodes_seen.append(self.location)
+        self.components_seen.add(unseen_connecting_list[0])
+        self.see_node(self.location)
         return unseen_connecting_list[0]
 
     def step_forward(self):
@@ -120,10 +133,10 @@ class Cursor(object):
 
     def directions(self):
         """
-        Returns a list containing the directions (nodes) the cursor can go
+        Returns a list containing the directions (nodes) the cursor can go, each adjacent node appearing once
         :rtype: list[Node]
         """
-        return [helper_funcs.other_node(comp, self.location) for comp in self.location.connected_comps]
+        return self.location.adjacent_nodes  # kept by Node.add_comp, only read here
 
     def new_directions(self):
         """
@@ -165,7 +178,7 @@ class Cursor(object):
 
     @property
     def at_branch_end(self):
-        if len(self.directions()) > 2:
+        if self.location.num_comp_connected > 2:
             return True
         else:
             return False
@@ -190,12 +203,20 @@ class KCLCursor(Cursor):
         self.branch = branch
 
     def step_down_branch(self):
-        for comp in self.branch.component_list:
-            if ((self.location in comp.nodes) and (comp not in self.components_seen)):
+        """
+        Steps over the next component of the branch. Only that component is marked as seen, so components in
+        parallel with it that belong to other branches are left for their own branch
+        :return: a list holding the component stepped over
+        :rtype: list[components.Component]
+        """
+        for comp in self.location.connected_comps:
+            if comp.branch is self.branch and comp not in self.components_seen:
                 component_to_jump_over = comp
                 break
-        destination = helper_funcs.other_node(component_to_jump_over, self.location)
-        return self.step_to(destination)
+        self.location = helper_funcs.other_node(component_to_jump_over, self.location)
+        self.components_seen.add(component_to_jump_over)
+        self.see_node(self.location)
+        return [component_to_jump_over]
 
 
 class BranchCreatorCursor(Cursor):
@@ -1,6 +1,18 @@
+import collections
+
 import components
 
 
+def voltage_name(node_num):
+    """
+    :type node_num: int | str
+    :return: the name of the voltage of a node, V(<node_num>) as in SPICE. The netlist parser rejects refdes holding
+        parentheses (see netlist.parse_netlist), so it never names the value of a component
+    :rtype: str
+    """
+    return "V({0})".format(node_num)
+
+
 def only_vsources(comp_list):
     """
     Filters a list of components and returns the sublist of voltage sources
@@ -21,6 +33,16 @@ def only_resistances(comp_list):
     return filter(lambda comp: isinstance(comp, components.Resistor), comp_list)
 
 
+def only_impedances(comp_list):
+    """
+    Filters a list of components and returns the sublist of impedances (resistors, capacitors, inductors and
+    complex impedances)
+    :type comp_list: list[components.Component]
+    :rtype: list[components.Impedance]
+    """
+    return filter(lambda comp: isinstance(comp, components.Impedance), comp_list)
+
+
 def other_node(comp, node):
     """
     :type comp: components.Component
@@ -33,6 +55,20 @@ def other_node(comp, node):
         return comp.pos
 
 
+def loops_through(loops):
+    """
+    :type loops: list[circuit.Loop]
+    :return: every branch some loop runs through, with the position in loops of each loop running through it and
+        the direction it runs (see Loop.branches)
+    :rtype: collections.OrderedDict[circuit.Branch, list[(int, int)]]
+    """
+    through = collections.OrderedDict()
+    for i, loop in enumerate(loops):
+        for branch, direction in loop.branches:
+            through.setdefault(branch, []).append((i, direction))
+    return through
+
+
 def only_branchless(comps):
     """
     filters out all components that have been assigned branches
@@ -42,6 +78,45 @@ def only_branchless(comps):
     return filter(lambda comp: not comp.has_branch(), comps)
 
 
+class DisjointSet(object):
+    """
+    Union-find over hashable items with union by size and path compression. Items are added the first time they
+    are seen
+    """
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def find(self, item):
+        """
+        :return: the representative of the set containing item
+        """
+        if item not in self.parent:
+            self.parent[item] = item
+            self.size[item] = 1
+            return item
+        root = item
+        while self.parent[root] is not root:
+            root = self.parent[root]
+        while self.parent[item] is not root:  # point everything on the path straight at the root
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, item1, item2):
+        """
+        Merges the sets containing item1 and item2
+        :return: the representative of the merged set
+        """
+        root1, root2 = self.find(item1), self.find(item2)
+        if root1 is root2:
+            return root1
+        if self.size[root1] < self.size[root2]:
+            root1, root2 = root2, root1
+        self.parent[root2] = root1
+        self.size[root1] += self.size[root2]
+        return root1
+
+
 def connecting(node1, node2):
     """
     Gives all the components connected two nodes
@@ -52,14 +127,7 @@ def connecting(node1, node2):
     :return: A list containing all the components connecting node1 and node2
     :rtype list[components.Component:
     """
-    comp_list = []
-    """:type : list[components.Component]"""
     if node1 == node2:
         return []
-    for comp in node1.connected_comps:
-        if comp.neg == node2:
-            comp_list.append(comp)
-        elif comp.pos == node2:
-            comp_list.append(comp)
-    return comp_list
+    return node1.connecting(node2)
 
@@ -0,0 +1,171 @@
+""" Instrumentation of the stages of Circuit and Solver.
+    Every stage method is wrapped with stage(). While a sink is registered each call emits an event with its wall
+    time, CPU time, how much it raised the peak resident memory of the process and the sizes of the circuit and
+    equations it worked on:
+        with instrument.recording(instrument.MemorySink()) as sink:
+            my_solver.solve()
+        print(sink.by_stage())
+    Stages called by other stages (e.g. by Solver.solve) emit their own events, with a larger depth. With no sink
+    registered a stage costs one extra function call and a check of an empty list.
+"""
+import contextlib
+import functools
+import json
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+sinks = []
+""":type : list[Sink]"""  # events are only measured while at least one sink is registered
+cpu_time = getattr(time, 'process_time', time.clock)  # time.clock is the CPU time of the process on Unix
+_depth = [0]  # number of stages running, including the one being measured
+
+
+def peak_kb():
+    """
+    :return: peak resident set size of the process in kB, or None where it cannot be read
+    :rtype: int
+    """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Sink(object):
+    """ Receives the event of every instrumented stage """
+    def record(self, event):
+        """
+        :type event: dict
+        :param event: stage (Class.method), depth (1 for a stage called from outside any other), wall and cpu seconds,
+            peak_kb_before and peak_kb_after, the peak resident memory of the process around the call (a high-water
+            mark over its whole lifetime), peak_growth_kb, how much the call raised it (None where it cannot be read),
+            sizes (see Circuit.sizes and Solver.sizes) and error, the exception raised by the stage or None
+        """
+        raise NotImplementedError
+
+
+class MemorySink(Sink):
+    """
+    Keeps every event in self.events
+    :type events: list[dict]
+    """
+    def __init__(self):
+        self.events = []
+
+    def record(self, event):
+        self.events.append(event)
+
+    def by_stage(self):
+        """
+        :return: the number of calls and the total wall and cpu seconds of each stage
+        :rtype: dict[str, dict]
+        """
+        totals = {}
+        for event in self.events:
+            total = totals.setdefault(event['stage'], {'calls': 0, 'wall': 0., 'cpu': 0.})
+            total['calls'] += 1
+            total['wall'] += event['wall']
+            total['cpu'] += event['cpu']
+        return totals
+
+
+class JSONSink(Sink):
+    """ Writes each event as a line of JSON """
+    def __init__(self, filename):
+        """
+        :type filename: str
+        :param filename: events are appended to this file
+        """
+        self.file = open(filename, 'a')
+
+    def record(self, event):
+        self.file.write(json.dumps(event, sort_keys=True) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class LogSink(Sink):
+    """ Logs a line per event """
+    def __init__(self, logger=None, level=None):
+        """
+        :type logger: logging.Logger
+        :param logger: the 'AutoSchaum' logger by default
+        :type level: int
+        :param level: logging.INFO by default
+        """
+        import logging  # only loaded when events are logged
+        self.logger = logger if logger is not None else logging.getLogger('AutoSchaum')
+        self.level = level if level is not None else logging.INFO
+
+    def record(self, event):
+        sizes = ', '.join('{0} {1}'.format(name, size) for name, size in sorted(event['sizes'].items()))
+        self.logger.log(self.level, '%s%s: %.6f s wall, %.6f s cpu, peak +%s kB, %s%s', '  '*(event['depth'] - 1),
+                        event['stage'], event['wall'], event['cpu'], event['peak_growth_kb'], sizes,
+                        ', failed with ' + event['error'] if event['error'] else '')
+
+
+def add_sink(sink):
+    """
+    :type sink: Sink
+    """
+    sinks.append(sink)
+
+
+def remove_sink(sink):
+    """
+    :type sink: Sink
+    """
+    sinks.remove(sink)
+
+
+@contextlib.contextmanager
+def recording(sink):
+    """
+    Registers sink for the duration of a with block
+    :type sink: Sink
+    :return: sink
+    """
+    add_sink(sink)
+    try:
+        yield sink
+    finally:
+        remove_sink(sink)
+
+
+def stage(method):
+    """
+    Decorates a method of Circuit or Solver (or of anything with a sizes method) as an instrumented stage
+    """
+    @functools.wraps(method)
+    def instrumented(self, *args, **kwargs):
+        if not sinks:
+            return method(self, *args, **kwargs)
+        return _measure(self, method, args, kwargs)
+    return instrumented
+
+
+def _measure(instance, method, args, kwargs):
+    error = None
+    _depth[0] += 1
+    peak_before = peak_kb()
+    start_wall, start_cpu = time.time(), cpu_time()
+    try:
+        return method(instance, *args, **kwargs)
+    except BaseException as e:
+        error = '{0}: {1}'.format(type(e).__name__, e)
+        raise
+    finally:
+        wall, cpu = time.time() - start_wall, cpu_time() - start_cpu
+        peak_after = peak_kb()
+        event = {'stage': '{0}.{1}'.format(type(instance).__name__, method.__name__), 'depth': _depth[0],
+                 'wall': wall, 'cpu': cpu, 'peak_kb_before': peak_before, 'peak_kb_after': peak_after,
+                 'peak_growth_kb': None if peak_before is None else peak_after - peak_before,
+                 'sizes': instance.sizes(), 'error': error}
+        _depth[0] -= 1
+        for sink in list(sinks):
+            sink.record(event)
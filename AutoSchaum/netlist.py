@@ -0,0 +1,319 @@
+""" Netlist parsing.
+    A netlist file is read once, line by line. Every element line is split a single time and its node names are
+    interned into a compact index map, so node names can be anything (numbers, 'out', 'vdd'...) and a netlist that
+    uses node 100000 does not need 100001 nodes. The result is a Netlist, the intermediate representation that
+    Circuit builds its nodes and components from.
+    Blank lines and comment lines (starting with '*' or '#') are skipped. 'gnd' is an alias for node 0.
+    Resistances, capacitances and inductances may use the SPICE scale suffixes (10k, 4.7u, 2meg...), see parse_value.
+    Netlists may be hierarchical. A block of element lines between
+        .SUBCKT [name] [port]...
+        .ENDS [name]
+    defines a subcircuit, which is placed by instance lines
+        X[name] [node]... [subcircuit name]
+    that connect the ports of the subcircuit to nodes, in order. Subcircuits may be placed before they are defined and
+    may place other subcircuits, but not be defined inside one another. Ground inside a subcircuit is the ground of
+    the circuit, see Subcircuit.uses_ground. Netlist.flattened expands every instance into the elements of its body,
+    for the solvers that cannot stamp the reduced equivalent of a subcircuit.
+"""
+import collections
+import re
+
+Element = collections.namedtuple('Element', ['refdes', 'neg', 'pos', 'value'])
+""" One element line of a netlist. neg and pos are node indices into Netlist.node_names, value is left as a string
+    since its meaning depends on the type of component """
+
+Instance = collections.namedtuple('Instance', ['refdes', 'nodes', 'subckt'])
+""" One instance line of a netlist. nodes are node indices into Netlist.node_names, in the order of the ports of the
+    subcircuit named by subckt """
+
+COMMENT_CHARS = ('*', '#')
+DIRECTIVE_CHARS = '.Xx'  # first character of the lines that are not elements, see parse_directive
+GROUND_ALIASES = ('gnd', 'GND', 'Gnd')
+SCALE_SUFFIXES = {'t': 1e12, 'g': 1e9, 'meg': 1e6, 'k': 1e3, 'm': 1e-3, 'u': 1e-6, 'n': 1e-9, 'p': 1e-12,
+                  'f': 1e-15}
+VALUE_PATTERN = re.compile(r'^([-+]?(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?)(meg|[tgkmunpf])?[a-z]*$', re.IGNORECASE)
+
+
+def node_name(token):
+    """
+    Numeric node names keep their integer value so circuits written with numbered nodes are addressed as before
+    :type token: str
+    :rtype: int | str
+    """
+    if token.isdigit():
+        return int(token)
+    if token in GROUND_ALIASES:
+        return 0
+    return token
+
+
+def parse_value(token):
+    """
+    Reads a real component value. As in SPICE the number may be followed by a scale suffix, case insensitive
+    (m is milli and meg is mega), and then by any letters, which are ignored: 4.7uF, 10k, 1MEG, 5mH
+    :type token: str
+    :rtype: float
+    """
+    match = VALUE_PATTERN.match(token)
+    if match is None:
+        raise ValueError('"{0}" is not a component value'.format(token))
+    number, suffix = match.groups()
+    return float(number)*SCALE_SUFFIXES[suffix.lower()] if suffix else float(number)
+
+
+class Netlist(object):
+    """
+    The parsed form of a netlist file
+    :type name: str
+    :type node_names: list[int | str]
+    :type node_index: dict[int | str, int]
+    :type elements: list[Element]
+    :type instances: list[Instance]
+    :type subcircuits: collections.OrderedDict[str, Subcircuit]
+    """
+
+    def __init__(self, name='', subcircuits=None):
+        """
+        :type subcircuits: collections.OrderedDict[str, Subcircuit]
+        :param subcircuits: the subcircuits the instances are looked up in. The body of a subcircuit shares those of
+            the circuit it is defined in
+        """
+        self.name = name
+        self.node_names = []  # node names in the order they first appear, indexed by node index
+        self.node_index = {}  # node name -> node index
+        self.token_index = {}  # raw token -> node index, so each distinct token is only converted once
+        self.elements = []
+        self.instances = []
+        self.subcircuits = collections.OrderedDict() if subcircuits is None else subcircuits
+
+    @property
+    def num_nodes(self):
+        return len(self.node_names)
+
+    def intern(self, token):
+        """
+        :type token: str
+        :return: the index of the node named by token, allocating a new index the first time a name is seen
+        :rtype: int
+        """
+        index = self.token_index.get(token)
+        if index is None:
+            name = node_name(token)
+            index = self.node_index.get(name)
+            if index is None:
+                index = self.node_index[name] = len(self.node_names)
+                self.node_names.append(name)
+            self.token_index[token] = index
+        return index
+
+    def add_element(self, refdes, neg, pos, value):
+        """
+        :type refdes: str
+        :type neg: str
+        :type pos: str
+        :type value: str
+        :rtype: Element
+        """
+        self.elements.append(Element(refdes, self.intern(neg), self.intern(pos), value))
+        return self.elements[-1]
+
+    def add_instance(self, refdes, nodes, subckt):
+        """
+        :type refdes: str
+        :type nodes: list[str]
+        :type subckt: str
+        :rtype: Instance
+        """
+        self.instances.append(Instance(refdes, tuple(self.intern(node) for node in nodes), subckt))
+        return self.instances[-1]
+
+    def flattened(self):
+        """
+        Expands every instance, recursively, into the elements of the body of its subcircuit. As in SPICE the
+        elements and internal nodes of an instance are named after the path of instances they sit in: R1 inside X2
+        inside X1 becomes R.X1.X2.R1, and its node m becomes X1.X2.m. Ports are the nodes the instance connects to
+        :return: a netlist without instances or subcircuits
+        :rtype: Netlist
+        """
+        flat = Netlist(self.name)
+        flat.inline(self, [flat.intern(str(name)) for name in self.node_names], '')
+        return flat
+
+    def inline(self, source, nodes, path):
+        """
+        Adds the elements of source, and those of its instances, to this netlist
+        :type source: Netlist
+        :type nodes: list[int]
+        :param nodes: the node index in this netlist of each node of source
+        :type path: str
+        :param path: the instances source sits in, each followed by a '.', or '' for the top level
+        """
+        for element in source.elements:
+            refdes = '{0}.{1}{2}'.format(element.refdes[0], path, element.refdes) if path else element.refdes
+            self.elements.append(Element(refdes, nodes[element.neg], nodes[element.pos], element.value))
+        for instance in source.instances:
+            definition = source.subcircuits[instance.subckt]
+            inner_path = path + instance.refdes + '.'
+            body_nodes = dict((port, nodes[node]) for port, node in zip(definition.port_indices, instance.nodes))
+            self.inline(definition.body, [body_nodes[index] if index in body_nodes else
+                                          self.intern(inner_path + str(name))
+                                          for index, name in enumerate(definition.body.node_names)], inner_path)
+
+    def resolve_instances(self):
+        """
+        Checks every instance of the circuit and of the subcircuits against the subcircuit it places, once every
+        definition has been read. Instances of subcircuits whose body uses ground get ground as their last node
+        :return:
+        """
+        resolved = set()
+
+        def resolve(parsed, stack):
+            for i, instance in enumerate(parsed.instances):
+                subckt = self.subcircuits.get(instance.subckt)
+                if subckt is None:
+                    raise ValueError('{0} places subcircuit {1}, which is not defined'.format(instance.refdes,
+                                                                                          instance.subckt))
+                if subckt.name in stack:
+                    raise ValueError('Subcircuit {0} places itself'.format(subckt.name))
+                if subckt.name not in resolved:
+                    resolve(subckt.body, stack + [subckt.name])
+                    subckt.close()
+                    resolved.add(subckt.name)
+                if len(instance.nodes) != len(subckt.ports):
+                    raise ValueError('{0} connects {1} nodes but subcircuit {2} has {3} ports'.format(
+                        instance.refdes, len(instance.nodes), subckt.name, len(subckt.ports)))
+                if subckt.uses_ground:
+                    parsed.instances[i] = instance._replace(nodes=instance.nodes + (parsed.intern('0'),))
+        resolve(self, [])
+        for subckt in self.subcircuits.values():
+            if subckt.name not in resolved:
+                resolve(subckt.body, [subckt.name])
+                subckt.close()
+                resolved.add(subckt.name)
+
+
+class Subcircuit(object):
+    """
+    A .SUBCKT definition. Its body is a Netlist of its own in which the ports are the first nodes. Ground (node 0)
+    inside the body is the ground of the circuit rather than a node of the subcircuit, so a body that uses it gets
+    ground as an extra last port, which every instance connects to ground
+    :type name: str
+    :type ports: list[int | str]
+    :type body: Netlist
+    :type port_indices: list[int]
+    :type uses_ground: bool
+    :type equivalents: dict[float, subcircuit.PortEquivalent]
+    """
+
+    def __init__(self, name, ports, subcircuits):
+        """
+        :type name: str
+        :type ports: list[str]
+        :param ports: the port tokens of the .SUBCKT line
+        :type subcircuits: collections.OrderedDict[str, Subcircuit]
+        :param subcircuits: the subcircuits of the circuit it is defined in
+        """
+        self.name = name
+        self.body = Netlist(name, subcircuits)
+        self.port_indices = [self.body.intern(port) for port in ports]  # node indices of the ports in the body
+        if len(set(self.port_indices)) != len(self.port_indices):
+            raise ValueError('Subcircuit {0} lists a port more than once'.format(name))
+        self.ports = [self.body.node_names[index] for index in self.port_indices]  # as declared, without ground
+        self.uses_ground = False
+        self.equivalents = {}  # angular frequency -> the reduced equivalent, filled in by subcircuit.port_equivalent
+
+    def close(self):
+        """
+        Adds ground to the ports once the body has been read, if the body uses it
+        """
+        ground = self.body.node_index.get(0)
+        if ground is not None and ground not in self.port_indices:
+            self.uses_ground = True
+            self.port_indices.append(ground)
+
+
+def tokenize(netlist_file):
+    """
+    Streams the element lines of a netlist. The first line (the circuit name) must already have been consumed
+    :type netlist_file: collections.Iterable[str]
+    :return: yields the line number and the tokens of each line that is neither blank nor a comment
+    :rtype: collections.Iterable[(int, list[str])]
+    """
+    for line_num, line in enumerate(netlist_file, 2):
+        tokens = line.split()
+        if not tokens or tokens[0].startswith(COMMENT_CHARS):
+            continue
+        yield line_num, tokens
+
+
+def parse_netlist(netlist_file):
+    """
+    Reads a netlist in a single pass
+    :type netlist_file: collections.Iterable[str]
+    :param netlist_file: an open netlist file (or any iterable of lines). The first line is the circuit name
+    :rtype: Netlist
+    """
+    lines = iter(netlist_file)
+    parsed = Netlist(next(lines, '').strip())
+    current = parsed  # where element lines go: the circuit, or the body of the subcircuit being defined
+    # this loop runs once per line of very large netlists, so lookups are bound to locals and known tokens are
+    # resolved inline rather than through Netlist.intern
+    token_index, intern, elements, new_element = parsed.token_index, parsed.intern, parsed.elements, tuple.__new__
+    for line_num, tokens in tokenize(lines):
+        if tokens[0][0] in DIRECTIVE_CHARS:
+            current = parse_directive(parsed, current, line_num, tokens)
+            token_index, intern, elements = current.token_index, current.intern, current.elements
+            continue
+        if len(tokens) != 4:
+            raise ValueError('Line {0}: expected "[refdes] [node] [node] [value]" but got "{1}"'.format(
+                line_num, ' '.join(tokens)))
+        refdes, neg, pos, value = tokens
+        if '(' in refdes:
+            raise ValueError('Line {0}: refdes {1} holds a parenthesis, which is kept for node voltages such as '
+                             'V(1)'.format(line_num, refdes))
+        neg = token_index[neg] if neg in token_index else intern(neg)
+        pos = token_index[pos] if pos in token_index else intern(pos)
+        elements.append(new_element(Element, (refdes, neg, pos, value)))
+    if current is not parsed:
+        raise ValueError('Subcircuit {0} has no .ENDS'.format(current.name))
+    parsed.resolve_instances()
+    return parsed
+
+
+def parse_directive(parsed, current, line_num, tokens):
+    """
+    Reads an instance line or a dot command line
+    :type parsed: Netlist
+    :param parsed: the circuit being read
+    :type current: Netlist
+    :param current: where element lines currently go
+    :type line_num: int
+    :type tokens: list[str]
+    :return: where element lines go after this line
+    :rtype: Netlist
+    """
+    keyword = tokens[0].upper()
+    if keyword[0] == 'X':
+        if len(tokens) < 3:
+            raise ValueError('Line {0}: expected "[refdes] [node]... [subcircuit]" but got "{1}"'.format(
+                line_num, ' '.join(tokens)))
+        current.add_instance(tokens[0], tokens[1:-1], tokens[-1])
+        return current
+    if keyword == '.SUBCKT':
+        if current is not parsed:
+            raise ValueError('Line {0}: subcircuit {1} is defined inside subcircuit {2}'.format(
+                line_num, tokens[1] if len(tokens) > 1 else '', current.name))
+        if len(tokens) < 3:
+            raise ValueError('Line {0}: expected ".SUBCKT [name] [port]..." but got "{1}"'.format(
+                line_num, ' '.join(tokens)))
+        if tokens[1] in parsed.subcircuits:
+            raise ValueError('Line {0}: subcircuit {1} is defined twice'.format(line_num, tokens[1]))
+        subckt = parsed.subcircuits[tokens[1]] = Subcircuit(tokens[1], tokens[2:], parsed.subcircuits)
+        return subckt.body
+    if keyword == '.ENDS':
+        if current is parsed:
+            raise ValueError('Line {0}: .ENDS outside of a subcircuit'.format(line_num))
+        return parsed
+    if keyword == '.END':
+        return current
+    raise ValueError('Line {0}: unknown command "{1}"'.format(line_num, tokens[0]))
@@ -0,0 +1,475 @@
+""" Numeric engine for circuits too large for the symbolic pipeline.
+    The circuit is stamped into a sparse modified nodal analysis (MNA) system straight from the columns of its
+    components.ComponentStore:
+        [Y  B] [V]   [0]
+        [B' 0] [I] = [E]
+    where Y is the admittance matrix with the reference node removed, B maps each voltage source onto the nodes it
+    connects, V are the node voltages, I are the currents through the voltage sources and E are the source voltages.
+    The system is factorized with a sparse LU and every quantity comes back as a numpy array. Once factorized, a
+    change to a single component is a rank one change to the system (Y changes by dy*u*u' where u is +1 at the pos
+    node of the impedance and -1 at its neg node) so the solution is updated with the Sherman-Morrison formula
+    rather than a new factorization, see NodalSystem.update.
+    Each subcircuit instance adds the port admittance matrix of its definition to Y at the rows of the nodes its ports
+    connect to, and the Norton currents of its sources to the right hand side (see subcircuit.py).
+"""
+import components
+
+import numpy
+import scipy.sparse
+import scipy.sparse.linalg
+
+DENSE_BATCH_LIMIT = 2**22  # largest number of dense matrix entries solve_batch solves in one batched call
+MAX_LOW_RANK_UPDATES = 64  # impedances changed on top of a factorization before update factorizes again
+IMPEDANCE_KINDS = [components.Impedance.kind, components.Resistor.kind, components.Capacitor.kind,
+                   components.Inductor.kind]
+
+
+def admittance_matrix(circuit):
+    """
+    Assembles the full (num_nodes x num_nodes) admittance matrix of a circuit from the columns of its component store
+    :type circuit: circuit.Circuit
+    :rtype: scipy.sparse.csr_matrix
+    """
+    store = circuit.store
+    impedances = numpy.flatnonzero(numpy.in1d(store.kind[:store.size], IMPEDANCE_KINDS))
+    pos, neg, y = store.pos[impedances], store.neg[impedances], store.admittances(impedances)
+    rows = numpy.concatenate([pos, neg, pos, neg])
+    cols = numpy.concatenate([pos, neg, neg, pos])
+    data = numpy.concatenate([y, y, -y, -y])
+    if circuit.instance_list:
+        import subcircuit
+        ports = [numpy.array([node.index for node in instance.nodes]) for instance in circuit.instance_list]
+        equivalents = [subcircuit.port_equivalent(instance.definition, store.omega)
+                       for instance in circuit.instance_list]
+        rows = numpy.concatenate([rows] + [numpy.repeat(port, len(port)) for port in ports])
+        cols = numpy.concatenate([cols] + [numpy.tile(port, len(port)) for port in ports])
+        data = numpy.concatenate([data] + [equivalent.y.ravel() for equivalent in equivalents])
+    return scipy.sparse.coo_matrix((data, (rows, cols)), shape=(circuit.num_nodes, circuit.num_nodes)).tocsr()
+
+
+class NodalSystem(object):
+    """
+    The MNA system of a circuit. The stamp pattern (which matrix entries each component touches) and the sparsity
+    structure of the matrix are worked out once at construction, so the system can be re-assembled cheaply for new
+    component values, or for many sets of values at once (see solve_batch).
+    :type circuit: circuit.Circuit
+    :type ref: circuit.Node
+    """
+
+    def __init__(self, circuit, ref):
+        """
+        :type circuit: circuit.Circuit
+        :param circuit: A circuit whose nodes have been created and populated
+        :type ref: circuit.Node
+        :param ref: The reference (ground) node. Its voltage is 0 and it gets no row in the system
+        """
+        self.circuit = circuit
+        self.ref = ref
+        self.store = store = circuit.store
+        for comp in circuit.component_list[store.size:]:  # appended to the circuit without a row in its store
+            if not isinstance(comp, (components.Impedance, components.VoltageSource)):
+                raise NotImplementedError('{0} is not supported by the numeric solver'.format(comp.refdes))
+            raise ValueError('{0} was not created in the store of the circuit'.format(comp.refdes))
+        kind = store.kind[:store.size]
+        is_impedance, is_source = numpy.in1d(kind, IMPEDANCE_KINDS), kind == components.VoltageSource.kind
+        unsupported = numpy.flatnonzero(~(is_impedance | is_source))
+        if len(unsupported):
+            raise NotImplementedError('{0} is not supported by the numeric solver'.format(
+                store.refdes[unsupported[0]]))
+        self.impedance_rows = numpy.flatnonzero(is_impedance)  # rows of the store, in the order of the impedances
+        self.source_rows = numpy.flatnonzero(is_source)
+        self.impedances = [circuit.component_list[row] for row in self.impedance_rows]
+        """:type : list[components.Impedance]"""
+        self.sources = [circuit.component_list[row] for row in self.source_rows]
+        """:type : list[components.VoltageSource]"""
+        self.slot_of = {}  # refdes -> (is_source, index into impedances or sources)
+        """:type : dict[str, (bool, int)]"""
+        self.slot_of.update((store.refdes[row], (False, i)) for i, row in enumerate(self.impedance_rows))
+        self.slot_of.update((store.refdes[row], (True, i)) for i, row in enumerate(self.source_rows))
+        # position of each component of component_list in the impedance currents followed by the source currents
+        self.component_take = numpy.empty(store.size, dtype=int)
+        self.component_take[self.impedance_rows] = numpy.arange(len(self.impedance_rows))
+        self.component_take[self.source_rows] = len(self.impedance_rows) + numpy.arange(len(self.source_rows))
+        self.num_nodes = circuit.num_nodes
+        self.row_of = numpy.arange(self.num_nodes) - (numpy.arange(self.num_nodes) > ref.index)
+        self.row_of[ref.index] = -1  # every node except ref gets a row, in node order
+        self.num_free_nodes = self.num_nodes - 1
+        self.size = self.num_free_nodes + len(self.sources)
+        self.imp_pos, self.imp_neg = store.pos[self.impedance_rows], store.neg[self.impedance_rows]
+        self.src_pos, self.src_neg = store.pos[self.source_rows], store.neg[self.source_rows]
+        self.instances = circuit.instance_list
+        """:type : list[circuit.Instance]"""
+        self._stamp_pattern()
+        self._compile_pattern()
+        self._lu = None
+        self._branch_map = None
+
+    def _stamp_pattern(self):
+        """
+        Works out the (row, col) of every entry stamped by a component. Impedance entries are sign*y[imp_entry] while
+        the entries tying voltage sources to their nodes are constant +-1
+        """
+        p, n = self.row_of[self.imp_pos], self.row_of[self.imp_neg]
+        num_imp = len(self.impedances)
+        rows = numpy.concatenate([p, n, p, n])
+        cols = numpy.concatenate([p, n, n, p])
+        self.imp_entry = numpy.tile(numpy.arange(num_imp), 4)
+        self.imp_sign = numpy.repeat([1, 1, -1, -1], num_imp)
+        keep = (rows >= 0) & (cols >= 0)
+        self.imp_rows, self.imp_cols = rows[keep], cols[keep]
+        self.imp_entry, self.imp_sign = self.imp_entry[keep], self.imp_sign[keep]
+        source_rows = self.num_free_nodes + numpy.arange(len(self.sources))
+        p, n = self.row_of[self.src_pos], self.row_of[self.src_neg]
+        rows = numpy.concatenate([p, n, source_rows, source_rows])
+        cols = numpy.concatenate([source_rows, source_rows, p, n])
+        data = numpy.repeat([1, -1, 1, -1], len(self.sources))
+        keep = (rows >= 0) & (cols >= 0)
+        self.src_rows, self.src_cols, self.src_data = rows[keep], cols[keep], data[keep]
+        ports = [self.row_of[[node.index for node in instance.nodes]] for instance in self.instances]
+        self.inst_port_rows = numpy.concatenate([numpy.zeros(0, dtype=int)] + ports)
+        rows = numpy.concatenate([numpy.zeros(0, dtype=int)] + [numpy.repeat(port, len(port)) for port in ports])
+        cols = numpy.concatenate([numpy.zeros(0, dtype=int)] + [numpy.tile(port, len(port)) for port in ports])
+        self.inst_keep = numpy.flatnonzero((rows >= 0) & (cols >= 0))  # into the flattened port admittances
+        self.inst_rows, self.inst_cols = rows[self.inst_keep], cols[self.inst_keep]
+
+    def _compile_pattern(self):
+        """
+        Works out the CSC structure of the matrix. Stamped entries landing on the same position are summed through
+        self.scatter, a sparse (stamped entries x nonzeros) matrix of ones
+        """
+        rows = numpy.concatenate([self.imp_rows, self.src_rows, self.inst_rows])
+        cols = numpy.concatenate([self.imp_cols, self.src_cols, self.inst_cols])
+        keys, slot = numpy.unique(cols*self.size + rows, return_inverse=True)  # sorted column major, as in CSC
+        self.nnz = len(keys)
+        self.indices = keys % self.size
+        self.indptr = numpy.searchsorted(keys // self.size, numpy.arange(self.size + 1))
+        self.scatter = scipy.sparse.csr_matrix((numpy.ones(len(slot)), (numpy.arange(len(slot)), slot)),
+                                               shape=(len(slot), self.nnz))
+
+    def admittances(self):
+        """
+        :return: The admittance of every impedance in the circuit, in the order of self.impedances
+        :rtype: numpy.ndarray
+        """
+        return self.store.admittances(self.impedance_rows)
+
+    def admittances_at(self, omegas):
+        """
+        :param omegas: N angular frequencies in rad/s
+        :return: (N, len(impedances)) admittances of every impedance at each frequency
+        :rtype: numpy.ndarray
+        """
+        return self.store.admittances(self.impedance_rows, omegas)
+
+    def source_voltages(self):
+        """
+        :return: The voltage of every voltage source in the circuit, in the order of self.sources
+        :rtype: numpy.ndarray
+        """
+        return self.store.value[self.source_rows]
+
+    def instance_stamps(self, omegas=None):
+        """
+        The entries the instances of subcircuits stamp into the matrix and the right hand side, from the equivalent of
+        each definition (see subcircuit.port_equivalent)
+        :param omegas: N angular frequencies in rad/s, defaults to the frequency of the circuit
+        :return: the port admittances stamped at (inst_rows, inst_cols) and the Norton currents injected into each row
+            of the system, with a leading axis of N when omegas are given
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        points = [self.store.omega] if omegas is None else numpy.ravel(omegas)
+        entries = numpy.zeros((len(points), len(self.inst_keep)), dtype=complex)
+        currents = numpy.zeros((len(points), self.size), dtype=complex)
+        if self.instances:
+            import subcircuit
+            keep = self.inst_port_rows >= 0
+            for k, omega in enumerate(points):
+                equivalents = [subcircuit.port_equivalent(instance.definition, omega) for instance in self.instances]
+                entries[k] = numpy.concatenate([equivalent.y.ravel() for equivalent in equivalents])[self.inst_keep]
+                j = numpy.concatenate([equivalent.j for equivalent in equivalents])
+                numpy.add.at(currents[k], self.inst_port_rows[keep], j[keep])
+        if omegas is None:
+            return entries[0], currents[0]
+        return entries, currents
+
+    def nonzeros(self, y, instance_entries=None):
+        """
+        :param y: admittances, either one per impedance or an (N, len(impedances)) array of N sets of admittances
+        :param instance_entries: the entries stamped by subcircuit instances (see instance_stamps), one row per set of
+            admittances or shared by every set. Defaults to those at the frequency of the circuit
+        :return: the nonzero entries of the matrix in CSC order, one row per set of admittances
+        :rtype: numpy.ndarray
+        """
+        y = numpy.asarray(y, dtype=complex)
+        if instance_entries is None:
+            instance_entries = self.instance_stamps()[0]
+        source_entries = numpy.broadcast_to(self.src_data, y.shape[:-1] + self.src_data.shape)
+        instance_entries = numpy.broadcast_to(instance_entries, y.shape[:-1] + self.inst_rows.shape)
+        entries = numpy.concatenate([self.imp_sign*y[..., self.imp_entry], source_entries, instance_entries], axis=-1)
+        return self.scatter.T.dot(entries.T).T
+
+    def matrix(self, y=None, instance_entries=None):
+        """
+        :param y: admittances to stamp, defaults to the values currently held by the components
+        :param instance_entries: the entries stamped by subcircuit instances, see nonzeros
+        :rtype: scipy.sparse.csc_matrix
+        """
+        if y is None:
+            y = self.admittances()
+        return scipy.sparse.csc_matrix((self.nonzeros(y, instance_entries), self.indices, self.indptr),
+                                       shape=(self.size, self.size))
+
+    def rhs(self, v=None, instance_currents=None):
+        """
+        :param v: source voltages, defaults to the values currently held by the sources. An (N, len(sources))
+            array gives N right hand sides
+        :param instance_currents: the currents injected by subcircuit instances (see instance_stamps), one row per
+            right hand side or shared by every one. Defaults to those at the frequency of the circuit
+        :rtype: numpy.ndarray
+        """
+        if v is None:
+            v = self.source_voltages()
+        if instance_currents is None:
+            instance_currents = self.instance_stamps()[1]
+        v = numpy.asarray(v, dtype=complex)
+        b = numpy.zeros(v.shape[:-1] + (self.size,), dtype=complex)
+        b[..., self.num_free_nodes:] = v
+        b += instance_currents
+        return b
+
+    def voltages(self, x):
+        """
+        :param x: solution of the MNA system, or an (N, size) array of N solutions
+        :return: node voltages indexed by Node.index
+        :rtype: numpy.ndarray
+        """
+        # the rows of the free nodes are in node order, so the voltages are the first rows of x with 0 put in for ref
+        return numpy.insert(x[..., :self.num_free_nodes], self.ref.index, 0, axis=-1)
+
+    def unpack(self, x, y=None):
+        """
+        Splits solutions of the MNA system into node voltages and component currents
+        :param x: solution of the MNA system, or an (N, size) array of N solutions
+        :param y: the admittances the system was assembled with
+        :return: node voltages indexed by Node.index and the current entering the pos node of every component
+            in the order of circuit.component_list (passive sign convention)
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        if y is None:
+            y = self.admittances()
+        voltages = self.voltages(x)
+        impedance_currents = (voltages[..., self.imp_pos] - voltages[..., self.imp_neg])*y
+        currents = numpy.concatenate([impedance_currents, x[..., self.num_free_nodes:]], axis=-1)
+        return voltages, currents[..., self.component_take]
+
+    def solve(self):
+        """
+        Factorizes the system with a sparse LU and solves it for the present component values
+        :return: node voltages and component currents, see unpack
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        y = self.admittances()
+        instance_entries, instance_currents = self.instance_stamps()
+        x = scipy.sparse.linalg.splu(self.matrix(y, instance_entries)).solve(self.rhs(None, instance_currents))
+        return self.unpack(x, y)
+
+    def factorize(self):
+        """
+        Factorizes the system for the present component values and solves it, so that later changes to single
+        components can be applied with update. A system with only real admittances gets a real factorization, which
+        is cheaper to solve with
+        :return: node voltages and component currents, see unpack
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        self._y, self._v = self.admittances(), self.source_voltages()
+        instance_entries, instance_currents = self.instance_stamps()
+        nonzeros = self.nonzeros(self._y, instance_entries)
+        self._real = not numpy.any(nonzeros.imag)
+        # every MNA matrix is structurally symmetric, so the column ordering is computed from A + A'
+        self._lu = scipy.sparse.linalg.splu(scipy.sparse.csc_matrix(
+            (nonzeros.real.copy() if self._real else nonzeros, self.indices, self.indptr),
+            shape=(self.size, self.size)), permc_spec='MMD_AT_PLUS_A')
+        self._factorized_y = self._y.copy()
+        self._omega = self.store.omega
+        self._x0 = self._factorized_solve(self.rhs(self._v, instance_currents))  # solution of the factorized system
+        self._source_columns = {}  # source -> column of the factorized inverse for its row
+        self._updated = []  # impedances whose admittance differs from the factorized system
+        self._z = numpy.empty((self.size, 0))  # solutions of the factorized system for the u of each of them
+        self._x = self._x0.copy()
+        return self.unpack(self._x, self._y)
+
+    def _factorized_solve(self, b):
+        """
+        :return: the solution of the system as it was factorized, for the right hand side b
+        :rtype: numpy.ndarray
+        """
+        if not self._real:
+            return self._lu.solve(numpy.asarray(b, dtype=complex))
+        if numpy.any(b.imag):
+            return self._lu.solve(b.real.copy()) + 1j*self._lu.solve(b.imag.copy())
+        return self._lu.solve(b.real.copy()).astype(complex)
+
+    def _low_rank_solution(self):
+        """
+        Applies every impedance changed since the factorization to its solution with the Woodbury identity. With U
+        holding the u of each changed impedance, D their change in admittance and Z = A^-1 U for the factorized A:
+            (A + UDU')^-1 b = A^-1 b - Z D (I + U'Z D)^-1 U' A^-1 b
+        :rtype: numpy.ndarray
+        """
+        if not self._updated:
+            return self._x0.copy()
+        updated = numpy.array(self._updated, dtype=int)
+        p, n = self.row_of[self.imp_pos[updated]], self.row_of[self.imp_neg[updated]]
+        p_sign, n_sign = p >= 0, n >= 0  # a row of -1 is the reference node, which reads as 0
+        delta = self._y[updated] - self._factorized_y[updated]
+
+        def difference(x):  # U'x
+            return x[p]*p_sign[:, None] - x[n]*n_sign[:, None] if x.ndim > 1 else x[p]*p_sign - x[n]*n_sign
+        capacitance = numpy.eye(len(updated)) + difference(self._z)*delta
+        return self._x0 - self._z.dot(delta*numpy.linalg.solve(capacitance, difference(self._x0)))
+
+    def update(self, refdes, currents=True):
+        """
+        Brings the solution up to date after the value of one component changed (see Component.set_value) without
+        factorizing the system again. A new source voltage only changes the right hand side. A new impedance is a
+        rank one change to the matrix, and every impedance changed since the factorization is applied to it at once
+        with the Woodbury identity (see _low_rank_solution). The first change to a component costs a solve with the
+        existing factorization and later ones to the same component only a few vector operations. The system is
+        factorized again once more than MAX_LOW_RANK_UPDATES impedances have changed
+        :type refdes: str
+        :type currents: bool
+        :param currents: when False only the node voltages are worked out, skipping a pass over every component
+        :return: node voltages and component currents (None unless asked for), see unpack
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        if refdes not in self.slot_of:
+            raise ValueError('There is no impedance or voltage source named {0}'.format(refdes))
+        if self._lu is None:
+            return self.factorize()
+        is_source, i = self.slot_of[refdes]
+        if is_source:
+            if i not in self._source_columns:
+                e = numpy.zeros(self.size, dtype=complex)
+                e[self.num_free_nodes + i] = 1
+                self._source_columns[i] = self._factorized_solve(e)
+            self._x0 += self._source_columns[i]*(self.sources[i].v - self._v[i])
+            self._v[i] = self.sources[i].v
+        else:
+            self._y[i] = self.impedances[i].y
+            p, n = self.row_of[self.imp_pos[i]], self.row_of[self.imp_neg[i]]
+            if i not in self._updated and p != n:  # an impedance shorted by ref to ref changes nothing
+                if len(self._updated) >= MAX_LOW_RANK_UPDATES:
+                    return self.factorize()
+                u = numpy.zeros(self.size, dtype=complex)
+                if p >= 0:
+                    u[p] = 1
+                if n >= 0:
+                    u[n] = -1
+                self._updated.append(i)
+                self._z = numpy.column_stack([self._z, self._factorized_solve(u)])
+        try:
+            self._x = self._low_rank_solution()
+        except numpy.linalg.LinAlgError:  # the changes cannot be applied as a low rank update
+            return self.factorize()
+        if not currents:
+            return self.voltages(self._x), None
+        return self.unpack(self._x, self._y)
+
+    def thevenin(self, pairs):
+        """
+        Finds the Thevenin equivalent seen between each pair of nodes from a single factorization. The open circuit
+        voltage across a pair is read off the solution of the system. Zeroing every source leaves the matrix as it
+        is, so injecting 1A into the first node of a pair and out of its second (u) is just another right hand side,
+        and the impedance seen between the nodes is u'A^-1 u. Every pair is solved in one call on the factorization,
+        which is reused when the circuit has not changed since it was made
+        :type pairs: list[(circuit.Node, circuit.Node)]
+        :return: the open circuit voltage from the first node of each pair to the second and the impedance seen
+            between them, one entry per pair
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        if (self._lu is None or self._updated or self._omega != self.store.omega or
+                not numpy.array_equal(self._y, self.admittances()) or
+                not numpy.array_equal(self._v, self.source_voltages())):
+            self.factorize()
+        u = numpy.zeros((self.size, len(pairs)), dtype=complex)
+        for k, (pos, neg) in enumerate(pairs):
+            for node, sign in ((pos, 1), (neg, -1)):
+                if self.row_of[node.index] >= 0:
+                    u[self.row_of[node.index], k] += sign
+        responses = self._factorized_solve(u)
+        return u.T.dot(self._x0), numpy.sum(u*responses, axis=0)
+
+    def solve_batch(self, y, v, omegas=None):
+        """
+        Solves the system for N sets of component values. While a dense matrix fits in DENSE_BATCH_LIMIT entries the
+        sets are solved in batched calls of as many dense matrices as fit in the limit, otherwise each one gets its
+        own sparse LU. Either way the stamp pattern and sparsity structure are shared by every set
+        :param y: (N, len(impedances)) admittances
+        :param v: (N, len(sources)) source voltages
+        :param omegas: N angular frequencies the subcircuit instances are evaluated at, one per set. Without them
+            every set uses the frequency of the circuit
+        :return: (N, num_nodes) node voltages and (N, len(component_list)) component currents, see unpack
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        y = numpy.asarray(y, dtype=complex)
+        instance_entries, instance_currents = self.instance_stamps(omegas)
+        nonzeros, b = self.nonzeros(y, instance_entries), self.rhs(v, instance_currents)
+        num_sets = len(b)
+        if self.size*self.size <= DENSE_BATCH_LIMIT:
+            x = numpy.empty((num_sets, self.size), dtype=complex)
+            cols = numpy.repeat(numpy.arange(self.size), numpy.diff(self.indptr))
+            chunk = max(DENSE_BATCH_LIMIT // max(self.size*self.size, 1), 1)
+            for start in range(0, num_sets, chunk):
+                stop = min(start + chunk, num_sets)
+                a = numpy.zeros((stop - start, self.size, self.size), dtype=complex)
+                a[:, self.indices, cols] = nonzeros[start:stop]
+                x[start:stop] = numpy.linalg.solve(a, b[start:stop])
+        else:
+            x = numpy.array([scipy.sparse.linalg.splu(scipy.sparse.csc_matrix(
+                (nonzeros[i], self.indices, self.indptr), shape=(self.size, self.size))).solve(b[i])
+                for i in range(num_sets)], dtype=complex).reshape(num_sets, self.size)
+        return self.unpack(x, y)
+
+    def value_table(self, values):
+        """
+        Expands a table of component values into the admittances and source voltages of every row
+        :param values: maps refdes to a column of N values: a dict of sequences or a numpy structured array.
+            Impedances take their value in the units of the netlist (ohms, or F for capacitors and H for inductors,
+            evaluated at the frequency of the circuit), voltage sources their voltage. Components without a column
+            keep their present value
+        :return: (N, len(impedances)) admittances and (N, len(sources)) source voltages
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        names = values.dtype.names if hasattr(values, 'dtype') else list(values)
+        columns = [(name, numpy.asarray(values[name], dtype=complex)) for name in names]
+        num_rows = len(columns[0][1]) if columns else 1
+        y = numpy.tile(self.admittances(), (num_rows, 1))
+        v = numpy.tile(self.source_voltages(), (num_rows, 1))
+        for name, column in columns:
+            if name not in self.slot_of:
+                raise ValueError('There is no impedance or voltage source named {0}'.format(name))
+            if column.shape != (num_rows,):
+                raise ValueError('Column {0} should hold {1} values'.format(name, num_rows))
+            is_source, i = self.slot_of[name]
+            if is_source:
+                v[:, i] = column
+            else:
+                y[:, i] = self.store.admittances(self.impedance_rows[i:i + 1], values=column.reshape(-1, 1))[:, 0]
+        return y, v
+
+    def branch_currents(self, component_currents):
+        """
+        Converts component currents into the current of each branch of the circuit, using the same direction as
+        Branch.current (see Component.current)
+        :param component_currents: component currents in the order of circuit.component_list, or an
+            (N, len(component_list)) array of them
+        :return: one current per branch in circuit.branchlist. Empty if the branches have not been created
+        :rtype: numpy.ndarray
+        """
+        if self._branch_map is None or len(self._branch_map[0]) != self.circuit.num_branches:
+            first_comps = [branch.component_list[0] for branch in self.circuit.branchlist]
+            take = numpy.array([comp.index for comp in first_comps], dtype=int)  # their rows in the store
+            signs = numpy.array([1 if comp.pos == comp.node_current_in else -1 for comp in first_comps], dtype=int)
+            self._branch_map = (take, signs)  # branches are only created once, so this is worked out once
+        take, signs = self._branch_map
+        return numpy.asarray(component_currents)[..., take]*signs
@@ -1,21 +1,81 @@
 import cursors
-import copy
-import sympy
 import helper_funcs
+import instrument
 import components
+import numeric
+import numpy
+
+SOLVER_VERSION = 7  # bump whenever a change to the solver changes what it stores or computes, see cache.py
+METHOD_NAMES = {'nodal': 'Node voltage', 'mesh': 'Mesh current'}  # as explained to the student, see choose_method
+
+
+def prepare_circuit(filename, mode='symbolic'):
+    """
+    Loads a netlist and runs the circuit stages a Solver in the given mode needs, in the same order as main.py. The
+    symbolic mode gets the subcircuit instances flattened, the numeric mode stamps their reduced equivalents
+    :type filename: str
+    :type mode: str
+    :rtype: circuit.Circuit
+    """
+    import circuit
+    new_circuit = circuit.Circuit(filename)
+    if mode == 'symbolic':
+        new_circuit.flatten_instances()
+    new_circuit.create_nodes()
+    new_circuit.populate_nodes()
+    if mode == 'symbolic':
+        new_circuit.identify_nontrivial_nodes()
+        new_circuit.create_branches()
+        new_circuit.create_supernodes()
+        new_circuit.sub_super_nodes()
+        new_circuit.identify_nontrivial_nonsuper_nodes()
+    return new_circuit
 
 
 class Solver(object):
     """
     Represents the Circuit solver. Keeps track of each step of the solution. Performs
     each solution step on each SolutionStep
+    The circuit itself is shared by every step and is updated in place. Each step only records what it changed
+    (see SolutionStep) so the history costs a few references per step rather than a copy of the circuit
     """
-    def __init__(self, base_circuit):
+    def __init__(self, base_circuit, mode='symbolic', keep_history=True, topology_cache=None, method='auto',
+                 series_parallel=False):
         """
         :type base_circuit: Circuit
+        :type mode: str
+        :param mode: 'symbolic' solves the circuit step by step with sympy. 'numeric' skips straight to a sparse
+            numeric solve, which is the only option for very large circuits
+        :type keep_history: bool
+        :param keep_history: When False every step writes into a single SolutionStep and no history is kept. Useful
+            for batch solves where nothing will be explained
+        :type topology_cache: cache.TopologyCache
+        :param topology_cache: closed form solutions shared by every solver given the same cache. Circuits with the
+            topology of one already solved skip generating and solving the node voltage equations, see
+            solve_by_topology
+        :type method: str
+        :param method: the analysis the symbolic mode performs. 'nodal' writes KCL at every nontrivial node in terms
+            of the node voltages, 'mesh' writes KVL around every independent loop in terms of loop currents, which
+            gives fewer equations when the circuit has fewer loops than nodes. 'auto' picks whichever is predicted to
+            be cheaper (see choose_method)
+        :type series_parallel: bool
+        :param series_parallel: When True nodal analysis without a topology cache first combines impedances in
+            series and in parallel (see reduce_series_parallel), which gives smaller equations. The current and
+            voltage of every component are recovered after the solve (see expand_reductions)
         """
+        if mode not in ('symbolic', 'numeric'):
+            raise ValueError('Unknown solver mode {0}'.format(mode))
+        if method not in ('auto', 'nodal', 'mesh'):
+            raise ValueError('Unknown analysis method {0}'.format(method))
+        self.mode = mode
+        self.method = method
+        self.series_parallel = series_parallel
+        self.keep_history = keep_history
         self.solution = [SolutionStep(base_circuit)]
         """:type : list[SolutionStep]"""
+        self.topology_cache = topology_cache
+        self._nodal_system = None
+        self._compiled_solution = None
 
     def getcircuit(self):
         return self.solution[-1].circuit
@@ -25,104 +85,668 @@ class Solver(object):
 
     circuit = property(getcircuit, setcircuit)
 
+    def sizes(self):
+        """
+        Sizes reported by instrumented stages: those of the circuit (see Circuit.sizes), the number of steps and node
+        voltage equations, and the sympy operation counts of the latest equations and of the closed form solution
+        :rtype: dict[str, int]
+        """
+        step = self.solution[-1]
+        sizes = self.circuit.sizes() if self.circuit is not None else {}
+        sizes['steps'] = len(self.solution)
+        sizes['equations'] = len(step.node_voltage_eqs or step.mesh_eqs)
+        equations = step.subbed_eqs or step.node_voltage_eqs or step.mesh_eqs
+        sizes['equation_ops'] = sum(int(eq.count_ops()) for eq in equations if hasattr(eq, 'count_ops'))
+        if isinstance(step.solved_eq, dict):
+            sizes['solution_ops'] = sum(int(expr.count_ops()) for expr in step.solved_eq.values()
+                                        if hasattr(expr, 'count_ops'))
+        return sizes
+
+    def __getstate__(self):
+        """
+        A pickled solver keeps its steps (detached from the circuit, see SolutionStep.__getstate__) but not the
+        nodal system or compiled solution cached on it, which are rebuilt when needed
+        """
+        state = dict(self.__dict__)
+        state['_nodal_system'] = None
+        state['_compiled_solution'] = None
+        state['topology_cache'] = None
+        return state
+
+    def new_step(self, name):
+        """
+        Starts a new step of the solution which shares every result with the previous step until it replaces them
+        :type name: str
+        :param name: name of the solver method performing the step
+        :rtype: SolutionStep
+        """
+        if self.keep_history:
+            self.solution.append(self.solution[-1].next_step(name))
+        else:
+            self.solution[-1].name = name
+        return self.solution[-1]
+
+    def find_step(self, name):
+        """
+        :return: the last step with the given name or None if it has not been performed. Without history the single
+            step is returned since it holds everything recorded so far
+        :rtype: SolutionStep
+        """
+        if not self.keep_history:
+            return self.solution[-1]
+        for step in reversed(self.solution):
+            if step.name == name:
+                return step
+
+    def replay(self):
+        """
+        Rebuilds the state of the circuit at each step of the solution from the journals of the steps
+        :return: yields each step along with every node voltage and branch current known once it was performed
+        :rtype: collections.Iterable[(SolutionStep, dict[int, complex], dict[int, complex])]
+        """
+        voltages, currents = {}, {}
+        for step in self.solution:
+            voltages.update(step.voltages)
+            currents.update(step.currents)
+            yield step, dict(voltages), dict(currents)
+
+    @instrument.stage
     def identify_voltages(self):
         """performs KVL to identify and set voltages at nodes connected to ground through a component"""
-        self.solution.append(copy.deepcopy(self.solution[-1]))
-        self.solution[-1].ref.voltage = 0
-        kvl_cursor = cursors.Cursor(self.solution[-1].ref)
+        step = self.new_step('identify_voltages')
+        step.ref.voltage = 0
+        step.record_voltage(step.ref)
+        kvl_cursor = cursors.Cursor(step.ref)
         while True:
             while kvl_cursor.unseen_vsources_connected():  # While not empty
                 first_unseen_source = helper_funcs.only_vsources(kvl_cursor.step_down_unseen_vsource())[0] # will only contain a single vsource at most
                 first_unseen_source.set_other_node_voltage()
-            if kvl_cursor.location != self.solution[-1].ref:  # if you're no longer at ref
+                for node in first_unseen_source.nodes:
+                    step.record_voltage(node)
+            if kvl_cursor.location != step.ref:  # if you're no longer at ref
                 kvl_cursor.step_back()
             elif not kvl_cursor.unseen_vsources_connected():  # if no more sources and at ref node
                 break
             else:  # if at ref but more vsources to go then continue
                 continue
 
+    @instrument.stage
     def identify_currents(self):
         """
-        Defines the curent through the branch each resistor is in, in the direction going into the
-        positive node of each resistor
+        Defines the curent through the branch each impedance is in, in the direction going into the
+        positive node of each impedance
         Also marks the node where the current enters the branch
         This is consistent with passive sign convention for that resistor
         :return:
         """
-        self.solution.append(copy.deepcopy(self.solution[-1]))
-        for res in helper_funcs.only_resistances(self.solution[-1].circuit.component_list):
+        step = self.new_step('identify_currents')
+        for res in helper_funcs.only_impedances(step.circuit.component_list):
             if res.node_current_in == res.pos:
                 res.branch.current = res.voltage/res.z
             elif res.node_current_in == res.neg:
                 res.branch.current = -res.voltage/res.z
+            if res.branch is not None and res.branch.current_is_defined():
+                step.record_current(res.branch)
 
     # TODO add another func for KCL but in terms of sympy equations where it can generate many sympy. This is part of the larger idea of wrapping each operation in such a way that the program determines which operation to execute
 
+    @instrument.stage
     def gen_node_voltage_eq(self):
         """
-        :rtype: list[str]
-        :return: list of strings to be sympified into sympy expressions
+        Performs KCL at every nontrivial node other than ref. The sympy equations are built straight from the symbols
+        of the circuit; the string form is only produced if it is printed (see SolutionStep.node_voltage_eqs_str)
         """
-        self.solution.append(copy.deepcopy(self.solution[-1]))
+        import sympy  # sympy and the symbolic engine are only loaded once a symbolic stage runs
+        step = self.new_step('gen_node_voltage_eq')
+        step.node_voltage_eqs = []
+        step.node_voltage_kcl = []
         #for node in list(set(self.solution[-1].circuit.non_trivial_reduced_nodedict.values()) - {self.solution[-1].ref}):
-        for node in [start_node for start_node in self.circuit.non_trivial_reduced_nodedict.values() if start_node.node_num != self.solution[-1].ref.node_num]:
-            current_exps = node.node_voltage_kcl()
-            for exp in current_exps:
-                exp.into_str()
-            self.solution[-1].node_voltage_eqs_str.append("+".join([exp.str_expr for exp in current_exps]))
-            self.solution[-1].node_voltage_eqs.append(sympy.sympify(self.solution[-1].node_voltage_eqs_str[-1]))
+        for node in [start_node for start_node in self.circuit.non_trivial_reduced_nodedict.values() if start_node.node_num != step.ref.node_num]:
+            current_exps = node.node_voltage_kcl(step.circuit.symbols, step.circuit.reduced_branches)
+            step.node_voltage_kcl.append(current_exps)
+            step.node_voltage_eqs.append(sympy.Add(*[exp.sympy_expr for exp in current_exps]))
 
+    @instrument.stage
     def determine_known_vars(self):
-        self.solution.append(copy.deepcopy(self.solution[-1]))
-        for node in self.solution[-1].circuit.nodedict.values():
+        """
+        Lists the known variables as (symbol, value) pairs: the node voltages identified so far and the value of every
+        impedance and voltage source
+        """
+        step = self.new_step('determine_known_vars')
+        step.node_vars = []
+        step.known_vars = []
+        symbols = step.circuit.symbols
+        for node in step.circuit.nodedict.values():
             if not node.voltage_is_defined():
-                self.solution[-1].node_vars.append(sympy.Symbol("V{0}".format(node.node_num)))
+                step.node_vars.append(symbols.voltage(node))
             else:
-                self.solution[-1].known_vars.append((sympy.Symbol("V{0}".format(node.node_num)), node.voltage))
-        for comp in self.solution[-1].circuit.component_list:
+                step.known_vars.append((symbols.voltage(node), node.voltage))
+        for comp in step.circuit.component_list:
             if isinstance(comp, components.Impedance):
-                self.solution[-1].known_vars.append(("{0}".format(comp.refdes), comp.z))
+                step.known_vars.append((symbols.value(comp), comp.z))
             elif isinstance(comp, components.VoltageSource):
-                self.solution[-1].known_vars.append(("{0}".format(comp.refdes), comp.v))
+                step.known_vars.append((symbols.value(comp), comp.v))
+        for reduction in step.circuit.reductions:
+            step.known_vars.append((symbols.value(reduction), reduction.z))
+
+    def known_substitutions(self):
+        """
+        :return: step.known_vars as a dict, so they can be substituted in a single xreplace rather than a subs per
+            variable that parses its name
+        :rtype: dict[sympy.Symbol, sympy.Expr]
+        """
+        import sympy
+        return dict((var, sympy.sympify(value)) for var, value in self.solution[-1].known_vars)
 
+    @instrument.stage
     def sub_zero_for_ref(self):
-        self.solution.append(copy.deepcopy(self.solution[-1]))
+        step = self.new_step('sub_zero_for_ref')
+        step.subbed_eqs = []
         # TODO make this such that the node num of ref actually chnges
-        for eq in self.solution[-1].node_voltage_eqs:
-            self.solution[-1].subbed_eqs.append(eq.subs("V{0}".format(self.solution[-1].ref.node_num), 0))
+        for eq in step.node_voltage_eqs:
+            step.subbed_eqs.append(eq.subs(step.circuit.symbols.voltage(step.ref), 0))
 
+    @instrument.stage
     def sub_into_eqs(self):
-        self.solution.append(copy.deepcopy(self.solution[-1]))
-        for eq in self.solution[-1].node_voltage_eqs:
-            self.solution[-1].subbed_eqs.append(eq.subs(self.solution[-1].known_vars))
+        step = self.new_step('sub_into_eqs')
+        step.subbed_eqs = []
+        known = self.known_substitutions()
+        for eq in step.node_voltage_eqs or step.mesh_eqs:
+            step.subbed_eqs.append(eq.xreplace(known))
 
     #TODO group these two together to sub into an arbitrary expression after evaluating known vars
 
+    @instrument.stage
     def sub_into_result(self):
-        self.solution.append(copy.deepcopy(self.solution[-1]))
-        for eq in self.solution[-1].solved_eq.values():
-            self.solution[-1].result.append(eq.subs(self.solution[-1].known_vars))
+        step = self.new_step('sub_into_result')
+        step.result = []
+        known = self.known_substitutions()
+        for eq in step.solved_eq.values():
+            step.result.append(eq.xreplace(known))
 
     def node_voltage_vars(self):
-        nontrivial_node_names = ["V{0}".format(node.node_num) for node in self.circuit.non_trivial_reduced_nodedict.values()]
-        return [sympy.Symbol(node_name) for node_name in nontrivial_node_names]
+        return [self.circuit.symbols.voltage(node) for node in self.circuit.non_trivial_reduced_nodedict.values()]
 
+    def unknown_nodes(self):
+        """
+        :return: the nontrivial nodes whose voltage has not been identified, in the order of node_voltage_vars
+        :rtype: list[Node]
+        """
+        return [node for node in self.circuit.non_trivial_reduced_nodedict.values() if not node.voltage_is_defined()]
+
+    def topology_key(self):
+        """
+        :return: the key of the closed form solution of this circuit in the topology cache
+        :rtype: tuple
+        """
+        return self.topology_cache.key(self.circuit, self.solution[-1].ref_node_num)
 
+    @instrument.stage
     def solve_eqs(self):
-        self.solution.append(copy.deepcopy(self.solution[-1]))
-        self.solution[-1].solved_eq = sympy.solve(self.solution[-1].node_voltage_eqs, self.node_voltage_vars())
+        """
+        Solves the node voltage equations for the unknown node voltages in terms of the component values and the
+        node voltages already identified. With a topology cache the solution of a circuit of the same topology is
+        reused instead
+        """
+        import symbolic
+        step = self.new_step('solve_eqs')
+        if self.topology_cache is None or step.circuit.reductions:  # reduced equations are not those of the topology
+            step.solved_eq = symbolic.NodalEquations(step.node_voltage_kcl, self.unknown_nodes()).solve()
+            if step.circuit.reductions:
+                symbols = step.circuit.symbols
+                equivalents = dict((symbols.symbol(reduction.refdes), reduction.expression(symbols))
+                                   for reduction in step.circuit.reductions)
+                step.solved_eq = dict((var, expr.xreplace(equivalents)) for var, expr in step.solved_eq.items())
+            return
+        key = self.topology_key()
+        step.solved_eq = self.topology_cache.get(key)
+        if step.solved_eq is None:
+            step.solved_eq = symbolic.NodalEquations(step.node_voltage_kcl, self.unknown_nodes()).solve()
+            self.topology_cache.put(key, step.solved_eq)
+
+    @instrument.stage
+    def solve_by_topology(self):
+        """
+        Solves the circuit through the topology cache: the closed form node voltages are found once per topology
+        (the node voltage equations are only generated on a miss) and the values of this circuit are then evaluated
+        in them with the compiled solution, which is also shared through the cache
+        """
+        self.set_reference_voltage(self.circuit.nodedict[0])
+        self.identify_voltages()
+        self.identify_currents()
+        if self.topology_cache.peek(self.topology_key()) is None:
+            self.gen_node_voltage_eq()
+        self.determine_known_vars()
+        self.solve_eqs()
+        voltages = self.evaluate_solution()
+        step = self.new_step('evaluate_solution')
+        step.solved_subbed_eq = dict((var, complex(voltage)) for var, voltage in voltages.items())
+
+    @instrument.stage
+    def compile_solution(self):
+        """
+        Compiles the closed form node voltages found by solve_eqs into a numpy function (see
+        symbolic.CompiledSolution). It is compiled once per solution and cached on the solver, or once per topology
+        when the solution came from the topology cache
+        :rtype: symbolic.CompiledSolution
+        """
+        import symbolic
+        solved = self.solution[-1].solved_eq
+        if solved is None:
+            raise ValueError('solve_eqs must be performed before the solution can be compiled')
+        if self._compiled_solution is None or self._compiled_solution[0] is not solved:
+            if self.topology_cache is not None and self.topology_cache.peek(self.topology_key()) is solved:
+                compiled = self.topology_cache.compiled(self.topology_key())
+            else:
+                compiled = symbolic.CompiledSolution(solved)
+            self._compiled_solution = (solved, compiled)
+        return self._compiled_solution[1]
+
+    @instrument.stage
+    def evaluate_solution(self, values=None):
+        """
+        Evaluates the closed form node voltages for many operating points at once, instead of substituting into
+        them once per point as sub_into_result does
+        :type values: dict[str | sympy.Symbol, complex | numpy.ndarray]
+        :param values: values or arrays of values keyed by symbol, or by its name: the refdes of a component or
+            V(<node_num>). Anything left out takes its value from known_vars
+        :return: the voltage of each unknown node, keyed by its symbol
+        :rtype: dict[sympy.Symbol, numpy.ndarray]
+        """
+        symbols = self.circuit.symbols
+        known = dict(self.solution[-1].known_vars)
+        known.update((symbols.symbol(var) if isinstance(var, basestring) else var, value)
+                     for var, value in (values or {}).items())
+        return self.compile_solution()(known)
 
+    @instrument.stage
     def solve_subbed_eqs(self):
-        self.solution.append(copy.deepcopy(self.solution[-1]))
-        self.solution[-1].solved_subbed_eq = sympy.solve(self.solution[-1].subbed_eqs, self.node_voltage_vars())
-        # TODO fix this. sypy equations are mutable. An equation is not returned here, subbed_eqs is mutated
+        """
+        Solves the node voltage equations with the known variables substituted in. The equations are stamped into a
+        matrix straight from the current expressions of each node rather than from the subbed strings
+        """
+        import symbolic
+        step = self.new_step('solve_subbed_eqs')
+        values = dict(step.known_vars)
+        step.solved_subbed_eq = symbolic.NodalEquations(step.node_voltage_kcl, self.unknown_nodes(), values).solve()
+
+    @instrument.stage
+    def reduce_series_parallel(self):
+        """
+        Combines the impedances of the circuit in series and in parallel (see Circuit.reduce_series_parallel) so that
+        gen_node_voltage_eq writes a single term for each group of them. Run after identify_currents, as branches
+        whose current is known are left alone
+        """
+        step = self.new_step('reduce_series_parallel')
+        step.circuit.reduce_series_parallel()
+        step.reductions = [(reduction.refdes, reduction.kind, reduction.impedance_names())
+                           for reduction in step.circuit.reductions]
+
+    @instrument.stage
+    def expand_reductions(self):
+        """
+        Recovers the current of every branch combined by reduce_series_parallel, and the voltage of the nodes inside
+        it, from the solved node voltages at its ends
+        """
+        step = self.new_step('expand_reductions')
+        symbols = step.circuit.symbols
+        solved = step.solved_subbed_eq
+        for reduction in step.circuit.reductions:
+            for branch in reduction.branches:
+                ends = branch.ending_nodes()
+                if any(not node.voltage_is_defined() and symbols.voltage(node) not in solved for node in ends):
+                    continue  # an end left unsolved, e.g. inside a supernode
+                for node in ends:
+                    if not node.voltage_is_defined():
+                        node.voltage = complex(solved[symbols.voltage(node)])
+                        step.record_voltage(node)
+                nodes, set_current = branch.set_from_end_voltages()
+                for node in nodes:
+                    step.record_voltage(node)
+                if set_current:
+                    step.record_current(branch)
+
+    @instrument.stage
+    def gen_mesh_current_eq(self):
+        """
+        Performs KVL around every loop of a fundamental loop basis of the branches (see Circuit.create_loops), in
+        terms of a current J<loop_num> circulating in each loop. Each branch carries the sum of the currents of the
+        loops running through it
+        """
+        import sympy
+        step = self.new_step('gen_mesh_current_eq')
+        if not step.circuit.looplist:
+            step.circuit.create_loops()
+        symbols = step.circuit.symbols
+        loops = step.circuit.looplist
+        loop_currents = [symbols.symbol("J{0}".format(loop.loop_num)) for loop in loops]
+        drops = {}  # branch -> voltage drop along its branch current
+        for branch, loop_directions in helper_funcs.loops_through(loops).items():
+            current = sympy.Add(*[direction*loop_currents[i] for i, direction in loop_directions])
+            impedance = sympy.Add(*[symbols.value(comp) for comp in branch.impedances()])
+            emf = sympy.Add(*[sign*symbols.value(source) for source, sign in branch.sources()])
+            drops[branch] = impedance*current + emf
+        step.mesh_eqs = [sympy.Add(*[direction*drops[branch] for branch, direction in loop.branches])
+                         for loop in loops]
+
+    @instrument.stage
+    def solve_mesh_eqs(self):
+        """
+        Solves the KVL equations for the loop currents with the known variables substituted in, then sets the current
+        of every branch and the voltage of every node from them (see Circuit.set_loop_currents)
+        """
+        import symbolic
+        import sympy
+        step = self.new_step('solve_mesh_eqs')
+        values = dict(step.known_vars)
+        solved = symbolic.MeshEquations(step.circuit.looplist, values).solve()
+        step.loop_currents = solved
+        currents = [complex(solved[sympy.Symbol(symbolic.current_name(loop))]) for loop in step.circuit.looplist]
+        nodes, branches = step.circuit.set_loop_currents(currents, step.ref)
+        for node in nodes:
+            step.record_voltage(node)
+        for branch in branches:
+            step.record_current(branch)
+        step.solved_subbed_eq = dict((step.circuit.symbols.voltage(node), sympy.sympify(node.voltage))
+                                     for node in nodes)
+
+    def solve_mesh(self):
+        """
+        Runs the mesh current steps with node 0 as the reference
+        """
+        self.set_reference_voltage(self.circuit.nodedict[0])
+        self.identify_voltages()
+        self.identify_currents()
+        self.gen_mesh_current_eq()
+        self.determine_known_vars()
+        self.sub_into_eqs()
+        self.solve_mesh_eqs()
+
+    def mesh_unsupported(self):
+        """
+        :return: the components mesh analysis cannot model: anything other than impedances and voltage sources
+        :rtype: list[components.Component]
+        """
+        return [comp for comp in self.circuit.component_list
+                if not isinstance(comp, (components.Impedance, components.VoltageSource))]
+
+    def trivial_reference(self):
+        """
+        :return: whether node 0 lies inside a branch. The KCL equations written about it only fix the nontrivial
+            node voltages relative to one another, so nodal analysis cannot solve for them
+        :rtype: bool
+        """
+        return 0 not in self.circuit.nontrivial_nodedict
+
+    def floating_supernodes(self):
+        """
+        :return: the supernodes that do not hold node 0. Their voltage sources are written as branch currents like
+            any other branch, which have no impedance to divide by, so nodal analysis cannot solve for them
+        :rtype: list[circuit.Supernode]
+        """
+        ref = self.circuit.nodedict[0]
+        return [sn for sn in self.circuit.supernode_list if ref not in sn.node_set]
+
+    def nodal_unsupported(self):
+        """
+        :return: why nodal analysis cannot solve the circuit (see trivial_reference and floating_supernodes), or None
+        :rtype: str
+        """
+        if self.trivial_reference():
+            return "node 0 lies inside a branch, so the node voltages cannot be solved for about it"
+        floating = self.floating_supernodes()
+        if floating:
+            return "the supernodes of nodes {0} do not hold node 0".format(
+                "; ".join(", ".join(str(node.node_num) for node in sn.nodelist) for sn in floating))
+        return None
+
+    def predict_costs(self):
+        """
+        Predicts the size of the system each analysis method would solve before any equation is generated. Nodal
+        analysis solves for the nontrivial nodes outside supernodes other than node 0 and stamps one conductance
+        into each entry a branch touches. Mesh analysis solves for the loops of a fundamental loop basis (see
+        Circuit.create_loops) and stamps every impedance of a branch into each pair of loops running through it.
+        The cost of the symbolic elimination is estimated as unknowns*terms, as each pivot updates every remaining
+        row. Nodal analysis is left out when it cannot solve the circuit (see nodal_unsupported) and mesh analysis
+        when the circuit has components it cannot model
+        :return: method -> {'unknowns': int, 'terms': int, 'cost': int}
+        :rtype: dict[str, dict[str, int]]
+        """
+        costs = {}
+        if self.nodal_unsupported() is None:
+            ref = self.circuit.nodedict[0]
+            unknowns = set(node for node in self.circuit.non_trivial_reduced_nodedict.values() if node is not ref)
+            terms = 0
+            for branch in self.circuit.branchlist:
+                if branch.nodelist[0] is not branch.nodelist[-1]:
+                    terms += len([node for node in branch.ending_nodes() if node in unknowns])**2
+            costs['nodal'] = {'unknowns': len(unknowns), 'terms': terms, 'cost': len(unknowns)*terms}
+        if self.mesh_unsupported():
+            return costs
+        if not self.circuit.looplist:
+            self.circuit.create_loops()
+        loops = self.circuit.looplist
+        terms = sum(len(loop_directions)**2*len(branch.impedances())
+                    for branch, loop_directions in helper_funcs.loops_through(loops).items())
+        costs['mesh'] = {'unknowns': len(loops), 'terms': terms, 'cost': len(loops)*terms}
+        return costs
+
+    @instrument.stage
+    def choose_method(self):
+        """
+        Picks the analysis the symbolic mode performs. A method given to the solver is used as is, otherwise the
+        cheaper one by predict_costs, nodal analysis on a tie. With a topology cache the closed form node voltages
+        are shared, so nodal analysis is used unless it cannot solve the circuit. The choice and the reason for it
+        are recorded on the step
+        :return: 'nodal' or 'mesh'
+        :rtype: str
+        """
+        step = self.new_step('choose_method')
+        nodal_unsupported = self.nodal_unsupported()
+        if self.method == 'nodal' and nodal_unsupported is not None:
+            raise ValueError('Node voltage analysis cannot be used as {0}'.format(nodal_unsupported))
+        if self.method != 'auto':
+            step.method = self.method
+            step.method_reason = "{0} analysis was asked for".format(METHOD_NAMES[self.method])
+            return step.method
+        if self.topology_cache is not None and nodal_unsupported is None:
+            step.method = 'nodal'
+            step.method_reason = "{0} analysis is used as the topology cache holds node voltage solutions".format(
+                METHOD_NAMES['nodal'])
+            return step.method
+        step.method_costs = self.predict_costs()
+        nodal = step.method_costs.get('nodal')
+        mesh = step.method_costs.get('mesh')
+        if nodal is None and mesh is None:
+            raise ValueError('Node voltage analysis cannot be used as {0}, and mesh current analysis cannot model '
+                             '{1}'.format(nodal_unsupported,
+                                          ", ".join(comp.refdes for comp in self.mesh_unsupported())))
+        if nodal is None:
+            step.method = 'mesh'
+            step.method_reason = "{0} analysis is used as {1}".format(METHOD_NAMES['mesh'], nodal_unsupported)
+            return step.method
+        if mesh is None:
+            step.method = 'nodal'
+            step.method_reason = "{0} analysis is used as mesh current analysis cannot model {1}".format(
+                METHOD_NAMES['nodal'], ", ".join(comp.refdes for comp in self.mesh_unsupported()))
+            return step.method
+        step.method = 'mesh' if mesh['cost'] < nodal['cost'] else 'nodal'
+        step.method_reason = ("{0} analysis is used: {1} loop currents (estimated cost {2}) against {3} node "
+                              "voltages (estimated cost {4})").format(METHOD_NAMES[step.method], mesh['unknowns'],
+                                                                      mesh['cost'], nodal['unknowns'], nodal['cost'])
+        return step.method
 
     def kcl_everywhere(self):
-        self.solution.append(copy.deepcopy(self.solution[-1]))
+        step = self.new_step('kcl_everywhere')
         # TODO Honestly... what even is this?...
-        for node in self.solution[-1].circuit.nontrivial_nodedict.values():
+        for node in step.circuit.nontrivial_nodedict.values():
             node.solve_kcl() # TODO CHANGE THIS NAME
 
+    @instrument.stage
+    def solve_numeric(self):
+        """
+        Solves the circuit with a sparse LU factorization of its modified nodal matrix and stores the node voltages,
+        component currents and branch currents as arrays. This works on netlists far too large for the symbolic
+        steps. Only the nodes and components need to have been created
+        """
+        step = self.new_step('solve_numeric')
+        system = self.nodal_system()
+        step.node_voltages, step.component_currents = system.solve()
+        step.branch_currents = system.branch_currents(step.component_currents)
+
+    @instrument.stage
+    def update_value(self, refdes, value, currents=True):
+        """
+        Changes the value of one component in place and updates the numeric solution through a low rank update of
+        the existing factorization (see numeric.NodalSystem.update) instead of solving the circuit again. Nodes,
+        branches, supernodes and equations are left as they are. The first update factorizes the system
+        :type refdes: str
+        :param refdes: an impedance or voltage source
+        :type value: complex
+        :param value: the new value, as in the netlist: Ohms for resistors and impedances, F for capacitors, H for
+            inductors and V for voltage sources
+        :type currents: bool
+        :param currents: when False the component and branch currents are not updated (they are set to None), which
+            saves a pass over every component when only the node voltages are watched
+        :return: the new node voltages indexed by Node.index
+        :rtype: numpy.ndarray
+        """
+        system = self.nodal_system()
+        if refdes not in system.slot_of:
+            raise ValueError('There is no impedance or voltage source named {0}'.format(refdes))
+        is_source, i = system.slot_of[refdes]
+        (system.sources if is_source else system.impedances)[i].set_value(value)
+        step = self.new_step('update_value')
+        step.node_voltages, step.component_currents = system.update(refdes, currents)
+        step.branch_currents = system.branch_currents(step.component_currents) if currents else None
+        return step.node_voltages
+
+    def nodal_system(self):
+        """
+        The numeric MNA system of the circuit about the current reference node. Its stamp pattern and sparsity
+        structure only depend on the topology, so it is built once and reused by every numeric solve and sweep
+        :rtype: numeric.NodalSystem
+        """
+        ref = self.solution[-1].ref
+        if self._nodal_system is None or self._nodal_system.ref is not ref:
+            self._nodal_system = numeric.NodalSystem(self.circuit, ref)
+        return self._nodal_system
+
+    @instrument.stage
+    def sweep(self, values, filename=None):
+        """
+        Solves the circuit once for every row of a table of component values in one batched linear solve. The
+        topology (branches, supernodes and the structure of the nodal system) is analysed once for the whole table
+        :param values: maps the refdes of impedances and voltage sources to a column of N values, as a dict of
+            sequences or a numpy structured array. Values are read as in the netlist and update_value: Ohms for
+            resistors and impedances, F for capacitors, H for inductors and V for voltage sources. Components without
+            a column keep their value for every row
+        :type filename: str
+        :param filename: if given the results are also saved to this .npz file, along with the node names and the
+            refdes of every component
+        :return: (N, num_nodes) node voltages indexed by Node.index and (N, num_branches) branch currents
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        step = self.new_step('sweep')
+        system = self.nodal_system()
+        step.node_voltages, step.component_currents = system.solve_batch(*system.value_table(values))
+        step.branch_currents = system.branch_currents(step.component_currents)
+        if filename is not None:
+            numpy.savez(filename, node_voltages=step.node_voltages, component_currents=step.component_currents,
+                        branch_currents=step.branch_currents,
+                        node_names=numpy.array([str(name) for name in step.node_names]),
+                        refdes=numpy.array([comp.refdes for comp in step.circuit.component_list]))
+        return step.node_voltages, step.branch_currents
+
+    @instrument.stage
+    def ac_sweep(self, frequencies):
+        """
+        Solves the circuit at every frequency of a sweep in one batched linear solve, with the sources held at their
+        phasor voltages. The nodal system is built once and its structure shared by every frequency, only the
+        admittances of capacitors and inductors (and the equivalents of subcircuits) change
+        :param frequencies: N frequencies in Hz. They must not be 0 if the circuit has inductors
+        :return: (N, num_nodes) complex node voltages indexed by Node.index, one row per frequency
+        :rtype: numpy.ndarray
+        """
+        step = self.new_step('ac_sweep')
+        system = self.nodal_system()
+        step.frequencies = numpy.asarray(frequencies, dtype=float)
+        omegas = 2*numpy.pi*step.frequencies
+        y = system.admittances_at(omegas)
+        v = numpy.tile(system.source_voltages(), (len(y), 1))
+        step.node_voltages, step.component_currents = system.solve_batch(y, v, omegas)
+        step.branch_currents = system.branch_currents(step.component_currents)
+        return step.node_voltages
+
+    def check_flat(self):
+        """
+        The symbolic mode only solves circuits whose subcircuit instances have been flattened (see
+        Circuit.flatten_instances), it is checked before any step is recorded
+        """
+        if self.circuit.instance_list:
+            raise NotImplementedError('The symbolic solver needs the subcircuit instances of {0} flattened, see '
+                                      'Circuit.flatten_instances'.format(self.circuit.name))
+
+    @instrument.stage
+    def thevenin(self, pairs):
+        """
+        Finds the Thevenin (and Norton) equivalent of the circuit seen between each pair of nodes, about the current
+        reference node. Every pair comes out of a single factorization of the nodal system in numeric mode (see
+        numeric.NodalSystem.thevenin), or a single elimination of the modified nodal equations in symbolic mode (see
+        symbolic.PortEquations), rather than a solve per pair. Symbolic equivalents are closed forms in the symbols
+        of the circuit, see known_substitutions to put the values of the components in
+        :type pairs: list[(int | str, int | str)]
+        :param pairs: (pos, neg) node names. The Thevenin voltage is that of pos with respect to neg
+        :return: the equivalent between each pair, in the order they were given
+        :rtype: list[Equivalent]
+        """
+        for pos, neg in pairs:
+            for name in (pos, neg):
+                if name not in self.circuit.nodedict:
+                    raise ValueError('There is no node named {0}'.format(name))
+        if self.mode != 'numeric':
+            self.check_flat()
+        nodes = [(self.circuit.nodedict[pos], self.circuit.nodedict[neg]) for pos, neg in pairs]
+        step = self.new_step('thevenin')
+        if self.mode == 'numeric':
+            voltages, impedances = self.nodal_system().thevenin(nodes)
+        else:
+            import symbolic
+            voltages, impedances = symbolic.PortEquations(self.circuit, step.ref, nodes).solve_pairs()
+        step.equivalents = [Equivalent(pos, neg, voltage, impedance)
+                            for (pos, neg), voltage, impedance in zip(pairs, voltages, impedances)]
+        return step.equivalents
+
+    @instrument.stage
+    def solve(self):
+        """
+        Runs every solver step for the selected mode with node 0 as the reference, by the analysis method
+        choose_method picks. The circuit must already have been prepared (nodes, branches and supernodes) as in
+        main.py
+        """
+        if self.mode == 'numeric':
+            self.solve_numeric()
+            return
+        self.check_flat()
+        if self.choose_method() == 'mesh':
+            self.solve_mesh()
+            return
+        if self.topology_cache is not None:
+            self.solve_by_topology()
+            return
+        self.set_reference_voltage(self.circuit.nodedict[0])
+        self.identify_voltages()
+        self.identify_currents()
+        if self.series_parallel:
+            self.reduce_series_parallel()
+        self.gen_node_voltage_eq()
+        self.determine_known_vars()
+        self.sub_into_eqs()
+        self.solve_subbed_eqs()
+        if self.series_parallel:
+            self.expand_reductions()
+
+    @instrument.stage
     def set_reference_voltage(self, node=0):
         """
         The user should be allowed to select the reference node!
@@ -130,26 +754,46 @@ class Solver(object):
         :type node: Node
         :return:
         """
-        self.solution.append(copy.deepcopy(self.solution[-1]))
+        step = self.new_step('set_reference_voltage')
         if node == 0:
-            self.solution[-1].ref_node_num = sorted(self.solution[-1].circuit.reduced_nodedict.values(), key = lambda node: node.num_comp_connected)[-1].node_num
+            step.ref_node_num = sorted(step.circuit.reduced_nodedict.values(), key = lambda node: node.num_comp_connected)[-1].node_num
         else:
-            self.solution[-1].ref_node_num = node.node_num #TODO fix this problem with copying circuits. Ref needs to be property. Other attributes tha tshould be properties to avoid this?? Or it can be a node number
+            step.ref_node_num = node.node_num #TODO fix this problem with copying circuits. Ref needs to be property. Other attributes tha tshould be properties to avoid this?? Or it can be a node number
 
 
 class SolutionStep(object):
     """
-    Contains a Circuit instance which represents a step in the solution
+    Represents a step in the solution. Steps share the Circuit instance and every result (equations, known variables,
+    solutions) with the step before them: a step replaces a field rather than mutating it, so earlier steps keep
+    their values without being copied. Node voltages and branch currents live on the circuit, so each step journals
+    the ones it set in self.voltages and self.currents
     """
-    def __init__(self, circuit_to_solve):
+    def __init__(self, circuit_to_solve, name='start'):
+        self.name = name
+        """:type : str"""
+        self.voltages = {}
+        """:type : dict[int, complex]"""
+        self.currents = {}
+        """:type : dict[int, complex]"""
         self.numerators = []
         self.denomenators = []
         self.equations = []
         """:type : list[str]"""
         self.solved_is = False
-        self.node_voltage_eqs_str = []
-        """:type : list[str]"""
         self.node_voltage_eqs = []
+        self.node_voltage_kcl = []
+        """:type : list[list[CurrentExp]]"""
+        self.mesh_eqs = []
+        """:type : list[sympy.Expr]"""  # KVL around each loop of circuit.looplist
+        self.loop_currents = {}
+        """:type : dict[sympy.Symbol, sympy.Expr]"""
+        self.method = None
+        """:type : str"""  # the analysis method picked by Solver.choose_method
+        self.method_reason = ''
+        self.method_costs = {}
+        """:type : dict[str, dict[str, int]]"""  # see Solver.predict_costs
+        self.reductions = []
+        """:type : list[(str, str, list[list[str]])]"""  # refdes, kind and Reduction.impedance_names
         self.subbed_eqs = []
         self.solved_subbed_eq = []
         self.solved_eq = None
@@ -159,11 +803,110 @@ class SolutionStep(object):
         self.circuit = circuit_to_solve
         """:type : Circuit"""
         self.ref_node_num = 0
+        self.node_voltages = None
+        """:type : numpy.ndarray"""
+        self.component_currents = None
+        """:type : numpy.ndarray"""
+        self.branch_currents = None
+        """:type : numpy.ndarray"""
+        self.frequencies = None
+        """:type : numpy.ndarray"""
+        self.equivalents = []
+        """:type : list[Equivalent]"""
 
     @property
     def ref(self):
         return self.circuit.nodedict[self.ref_node_num]
 
+    def __getstate__(self):
+        """
+        A pickled step is detached from its circuit, so a solution can be stored and explained again without the
+        netlist: the circuit and the current expressions are dropped and only the strings derived from them are kept
+        """
+        state = dict(self.__dict__)
+        state['saved_eqs_str'] = self.node_voltage_eqs_str
+        state['saved_node_names'] = self.node_names
+        state['circuit'] = None
+        state['node_voltage_kcl'] = []
+        return state
+
+    @property
+    def node_names(self):
+        """
+        The name of every node of the circuit, indexed by Node.index like the numeric results
+        :rtype: list[int | str]
+        """
+        if self.circuit is None:
+            return self.saved_node_names
+        return [node.node_num for node in self.circuit.nodelist]
+
+    @property
+    def node_voltage_eqs_str(self):
+        """
+        The node voltage equations as strings, generated from the current expressions when asked for
+        :rtype: list[str]
+        """
+        if self.circuit is None:
+            return self.saved_eqs_str
+        return ["+".join([exp.str_expr for exp in current_exps]) for current_exps in self.node_voltage_kcl]
+
+    def next_step(self, name):
+        """
+        :return: a new step sharing every result with this one and with empty journals
+        :rtype: SolutionStep
+        """
+        step = SolutionStep.__new__(SolutionStep)  # not copy.copy, which would detach the copy (see __getstate__)
+        step.__dict__.update(self.__dict__)
+        step.name = name
+        step.voltages = {}
+        step.currents = {}
+        return step
+
+    def record_voltage(self, node):
+        """
+        :type node: circuit.Node
+        """
+        self.voltages[node.node_num] = node.voltage
+
+    def record_current(self, branch):
+        """
+        :type branch: circuit.Branch
+        """
+        self.currents[branch.branch_num] = branch.current
+
+
+class Equivalent(object):
+    """
+    The Thevenin equivalent of a circuit seen between two of its nodes: a voltage source in series with an impedance.
+    Its Norton form is a current source in parallel with the same impedance
+    :type pos: int | str
+    :type neg: int | str
+    """
+    __slots__ = ('pos', 'neg', 'voltage', 'impedance')
+
+    def __init__(self, pos, neg, voltage, impedance):
+        """
+        :param pos: name of the node the voltage is taken at
+        :param neg: name of the node the voltage is taken with respect to
+        :param voltage: the open circuit voltage from pos to neg
+        :param impedance: the impedance seen between pos and neg with every source zeroed
+        """
+        self.pos = pos
+        self.neg = neg
+        self.voltage = voltage
+        self.impedance = impedance
+
+    @property
+    def current(self):
+        """
+        The Norton current: the short circuit current flowing from pos to neg through a short across them
+        """
+        return self.voltage/self.impedance
+
+    @property
+    def admittance(self):
+        return 1/self.impedance
+
 
 class Teacher(object):
     """
@@ -176,14 +919,31 @@ class Teacher(object):
         """:type : Solver"""
 
     def explain(self):
-        print("First choose a reference voltage (ground node):\nNode {0} is ref at 0V".format(self.solver.solution[-1].ref.node_num))
+        print("First choose a reference voltage (ground node):\nNode {0} is ref at 0V".format(self.solver.solution[-1].ref_node_num))
         print("We then identify the voltage at each node connected to ground.")
-        # TODO insert printing of voltages
+        step = self.solver.find_step('identify_voltages')
+        if step is not None:
+            for node_num, voltage in sorted(step.voltages.items()):
+                print("{0} = {1} V".format(helper_funcs.voltage_name(node_num), voltage))
         print("With this information, we can calculate the current through each resistive branch across which the voltage is known:")
-        # TODO insert printing of currents
+        step = self.solver.find_step('identify_currents')
+        if step is not None:
+            for branch_num, current in sorted(step.currents.items()):
+                print("I{0} = {1} A".format(branch_num, current))
         print("This allows us to solve some circuits which don't require node voltage or mesh current analysis")
-        print("Performing KCL at each node:")
-        print(self.solver.solution[-1].node_voltage_eqs_str)
+        if self.solver.solution[-1].method_reason:
+            print(self.solver.solution[-1].method_reason)
+        if self.solver.solution[-1].reductions:
+            print("Combining impedances in series and in parallel:")
+            for refdes, kind, branches in self.solver.solution[-1].reductions:
+                print("{0} = {1}".format(refdes, " || ".join("({0})".format(" + ".join(names)) for names in branches)
+                                         if kind == 'parallel' else " + ".join(branches[0])))
+        if self.solver.solution[-1].mesh_eqs:
+            print("Performing KVL around each independent loop, with a current J circulating in each loop:")
+            print([str(eq) for eq in self.solver.solution[-1].mesh_eqs])
+        else:
+            print("Performing KCL at each node:")
+            print(self.solver.solution[-1].node_voltage_eqs_str)
         print("Substituting in for the known variables:")
         print(self.solver.solution[-1].known_vars)
         print("And solving the system of equations using Kramer's rule or equivalent method:")
@@ -0,0 +1,102 @@
+""" Reduction of subcircuits to the equivalent they present at their ports.
+    Seen from its ports a linear subcircuit is
+        I = Y V - J
+    where V are the port voltages, I the currents flowing into the subcircuit at each port, Y its port admittance
+    matrix and J the Norton currents its sources drive out of each port. Both are found from the MNA system
+    (see numeric.NodalSystem) of the body, A x = b, by eliminating every unknown that is not a port voltage (the
+    internal node voltages and the voltage source currents, r below) with a Schur complement:
+        Y = A_pp - A_pr A_rr^-1 A_rp        J = b_p - A_pr A_rr^-1 b_r
+    The body is solved about its last port, so the row and column of that port are filled in afterwards from the
+    others: no current leaves a subcircuit other than through its ports, so every row and column of Y and the
+    entries of J sum to zero.
+    The equivalent of each definition is worked out once per angular frequency and kept on the definition
+    (netlist.Subcircuit.equivalents). Every instance stamps it into the system of its circuit, which therefore only
+    holds the nodes the instances connect to. Instances placed in a body are stamped the same way when the body is
+    reduced.
+"""
+import circuit
+import numeric
+
+import numpy
+import scipy.sparse.linalg
+
+
+class PortEquivalent(object):
+    """
+    :type y: numpy.ndarray
+    :type j: numpy.ndarray
+    """
+    __slots__ = ('y', 'j')
+
+    def __init__(self, y, j):
+        """
+        :param y: (ports, ports) port admittance matrix, in the order of Subcircuit.port_indices
+        :param j: Norton current driven out of each port
+        """
+        self.y = y
+        self.j = j
+
+
+def port_equivalent(definition, omega):
+    """
+    :type definition: netlist.Subcircuit
+    :type omega: float
+    :param omega: angular frequency in rad/s the capacitors and inductors of the body are evaluated at
+    :return: the equivalent of definition at omega, reduced the first time it is asked for
+    :rtype: PortEquivalent
+    """
+    equivalent = definition.equivalents.get(omega)
+    if equivalent is None:
+        equivalent = definition.equivalents[omega] = reduce_subcircuit(definition, omega)
+    return equivalent
+
+
+def body_circuit(definition):
+    """
+    :type definition: netlist.Subcircuit
+    :return: the body of definition with its nodes and components created
+    :rtype: circuit.Circuit
+    """
+    body = circuit.Circuit()
+    body.netlist = definition.body
+    body.name = definition.name
+    body.create_nodes()
+    body.populate_nodes()
+    return body
+
+
+def reduce_subcircuit(definition, omega):
+    """
+    Reduces the body of definition to its ports, see the module docstring
+    :type definition: netlist.Subcircuit
+    :type omega: float
+    :rtype: PortEquivalent
+    """
+    num_ports = len(definition.port_indices)
+    y, j = numpy.zeros((num_ports, num_ports), dtype=complex), numpy.zeros(num_ports, dtype=complex)
+    if num_ports < 2:  # no current can flow through a single port
+        return PortEquivalent(y, j)
+    body = body_circuit(definition)
+    body.store.omega = omega
+    system = numeric.NodalSystem(body, body.nodelist[definition.port_indices[-1]])
+    a, b = system.matrix().tocsr(), system.rhs()
+    ports = system.row_of[definition.port_indices[:-1]]
+    rest = numpy.setdiff1d(numpy.arange(system.size), ports)
+    a_pp, a_pr = a[ports][:, ports].toarray(), a[ports][:, rest]
+    y_free, j_free = a_pp, b[ports]
+    if len(rest):
+        try:
+            lu = scipy.sparse.linalg.splu(a[rest][:, rest].tocsc())
+        except RuntimeError:  # singular, e.g. a floating internal node or a voltage source across two ports
+            raise ValueError('Subcircuit {0} cannot be reduced to an admittance between its ports'.format(
+                definition.name))
+        solved = lu.solve(numpy.column_stack([a[rest][:, ports].toarray(), b[rest]]))
+        y_free = a_pp - a_pr.dot(solved[:, :-1])
+        j_free = b[ports] - a_pr.dot(solved[:, -1])
+    y[:-1, :-1] = y_free
+    y[:-1, -1] = -y_free.sum(axis=1)
+    y[-1, :-1] = -y_free.sum(axis=0)
+    y[-1, -1] = y_free.sum()
+    j[:-1] = j_free
+    j[-1] = -j_free.sum()
+    return PortEquivalent(y, j)
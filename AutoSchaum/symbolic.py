@@ -0,0 +1,553 @@
+""" Matrix form of the symbolic node voltage (and mesh current) equations.
+    The KCL equations built by Node.node_voltage_kcl are linear in the unknown node voltages, so rather than handing
+    their strings to sympy.solve they are stamped straight from the current expressions into a sparse system
+        A x = b
+    with one row per equation and one column per unknown node voltage. Each symbolic conductance (the inverse of
+    the impedances a term of an equation flows through) stands in as a symbol of its own, so every entry is a
+    polynomial of degree one and the solution only turns back into the impedances once it is found.
+    The system is solved by fraction-free (Bareiss) Gauss-Jordan elimination: every division is exact, so no
+    polynomial gcds are needed until the final answers are reduced. Pivots are chosen by their Markowitz cost (the
+    pivot that creates the least fill-in is eliminated first), which keeps the polynomials small on the sparse
+    matrices circuits produce.
+    When every entry is a number the same elimination runs on python complex numbers.
+    The KVL equations around the loops of a circuit are stamped into the same kind of system by MeshEquations, with
+    one column per loop current. PortEquations stamps the modified nodal equations of a whole circuit, along with one
+    extra right hand side per pair of nodes it finds the Thevenin equivalent between.
+"""
+import heapq
+
+import helper_funcs
+
+import numpy
+import sympy
+from sympy.polys.rings import sring
+from sympy.printing.pycode import NumPyPrinter
+
+NUMERIC_TOLERANCE = 1e-12  # an entry that shrinks below this fraction of its size during elimination is zero
+EVALUATION_CHUNK = 2**14  # operating points a CompiledSolution evaluates at a time
+
+
+def voltage_symbol(node):
+    """
+    :type node: circuit.Node
+    :return: the symbol standing for the voltage of node, the same as SymbolTable.voltage gives
+    :rtype: sympy.Symbol
+    """
+    return sympy.Symbol(helper_funcs.voltage_name(node.node_num))
+
+
+def value_symbol(comp):
+    """
+    :type comp: components.Component | circuit.Reduction
+    :return: the symbol standing for the value of comp, the same as SymbolTable.value gives
+    :rtype: sympy.Symbol
+    """
+    return sympy.Symbol(comp.refdes)
+
+
+class NodalEquations(object):
+    """
+    The node voltage equations of a circuit as a sparse linear system. Entries are python complex numbers when
+    every symbol has a value and sympy polynomials otherwise
+    :type unknowns: list[circuit.Node]
+    :type rows: list[dict[int, object]]
+    :type rhs: list[object]
+    """
+
+    def __init__(self, kcl, unknowns, values=None):
+        """
+        :type kcl: list[list[circuit.CurrentExp]]
+        :param kcl: for each equation, the current expressions that sum to zero
+        :type unknowns: list[circuit.Node]
+        :param unknowns: the nodes whose voltage is solved for. Any other node voltage is treated as known
+        :type values: dict[sympy.Symbol, complex]
+        :param values: values substituted for the symbols of the components and of the node voltages, keyed by
+            symbol. Symbols without a value stay symbolic
+        """
+        self.unknowns = unknowns
+        self.unknown_symbols = [voltage_symbol(node) for node in unknowns]
+        self.values = values or {}
+        self.column_of = dict((symbol, col) for col, symbol in enumerate(self.unknown_symbols))
+        self.conductances = {}  # symbol standing for a conductance -> 1/(sum of the impedances it conducts through)
+        """:type : dict[sympy.Dummy, sympy.Expr]"""
+        self.ring = None
+        """:type : sympy.polys.rings.PolyRing"""
+        self.columns = []  # further right hand sides, eliminated along with rhs (see PortEquations)
+        """:type : list[list[object]]"""
+        self.rows, self.rhs = self._stamp(kcl)
+
+    def _stamp(self, kcl):
+        """
+        Converts each term (V_start - sources - V_end)/(impedances) of each equation into matrix entries. The
+        conductance of each distinct sum of impedances is a number when its impedances have values and otherwise
+        a symbol of its own (see self.conductances), so that every entry is a polynomial of degree one
+        :type kcl: list[list[circuit.CurrentExp]]
+        :return: the rows of A as dicts of column -> entry, and b
+        :rtype: (list[dict[int, object]], list[object])
+        """
+        leaves = {}  # symbol -> its value, or itself
+        for exps in kcl:
+            for exp in exps:
+                if not exp.impedances:
+                    raise ValueError('The branch from node {0} to node {1} holds only voltage sources, so its current '
+                                     'has no impedance to be written with'.format(
+                                         exp.voltages[0].voltage.node_num, exp.voltages[-1].voltage.node_num))
+                symbols = [value_symbol(impedance) for impedance in exp.impedances] + \
+                    [value_symbol(emf.voltage) for emf in exp.voltages[1:-1]] + \
+                    [voltage_symbol(emf.voltage) for emf in (exp.voltages[0], exp.voltages[-1])]
+                for symbol in symbols:
+                    if symbol not in leaves and symbol not in self.column_of:
+                        leaves[symbol] = sympy.sympify(self.values.get(symbol, symbol))
+        conductance_of = {}
+        impedance_sums = [[sympy.Add(*[leaves[value_symbol(impedance)] for impedance in exp.impedances])
+                           for exp in exps] for exps in kcl]
+        for sums in impedance_sums:
+            for impedance in sums:
+                if impedance in conductance_of:
+                    continue
+                if impedance.free_symbols:
+                    conductance_of[impedance] = sympy.Dummy('G')
+                    self.conductances[conductance_of[impedance]] = 1/impedance
+                else:
+                    conductance_of[impedance] = 1/impedance
+        names = list(leaves)
+        impedances = list(conductance_of)
+        self.zero, self.one, converted = self._convert([leaves[name] for name in names] +
+                                                       [conductance_of[impedance] for impedance in impedances])
+        conductance_of = dict(zip(impedances, converted[len(names):]))
+        leaves = dict(zip(names, converted))
+        rows, rhs = [], []
+        for exps, sums in zip(kcl, impedance_sums):
+            row, constant = {}, self.zero
+            for exp, impedance in zip(exps, sums):
+                conductance = conductance_of[impedance]
+                emf = sum((emf.direction*leaves[value_symbol(emf.voltage)] for emf in exp.voltages[1:-1]),
+                          self.zero)
+                constant = constant - emf*conductance
+                for node, sign in ((exp.voltages[0].voltage, 1), (exp.voltages[-1].voltage, -1)):
+                    symbol = voltage_symbol(node)
+                    if symbol in self.column_of:
+                        col = self.column_of[symbol]
+                        row[col] = row.get(col, self.zero) + sign*conductance
+                    else:
+                        constant = constant + sign*conductance*leaves[symbol]
+            rows.append(dict((col, entry) for col, entry in row.items() if entry != 0))
+            rhs.append(-constant)
+        return rows, rhs
+
+    def _convert(self, exprs):
+        """
+        Picks the arithmetic the elimination is carried out in: python complex numbers when there are no symbols
+        left, otherwise exact polynomials over the rationals (or the gaussian rationals when I appears), whose ring
+        is kept in self.ring
+        :type exprs: list[sympy.Expr]
+        :return: zero and one of the arithmetic and every expression converted into it
+        """
+        exprs = exprs + [sympy.S.Zero, sympy.S.One]
+        symbols = sorted(set().union(*[expr.free_symbols for expr in exprs]), key=str)
+        if not symbols:
+            converted = [complex(expr) for expr in exprs]
+        else:
+            exprs = [sympy.nsimplify(expr, rational=True) for expr in exprs]
+            options = {'extension': True} if any(expr.has(sympy.I) for expr in exprs) else {}
+            self.ring, converted = sring(exprs, *symbols, **options)
+        return converted[-2], converted[-1], converted[:-2]
+
+    def eliminate(self):
+        """
+        Fraction-free (Bareiss) forward elimination of the system in place. At each step the nonzero entry of the rows
+        not yet eliminated with the smallest Markowitz cost (row count - 1)*(column count - 1) is chosen, ties going
+        to the smallest entry. Every row not yet eliminated is then updated as
+            row = (pivot*row - factor*pivot_row)/previous pivot
+        which divides exactly, so the last pivot is the determinant of the eliminated system. Numbers are instead
+        eliminated with the pivot row scaled to a unit pivot, as fraction-free products of pivots would overflow
+        :return: the (row, column) of each pivot in elimination order and the last pivot
+        :rtype: (list[(int, int)], object)
+        """
+        rows, rhs = self.rows, self.rhs
+        active = set(range(len(rows)))
+        pivots = []
+        previous = self.one
+        while active:
+            col_count = {}
+            for r in active:
+                for col in rows[r]:
+                    col_count[col] = col_count.get(col, 0) + 1
+            candidates = [((len(rows[r]) - 1)*(col_count[col] - 1), entry_size(rows[r][col]), r, col)
+                          for r in active for col in rows[r]]
+            if not candidates:
+                break
+            r, col = min(candidates)[2:]
+            active.remove(r)
+            pivots.append((r, col))
+            pivot = rows[r][col]
+            if isinstance(pivot, complex):
+                rows[r] = dict((c, entry/pivot) for c, entry in rows[r].items())
+                for column in [rhs] + self.columns:
+                    column[r] = column[r]/pivot
+                pivot = self.one
+            pivot_row = rows[r]
+            for other in active:
+                factor = rows[other].pop(col, self.zero)
+                updated = {}
+                for c in set(rows[other]) | set(pivot_row):
+                    if c == col:
+                        continue
+                    current = pivot*rows[other].get(c, self.zero)
+                    entry = current - factor*pivot_row.get(c, self.zero)
+                    if not cancelled(entry, current):
+                        updated[c] = exquo(entry, previous)
+                rows[other] = updated
+                for column in [rhs] + self.columns:
+                    column[other] = exquo(pivot*column[other] - factor*column[r], previous)
+            previous = pivot
+        return pivots, previous
+
+    def solve(self):
+        """
+        Eliminates the system then back substitutes, also fraction-free: each unknown is found multiplied by the
+        determinant, which keeps every division exact, and only the final answers are reduced to lowest terms
+        :return: the voltage of every unknown node that could be solved for, keyed by its symbol as sympy.solve
+            would. Unknowns left without a pivot (an underdetermined system) stay symbolic in the other results
+        :rtype: dict[sympy.Symbol, sympy.Expr]
+        """
+        pivots, determinant = self.eliminate()
+        symbols = self.unknown_symbols
+        free = set(range(len(symbols))) - set(col for r, col in pivots)
+        if free:
+            solution = dict((col, symbols[col]) for col in free)
+            for r, col in reversed(pivots):
+                known = to_expr(self.rhs[r]) - sympy.Add(*[to_expr(entry)*solution[c]
+                                                           for c, entry in self.rows[r].items() if c != col])
+                solution[col] = sympy.cancel(known/to_expr(self.rows[r][col]))
+            return dict((symbols[col], sympy.cancel(solution[col].subs(self.conductances))) for r, col in pivots)
+        scaled = self.back_substitute(pivots, determinant, self.rhs)
+        return dict((symbols[col], self._impedance_form(scaled[col], determinant)) for col in scaled)
+
+    def back_substitute(self, pivots, determinant, rhs):
+        """
+        :param pivots: the pivots and last pivot returned by eliminate
+        :param rhs: a right hand side eliminated along with the system, rhs or one of self.columns
+        :return: each unknown multiplied by the determinant, keyed by its column
+        :rtype: dict[int, object]
+        """
+        scaled = {}
+        for r, col in reversed(pivots):
+            known = determinant*rhs[r]
+            for c, entry in self.rows[r].items():
+                if c != col:
+                    known = known - entry*scaled[c]
+            scaled[col] = exquo(known, self.rows[r][col])
+        return scaled
+
+    def _impedance_form(self, numerator, denominator):
+        """
+        Reduces numerator/denominator to lowest terms and replaces the conductance symbols by the impedances they
+        stand for. Multiplying through by each impedance raised to the highest power its conductance appears with
+        keeps both sides polynomials, so the conversion needs no gcd beyond a final reduction
+        :return: numerator/denominator in terms of the symbols of the circuit
+        :rtype: sympy.Expr
+        """
+        if isinstance(numerator, complex):
+            return sympy.sympify(numerator/denominator)
+        numerator, denominator = numerator.cancel(denominator)
+        if not self.conductances:
+            return numerator.as_expr()/denominator.as_expr()
+        gens = self.ring.symbols
+        conductance_gens = [i for i, gen in enumerate(gens) if gen in self.conductances]
+        plain_gens = [i for i, gen in enumerate(gens) if gen not in self.conductances]
+        impedances = [1/self.conductances[gens[i]] for i in conductance_gens]
+        symbols = sorted(set().union(*[impedance.free_symbols for impedance in impedances]) |
+                         set(gens[i] for i in plain_gens), key=str)
+        target, converted = sring([gens[i] for i in plain_gens] + impedances, *symbols, domain=self.ring.domain)
+        plain, impedances = converted[:len(plain_gens)], converted[len(plain_gens):]
+        powers = [max(numerator.degree(i), denominator.degree(i), 0) for i in conductance_gens]
+        impedance_powers = [[impedance**k for k in range(power + 1)] for impedance, power in zip(impedances, powers)]
+
+        def lift(poly):
+            lifted = target.zero
+            for monom, coeff in poly.terms():
+                term = target.ground_new(coeff)
+                for gen, i in zip(plain, plain_gens):
+                    term = term*gen**monom[i]
+                for impedance_power, power, i in zip(impedance_powers, powers, conductance_gens):
+                    term = term*impedance_power[power - monom[i]]
+                lifted += term
+            return lifted
+        numerator, denominator = lift(numerator).cancel(lift(denominator))
+        return numerator.as_expr()/denominator.as_expr()
+
+
+def current_name(loop):
+    """
+    :type loop: circuit.Loop
+    :return: the name of the symbol standing for the current of loop
+    :rtype: str
+    """
+    return "J{0}".format(loop.loop_num)
+
+
+class MeshEquations(NodalEquations):
+    """
+    The KVL equations around the loops of a circuit (see Circuit.create_loops) as a sparse linear system with one
+    column per loop current. Entry (L, M) is the sum of the impedances of the branches loops L and M both run
+    through, signed by whether they run through them in the same direction, so every entry is a polynomial of degree
+    one in the impedances and no conductances are needed. It is eliminated and solved as NodalEquations are
+    """
+
+    def __init__(self, loops, values=None):
+        """
+        :type loops: list[circuit.Loop]
+        :type values: dict[sympy.Symbol, complex]
+        :param values: values substituted for the symbols of components, keyed by symbol. Symbols without a value
+            stay symbolic
+        """
+        self.unknowns = loops
+        self.unknown_symbols = [sympy.Symbol(current_name(loop)) for loop in loops]
+        self.values = values or {}
+        self.conductances = {}
+        self.ring = None
+        self.columns = []
+        self.rows, self.rhs = self._stamp(loops)
+
+    def _stamp(self, loops):
+        """
+        :type loops: list[circuit.Loop]
+        :return: the rows of A as dicts of column -> entry, and b
+        :rtype: (list[dict[int, object]], list[object])
+        """
+        through = helper_funcs.loops_through(loops)
+        symbols = sorted(set(value_symbol(comp) for branch in through for comp in branch.impedances()) |
+                         set(value_symbol(source) for branch in through for source, sign in branch.sources()), key=str)
+        self.zero, self.one, converted = self._convert([sympy.sympify(self.values.get(symbol, symbol))
+                                                        for symbol in symbols])
+        leaves = dict(zip(symbols, converted))
+        rows, rhs = [{} for loop in loops], [self.zero]*len(loops)
+        for branch, loop_directions in through.items():
+            impedance = sum((leaves[value_symbol(comp)] for comp in branch.impedances()), self.zero)
+            emf = sum((sign*leaves[value_symbol(source)] for source, sign in branch.sources()), self.zero)
+            for row, row_direction in loop_directions:
+                rhs[row] = rhs[row] - row_direction*emf
+                for col, col_direction in loop_directions:
+                    rows[row][col] = rows[row].get(col, self.zero) + row_direction*col_direction*impedance
+        return [dict((col, entry) for col, entry in row.items() if entry != 0) for row in rows], rhs
+
+
+class PortEquations(NodalEquations):
+    """
+    The modified nodal equations of a whole circuit (as numeric.NodalSystem stamps them) with one column per node
+    other than the reference and one per voltage source current. Besides the right hand side of the sources, each
+    pair of nodes gets a right hand side injecting 1A into its first node and out of its second with every source
+    zeroed. The response to it across the pair is the impedance seen between the nodes, so a single elimination
+    gives the Thevenin equivalent between every pair. The impedances are stamped through conductance symbols as in
+    NodalEquations
+    """
+
+    def __init__(self, circuit, ref, pairs, values=None):
+        """
+        :type circuit: circuit.Circuit
+        :type ref: circuit.Node
+        :type pairs: list[(circuit.Node, circuit.Node)]
+        :type values: dict[sympy.Symbol, complex]
+        :param values: values substituted for the symbols of components, keyed by symbol. Symbols without a value
+            stay symbolic
+        """
+        nodes = [node for node in circuit.nodelist if node is not ref]
+        sources = helper_funcs.only_vsources(circuit.component_list)
+        self.unknowns = nodes + sources
+        self.unknown_symbols = ([voltage_symbol(node) for node in nodes] +
+                                [sympy.Symbol("I({0})".format(source.refdes)) for source in sources])
+        self.values = values or {}
+        self.conductances = {}
+        self.ring = None
+        self.columns = []
+        self.column_of = dict((node, col) for col, node in enumerate(nodes))  # the reference has no column
+        self.pair_columns = [(self.column_of.get(pos), self.column_of.get(neg)) for pos, neg in pairs]
+        self.rows, self.rhs = self._stamp(circuit, sources)
+
+    def _stamp(self, circuit, sources):
+        """
+        :type circuit: circuit.Circuit
+        :type sources: list[components.VoltageSource]
+        :return: the rows of A as dicts of column -> entry, and b. The right hand side of each pair is added to
+            self.columns
+        :rtype: (list[dict[int, object]], list[object])
+        """
+        impedances = helper_funcs.only_impedances(circuit.component_list)
+        conductances = []
+        for impedance in impedances:
+            z = sympy.sympify(self.values.get(value_symbol(impedance), value_symbol(impedance)))
+            if z.free_symbols:
+                conductances.append(sympy.Dummy('G'))
+                self.conductances[conductances[-1]] = 1/z
+            else:
+                conductances.append(1/z)
+        emfs = [sympy.sympify(self.values.get(value_symbol(source), value_symbol(source))) for source in sources]
+        self.zero, self.one, converted = self._convert(conductances + emfs)
+        conductances, emfs = converted[:len(impedances)], converted[len(impedances):]
+        num_nodes = len(self.column_of)
+        rows, rhs = [{} for unknown in self.unknowns], [self.zero]*len(self.unknowns)
+
+        def stamp(row, col, entry):
+            if row is not None and col is not None:
+                rows[row][col] = rows[row].get(col, self.zero) + entry
+        for impedance, conductance in zip(impedances, conductances):
+            p, n = self.column_of.get(impedance.pos), self.column_of.get(impedance.neg)
+            for row, col, sign in ((p, p, 1), (n, n, 1), (p, n, -1), (n, p, -1)):
+                stamp(row, col, sign*conductance)
+        for i, (source, emf) in enumerate(zip(sources, emfs)):
+            s = num_nodes + i
+            p, n = self.column_of.get(source.pos), self.column_of.get(source.neg)
+            for row, col, sign in ((p, s, 1), (n, s, -1), (s, p, 1), (s, n, -1)):
+                stamp(row, col, sign*self.one)
+            rhs[s] = emf
+        for pos, neg in self.pair_columns:
+            column = [self.zero]*len(self.unknowns)
+            for row, sign in ((pos, 1), (neg, -1)):
+                if row is not None:
+                    column[row] = column[row] + sign*self.one
+            self.columns.append(column)
+        return [dict((col, entry) for col, entry in row.items() if entry != 0) for row in rows], rhs
+
+    def solve_pairs(self):
+        """
+        :return: the open circuit voltage from the first node of each pair to the second and the impedance seen
+            between them, in the order the pairs were given
+        :rtype: (list[sympy.Expr], list[sympy.Expr])
+        """
+        pivots, determinant = self.eliminate()
+        if len(pivots) < len(self.unknowns):
+            raise ValueError('The nodal equations of the circuit are singular')
+
+        def across(scaled, pos, neg):
+            return (self.zero if pos is None else scaled[pos]) - (self.zero if neg is None else scaled[neg])
+        scaled = self.back_substitute(pivots, determinant, self.rhs)
+        voltages, impedances = [], []
+        for (pos, neg), column in zip(self.pair_columns, self.columns):
+            response = self.back_substitute(pivots, determinant, column)
+            voltages.append(self._impedance_form(across(scaled, pos, neg), determinant))
+            impedances.append(self._impedance_form(across(response, pos, neg), determinant))
+        return voltages, impedances
+
+
+def entry_size(entry):
+    """
+    :return: how costly an entry is as a pivot. The number of terms of a polynomial, or for numbers the opposite
+        of the magnitude so that the largest is preferred
+    """
+    if isinstance(entry, complex):
+        return -abs(entry)
+    return len(entry)
+
+
+def cancelled(entry, current):
+    """
+    :return: whether an update during elimination cancelled an entry out. Exact for polynomials, relative to the
+        size of the entry for numbers, where rounding leaves a residue instead of an exact zero
+    :rtype: bool
+    """
+    if isinstance(entry, complex):
+        return abs(entry) <= NUMERIC_TOLERANCE*abs(current)
+    return entry == 0
+
+
+def exquo(dividend, divisor):
+    """
+    :return: dividend/divisor where the division is known to be exact. For polynomials this is long division
+        that keeps the remainder's monomials in a heap, rather than rescanning the remainder for its leading term
+        after every subtraction as PolyElement.exquo does, which dominates the elimination on large polynomials
+    """
+    if isinstance(dividend, complex):
+        return dividend/divisor
+    if len(divisor) == 1:
+        return dividend.exquo(divisor)
+    ring = dividend.ring
+    divisor_monom, divisor_coeff = divisor.LM, divisor.LC
+    remainder = dict(dividend)
+    heap = [tuple(-e for e in monom) for monom in remainder]
+    heapq.heapify(heap)
+    quotient = {}
+    while remainder:
+        monom = tuple(-e for e in heapq.heappop(heap))
+        if monom not in remainder:
+            continue
+        quotient_monom = tuple(a - b for a, b in zip(monom, divisor_monom))
+        quotient_coeff = ring.domain.quo(remainder[monom], divisor_coeff)
+        quotient[quotient_monom] = quotient_coeff
+        for term_monom, term_coeff in divisor.items():
+            term_monom = tuple(a + b for a, b in zip(term_monom, quotient_monom))
+            coeff = remainder.get(term_monom, ring.domain.zero) - quotient_coeff*term_coeff
+            if coeff:
+                if term_monom not in remainder:
+                    heapq.heappush(heap, tuple(-e for e in term_monom))
+                remainder[term_monom] = coeff
+            else:
+                remainder.pop(term_monom, None)
+    return ring.from_dict(quotient)
+
+
+def to_expr(value):
+    """
+    :param value: an entry of the system
+    :rtype: sympy.Expr
+    """
+    if isinstance(value, complex):
+        return sympy.sympify(value)
+    return value.as_expr()
+
+
+class CompiledSolution(object):
+    """
+    Closed form node voltages (as found by Solver.solve_eqs) compiled into a single numpy function. Subexpressions
+    shared between the voltages are computed once, and every argument may be an array so that many operating points
+    are evaluated in one call
+    :type unknowns: list[sympy.Symbol]
+    :type arguments: list[sympy.Symbol]
+    """
+
+    def __init__(self, solved):
+        """
+        :type solved: dict[sympy.Symbol, sympy.Expr]
+        :param solved: the voltage of each unknown node in terms of the symbols of the circuit
+        """
+        self.unknowns = sorted(solved, key=str)
+        self.arguments = sorted(set().union(*[solved[unknown].free_symbols for unknown in self.unknowns]), key=str)
+        # the function is generated with placeholder argument names since node names need not be identifiers
+        placeholders = dict((symbol, sympy.Symbol('_a{0}'.format(i))) for i, symbol in enumerate(self.arguments))
+        replacements, reduced = sympy.cse([solved[unknown].xreplace(placeholders) for unknown in self.unknowns],
+                                          symbols=sympy.numbered_symbols('_x'))
+        printer = NumPyPrinter()
+        lines = ["from __future__ import division",
+                 "def _solution({0}):".format(", ".join(str(placeholders[symbol]) for symbol in self.arguments))]
+        lines += ["    {0} = {1}".format(symbol, printer.doprint(expr)) for symbol, expr in replacements]
+        lines += ["    return ({0})".format("".join(printer.doprint(expr) + ", " for expr in reduced))]
+        self.source = "\n".join(lines)
+        namespace = {'numpy': numpy}
+        exec(compile(self.source, '<compiled solution>', 'exec'), namespace)
+        self.function = namespace['_solution']
+
+    def __call__(self, values):
+        """
+        :type values: dict[sympy.Symbol, complex | numpy.ndarray]
+        :param values: the value of every argument, keyed by its symbol. Arrays are broadcast against each other
+        :return: the voltage of each unknown node, keyed by its symbol
+        :rtype: dict[sympy.Symbol, numpy.ndarray]
+        """
+        missing = [str(symbol) for symbol in self.arguments if symbol not in values]
+        if missing:
+            raise ValueError('No value given for {0}'.format(", ".join(missing)))
+        arguments = [numpy.asarray(values[symbol]) for symbol in self.arguments]
+        shape = numpy.broadcast_arrays(*arguments)[0].shape if arguments else ()
+        size = int(numpy.prod(shape))
+        # arrays are flattened and evaluated in chunks so the temporaries of a long solution stay small
+        arrays = [i for i, argument in enumerate(arguments) if argument.ndim]
+        for i in arrays:
+            arguments[i] = numpy.broadcast_to(arguments[i], shape).reshape(-1)
+        results = [numpy.empty(size, dtype=complex) for unknown in self.unknowns]
+        for start in range(0, max(size, 1), EVALUATION_CHUNK):
+            chunk = list(arguments)
+            for i in arrays:
+                chunk[i] = arguments[i][start:start + EVALUATION_CHUNK]
+            for result, chunk_result in zip(results, self.function(*chunk)):
+                result[start:start + EVALUATION_CHUNK] = chunk_result
+        return dict((unknown, result.reshape(shape)) for unknown, result in zip(self.unknowns, results))
@@ -0,0 +1,45 @@
+from nose2.compat import unittest
+import os
+import tempfile
+from AutoSchaum.AutoSchaum import batch
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.netlists = ["AutoSchaum/resources/node_voltage.crt", "AutoSchaum/resources/my_circuit.crt"]
+
+    def test_expand_netlists(self):
+        filenames = batch.expand_netlists(["AutoSchaum/resources", "AutoSchaum/resources/*.crt", "missing.crt"])
+        self.assertIn("AutoSchaum/resources/node_voltage.crt", filenames)
+        self.assertEqual(len(filenames), len(set(filenames)))
+        self.assertEqual("missing.crt", filenames[-1])
+
+    def test_solve_netlist(self):
+        result = batch.solve_netlist(self.netlists[0])
+        self.assertEqual(batch.OK, result['status'])
+        self.assertAlmostEqual(result['node_voltages']['V(3)'][0], 0.757575757575758)
+        result = batch.solve_netlist("missing.crt")
+        self.assertEqual(batch.ERROR, result['status'])
+        self.assertIn('IOError', result['error'])
+
+    def test_timeout(self):
+        handle, filename = tempfile.mkstemp(suffix='.crt')
+        with os.fdopen(handle, 'w') as netlist_file:
+            netlist_file.write("Ladder\nV1 0 1 1\n")
+            for i in range(1, 400):  # a ladder far too large to solve symbolically within the timeout
+                netlist_file.write("RT{0} {0} {1} 1\nRB{0} {2} {3} 1\nRR{0} {1} {3} 2\n".format(
+                    i, i + 1, 0 if i == 1 else 400 + i - 1, 400 + i))
+        try:
+            result = batch.solve_netlist(filename, timeout=0.01)
+        finally:
+            os.remove(filename)
+        self.assertEqual(batch.TIMEOUT, result['status'])
+
+    def test_pool(self):
+        results = list(batch.solve_netlists(self.netlists + ["missing.crt"], processes=2, ordered=True))
+        self.assertEqual(self.netlists + ["missing.crt"], [result['netlist'] for result in results])
+        self.assertEqual([batch.OK, batch.OK, batch.ERROR], [result['status'] for result in results])
+        serial = list(batch.solve_netlists(self.netlists, mode='numeric', processes=1))
+        self.assertAlmostEqual(serial[0]['node_voltages']['V(1)'][0], results[0]['node_voltages']['V(1)'][0])
+
+if __name__ == '__main__':
+    unittest.main()
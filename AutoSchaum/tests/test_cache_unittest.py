@@ -0,0 +1,88 @@
+from nose2.compat import unittest
+import os
+import shutil
+import sys
+import tempfile
+from StringIO import StringIO
+from AutoSchaum.AutoSchaum import cache, solver
+
+class SolutionCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.my_cache = cache.SolutionCache(os.path.join(self.directory, 'cache'))
+        self.netlist_filename = "AutoSchaum/resources/node_voltage.crt"
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_netlist(self, name, lines):
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'w') as netlist_file:
+            netlist_file.write('\n'.join(lines))
+        return filename
+
+    def explain(self, solved):
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            solver.Teacher(solved).explain()
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def test_canonical_key(self):
+        first = self.write_netlist('first.crt', ["First", "V1 0 1 5", "R1 1 2 10", "R2 2 0 10"])
+        second = self.write_netlist('second.crt', ["Second", "* reordered", "R2   2 gnd 10", "", "V1 0 1 5",
+                                                   "R1 1 2 10"])
+        third = self.write_netlist('third.crt', ["First", "V1 0 1 5", "R1 1 2 10", "R2 2 0 20"])
+        self.assertEqual(cache.netlist_key(first), cache.netlist_key(second))
+        self.assertNotEqual(cache.netlist_key(first), cache.netlist_key(third))
+        self.assertNotEqual(cache.netlist_key(first), cache.netlist_key(first, 'numeric'))
+        top = self.write_netlist('top.crt', ["Top", "V1 0 1 5", "X1 1 cell", "R1 1 0 10", ".SUBCKT cell a",
+                                             "R2 a 0 10", ".ENDS"])
+        inside = self.write_netlist('inside.crt', ["Inside", "V1 0 1 5", "X1 1 cell", ".SUBCKT cell a", "R1 1 0 10",
+                                                   "R2 a 0 10", ".ENDS"])
+        self.assertNotEqual(cache.netlist_key(top), cache.netlist_key(inside))
+
+    def test_hit_feeds_teacher(self):
+        solved = self.my_cache.solve(self.netlist_filename)
+        cached = self.my_cache.solve(self.netlist_filename)
+        self.assertEqual((1, 1), (self.my_cache.hits, self.my_cache.misses))
+        self.assertIsNot(solved, cached)
+        self.assertIsNone(cached.circuit)
+        self.assertEqual(self.explain(solved), self.explain(cached))
+        self.assertEqual(solved.solution[-1].solved_subbed_eq, cached.solution[-1].solved_subbed_eq)
+
+    def test_numeric(self):
+        solved = self.my_cache.solve(self.netlist_filename, 'numeric')
+        cached = self.my_cache.solve(self.netlist_filename, 'numeric')
+        self.assertEqual(1, self.my_cache.hits)
+        self.assertEqual(solved.solution[-1].node_names, cached.solution[-1].node_names)
+        self.assertEqual(list(solved.solution[-1].node_voltages), list(cached.solution[-1].node_voltages))
+
+    def test_eviction(self):
+        self.my_cache.solve(self.netlist_filename)
+        self.my_cache.solve(self.netlist_filename, 'numeric')
+        oldest, newest = self.my_cache.entries()
+        os.utime(newest[0], (oldest[2] - 10, oldest[2] - 10))
+        self.my_cache.max_bytes = oldest[1]
+        self.my_cache.evict()
+        self.assertEqual([oldest[0]], [path for path, size, used in self.my_cache.entries()])
+
+    def test_topology_cache(self):
+        topology_cache = cache.TopologyCache()
+        with open(self.netlist_filename) as netlist_file:
+            lines = netlist_file.read().split('\n')
+        for r5 in [100, 200]:
+            filename = self.write_netlist('r5.crt', [line.replace("R5 0 3 100", "R5 0 3 {0}".format(r5))
+                                                     for line in lines])
+            cached = solver.Solver(solver.prepare_circuit(filename), topology_cache=topology_cache)
+            cached.solve()
+            solved = solver.Solver(solver.prepare_circuit(filename))
+            solved.solve()
+            for var, voltage in solved.solution[-1].solved_subbed_eq.items():
+                self.assertAlmostEqual(complex(voltage), cached.solution[-1].solved_subbed_eq[var])
+        self.assertEqual((1, 1), (topology_cache.hits, topology_cache.misses))
+        self.assertEqual([], cached.solution[-1].node_voltage_kcl)  # the equations were not generated on the hit
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 from nose2.compat import unittest
 import AutoSchaum.AutoSchaum.cursors as cursors
 import AutoSchaum.AutoSchaum.circuit as circuit
+import AutoSchaum.AutoSchaum.helper_funcs as helper_funcs
 
 def components_to_refdesigs(component_list):
     return [x.refdes for x in component_list]
@@ -15,7 +16,55 @@ class CircuitTest(unittest.TestCase):
                          len(self.my_circuit.nodedict))
         for node in self.my_circuit.nodedict.values():
             self.assertIsInstance(node, circuit.Node)
+
+    def test_neighbors(self):
+        self.my_circuit.create_nodes()
+        self.my_circuit.populate_nodes()
+        nodedict = self.my_circuit.nodedict
+        self.assertEqual([nodedict[1]], list(nodedict[0].neighbors))
+        self.assertEqual([nodedict[1]], nodedict[0].adjacent_nodes)
+        self.assertEqual([0, 1, 2], nodedict[0].adjacent[nodedict[1].index])
+        self.assertEqual(["R1", "R2", "V1"], components_to_refdesigs(nodedict[0].neighbors[nodedict[1]]))
+        self.assertEqual(["V2"], components_to_refdesigs(helper_funcs.connecting(nodedict[2], nodedict[1])))
+        self.assertEqual([], helper_funcs.connecting(nodedict[0], nodedict[2]))
+        self.assertEqual(["R1", "R2", "V1"], components_to_refdesigs(self.my_circuit.component_list[1].parallel()))
         
+    def test_create_branches(self):
+        other_circuit = circuit.Circuit("AutoSchaum/resources/node_voltage.crt")
+        other_circuit.create_nodes()
+        other_circuit.populate_nodes()
+        other_circuit.identify_nontrivial_nodes()
+        other_circuit.create_branches()
+        self.assertEqual([["Vb"], ["R5"], ["R6", "Va", "R1"], ["R2"], ["R3", "Vc"], ["R4"]],
+                         [components_to_refdesigs(branch.component_list) for branch in other_circuit.branchlist])
+        self.assertEqual([0, 6, 5, 1], [node.node_num for node in other_circuit.branchlist[2].nodelist])
+        self.assertEqual([0, 6, 5], [comp.node_current_in.node_num for comp in other_circuit.branchlist[2].component_list])
+        self.assertEqual([1, 2, 3, 4, 5, 6], [branch.branch_num for branch in other_circuit.branchlist])
+
+    def test_create_loop_branch(self):
+        loop = circuit.Circuit("AutoSchaum/resources/loop.crt")
+        loop.create_nodes()
+        loop.populate_nodes()
+        loop.identify_nontrivial_nodes()
+        loop.create_branches()
+        self.assertEqual(1, loop.num_branches)
+        self.assertEqual(["V1", "R1", "R2"], components_to_refdesigs(loop.branchlist[0].component_list))
+        self.assertEqual([0, 1, 2, 0], [node.node_num for node in loop.branchlist[0].nodelist])
+
+    def test_create_supernodes(self):
+        other_circuit = circuit.Circuit("AutoSchaum/resources/supernodes.crt")
+        other_circuit.create_nodes()
+        other_circuit.populate_nodes()
+        other_circuit.identify_nontrivial_nodes()
+        other_circuit.create_branches()
+        other_circuit.create_supernodes()
+        self.assertEqual([[0, 1, 2], [3, 4]],
+                         [[node.node_num for node in sn.nodelist] for sn in other_circuit.supernode_list])
+        self.assertEqual([0, 3], [sn.master_node.node_num for sn in other_circuit.supernode_list])
+        self.assertEqual([["V1"], ["V2"]], [components_to_refdesigs(branch.component_list)
+                                            for branch in other_circuit.supernode_list[0].branchlist])
+        self.assertEqual([0, 3, 5], sorted(other_circuit.reduced_nodedict))
+
 class CursorTest(unittest.TestCase):
     def setUp(self):
         self.my_node = circuit.Node(0)
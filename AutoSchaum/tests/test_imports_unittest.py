@@ -0,0 +1,9 @@
+from nose2.compat import unittest
+from AutoSchaum.AutoSchaum.benchmarks import bench_import
+
+class ImportTest(unittest.TestCase):
+    def test_headless_imports(self):
+        self.assertEqual([], bench_import.forbidden_imports())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+from nose2.compat import unittest
+import json
+import os
+import tempfile
+from AutoSchaum.AutoSchaum import instrument, solver
+
+
+class Staged(object):
+    def sizes(self):
+        return {}
+
+    @instrument.stage
+    def inner(self):
+        pass
+
+    @instrument.stage
+    def outer(self):
+        self.inner()
+
+
+class InstrumentTest(unittest.TestCase):
+    def solve(self, mode='symbolic'):
+        my_solver = solver.Solver(solver.prepare_circuit("AutoSchaum/resources/node_voltage.crt", mode), mode=mode)
+        my_solver.solve()
+        return my_solver
+
+    def test_memory_sink(self):
+        with instrument.recording(instrument.MemorySink()) as sink:
+            self.solve()
+        self.assertEqual([], instrument.sinks)
+        stages = [event['stage'] for event in sink.events]
+        self.assertIn('Circuit.populate_nodes', stages)
+        self.assertIn('Solver.gen_node_voltage_eq', stages)
+        self.assertEqual('Solver.solve', stages[-1])
+        last = sink.events[-1]
+        self.assertEqual(1, last['depth'])
+        self.assertGreaterEqual(last['wall'], sum(event['wall'] for event in sink.events if event['depth'] == 2))
+        self.assertEqual(7, last['sizes']['nodes'])
+        self.assertGreater(last['sizes']['equation_ops'], 0)
+        self.assertIsNone(last['error'])
+        self.assertEqual(1, sink.by_stage()['Solver.solve']['calls'])
+
+    def test_peak_growth(self):
+        peaks = iter([1000, 1500, 1500, 1800])  # before and after the outer stage wrap those of the inner one
+        peak_kb = instrument.peak_kb
+        instrument.peak_kb = lambda: next(peaks)
+        try:
+            with instrument.recording(instrument.MemorySink()) as sink:
+                Staged().outer()
+        finally:
+            instrument.peak_kb = peak_kb
+        inner, outer = sink.events
+        self.assertEqual((1500, 1500, 0), (inner['peak_kb_before'], inner['peak_kb_after'], inner['peak_growth_kb']))
+        self.assertEqual((1000, 1800, 800), (outer['peak_kb_before'], outer['peak_kb_after'], outer['peak_growth_kb']))
+
+    def test_disabled(self):
+        sink = instrument.MemorySink()
+        self.solve()
+        self.assertEqual([], sink.events)
+
+    def test_json_sink(self):
+        handle, filename = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        try:
+            sink = instrument.JSONSink(filename)
+            with instrument.recording(sink):
+                self.solve('numeric')
+            sink.close()
+            with open(filename) as events:
+                stages = [json.loads(line)['stage'] for line in events]
+        finally:
+            os.remove(filename)
+        self.assertIn('Solver.solve_numeric', stages)
+
+if __name__ == '__main__':
+    unittest.main()
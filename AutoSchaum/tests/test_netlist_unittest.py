@@ -0,0 +1,75 @@
+from nose2.compat import unittest
+from AutoSchaum.AutoSchaum import netlist, circuit
+
+class NetlistTest(unittest.TestCase):
+    def setUp(self):
+        self.my_netlist = netlist.parse_netlist(["Named Circuit\n",
+                                                 "* a comment\n",
+                                                 "V1 gnd in 5\n",
+                                                 "\n",
+                                                 "R1 in out 10\n",
+                                                 "# another comment\n",
+                                                 "R2 out 0 10\n",
+                                                 "R3 100000 out 10\n"])
+
+    def test_name(self):
+        self.assertEqual("Named Circuit", self.my_netlist.name)
+
+    def test_interned_nodes(self):
+        self.assertEqual([0, "in", "out", 100000], self.my_netlist.node_names)
+        self.assertEqual(4, self.my_netlist.num_nodes)
+        self.assertEqual(3, self.my_netlist.node_index[100000])
+
+    def test_elements(self):
+        self.assertEqual(["V1", "R1", "R2", "R3"], [element.refdes for element in self.my_netlist.elements])
+        self.assertEqual(netlist.Element("R2", 2, 0, "10"), self.my_netlist.elements[2])
+
+    def test_malformed_line(self):
+        self.assertRaises(ValueError, netlist.parse_netlist, ["Bad Circuit", "R1 0 1"])
+        self.assertRaises(ValueError, netlist.parse_netlist, ["Bad Circuit", "V(1) 0 1 5"])
+
+    def test_subcircuits(self):
+        parsed = netlist.parse_netlist(open("AutoSchaum/resources/subcircuits.crt"))
+        self.assertEqual(["cell", "half"], list(parsed.subcircuits))
+        self.assertEqual([0, "in", "mid", "out"], parsed.node_names)
+        cell, half = parsed.subcircuits["cell"], parsed.subcircuits["half"]
+        self.assertEqual(["a", "b"], cell.ports)
+        self.assertTrue(half.uses_ground)
+        self.assertTrue(cell.uses_ground)  # through the instance of half in its body
+        self.assertEqual(("in", "mid", 0), tuple(parsed.node_names[i] for i in parsed.instances[0].nodes))
+        self.assertEqual(["R1", "R2", "V1"], [element.refdes for element in cell.body.elements])
+        self.assertEqual(["X1"], [instance.refdes for instance in cell.body.instances])
+        flat = parsed.flattened()
+        self.assertEqual([], flat.instances)
+        self.assertEqual(["V1", "R1", "R.X1.R1", "R.X1.R2", "V.X1.V1", "R.X1.X1.R1", "R.X2.R1", "R.X2.R2",
+                          "V.X2.V1", "R.X2.X1.R1"], [element.refdes for element in flat.elements])
+        self.assertEqual([0, "in", "mid", "out", "X1.m", "X1.n", "X2.m", "X2.n"], flat.node_names)
+        self.assertEqual(("X1.n", 0), tuple(flat.node_names[i] for i in (flat.elements[5].neg, flat.elements[5].pos)))
+
+    def test_malformed_subcircuits(self):
+        self.assertRaises(ValueError, netlist.parse_netlist, ["Bad", "X1 1 2 missing"])
+        self.assertRaises(ValueError, netlist.parse_netlist, ["Bad", "X1 1 2 3 cell", ".SUBCKT cell a b", "R1 a b 1",
+                                                              ".ENDS"])
+        self.assertRaises(ValueError, netlist.parse_netlist, ["Bad", ".SUBCKT cell a b", "R1 a b 1"])
+        self.assertRaises(ValueError, netlist.parse_netlist, ["Bad", "X1 1 2 cell", ".SUBCKT cell a b",
+                                                              "X1 a b cell", ".ENDS"])
+
+    def test_parse_value(self):
+        self.assertEqual(10, netlist.parse_value("10"))
+        self.assertAlmostEqual(4.7e-6, netlist.parse_value("4.7uF"))
+        self.assertAlmostEqual(5e-3, netlist.parse_value("5mH"))
+        self.assertAlmostEqual(2e6, netlist.parse_value("2MEG"))
+        self.assertAlmostEqual(500, netlist.parse_value(".5k"))
+        self.assertRaises(ValueError, netlist.parse_value, "ten")
+
+    def test_circuit_nodes(self):
+        my_circuit = circuit.Circuit("AutoSchaum/resources/node_voltage.crt")
+        my_circuit.create_nodes()
+        my_circuit.populate_nodes()
+        self.assertEqual(7, my_circuit.num_nodes)
+        for index, node in enumerate(my_circuit.nodelist):
+            self.assertEqual(index, node.index)
+            self.assertIs(node, my_circuit.nodedict[node.node_num])
+
+if __name__ == '__main__':
+    unittest.main()
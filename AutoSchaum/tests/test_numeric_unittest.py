@@ -0,0 +1,182 @@
+from nose2.compat import unittest
+import os
+import tempfile
+import numpy
+from AutoSchaum.AutoSchaum import solver, circuit, numeric
+
+class NumericSolverTest(unittest.TestCase):
+    def setUp(self):
+        self.my_circuit = circuit.Circuit("AutoSchaum/resources/my_circuit.crt")
+        self.my_circuit.create_nodes()
+        self.my_circuit.populate_nodes()
+        self.my_other_circuit = circuit.Circuit("AutoSchaum/resources/node_voltage.crt")
+        self.my_other_circuit.create_nodes()
+        self.my_other_circuit.populate_nodes()
+        self.my_other_circuit.identify_nontrivial_nodes()
+        self.my_other_circuit.create_branches()
+
+    def test_admittance_matrix(self):
+        self.my_circuit.calc_admittance_matrix()
+        self.assertAlmostEqual(self.my_circuit.ym[0, 0], 1/10. + 1/15.)
+        self.assertAlmostEqual(self.my_circuit.ym[0, 1], -(1/10. + 1/15.))
+        self.assertAlmostEqual(self.my_circuit.ym[2, 2], 0)
+
+    def test_solve_numeric(self):
+        my_solver = solver.Solver(self.my_circuit, mode='numeric')
+        my_solver.solve()
+        self.assertAlmostEqual(my_solver.solution[-1].node_voltages[1], 1)
+        self.assertAlmostEqual(my_solver.solution[-1].node_voltages[2], 5)
+        self.assertAlmostEqual(my_solver.solution[-1].component_currents[0], 0.1)
+        self.assertAlmostEqual(my_solver.solution[-1].component_currents[2], -(1/10. + 1/15.))
+
+    def test_matches_symbolic(self):
+        my_solver = solver.Solver(self.my_other_circuit, mode='numeric')
+        my_solver.solve()
+        voltages = my_solver.solution[-1].node_voltages
+        nodedict = self.my_other_circuit.nodedict
+        self.assertAlmostEqual(voltages[nodedict[1].index], 16.2121212121212)
+        self.assertAlmostEqual(voltages[nodedict[2].index], 10)
+        self.assertAlmostEqual(voltages[nodedict[3].index], 0.757575757575758)
+        branch_currents = my_solver.solution[-1].branch_currents
+        self.assertEqual(len(branch_currents), len(self.my_other_circuit.branchlist))
+
+    def test_sweep(self):
+        my_solver = solver.Solver(self.my_other_circuit, mode='numeric')
+        voltages, branch_currents = my_solver.sweep({'R5': [100, 200], 'Vb': [10, 20]})
+        self.assertEqual(voltages.shape, (2, self.my_other_circuit.num_nodes))
+        self.assertEqual(branch_currents.shape, (2, len(self.my_other_circuit.branchlist)))
+        nodedict = self.my_other_circuit.nodedict
+        self.assertAlmostEqual(voltages[0, nodedict[2].index], 10)
+        self.assertAlmostEqual(voltages[1, nodedict[2].index], 20)
+        for row, (r5, vb) in enumerate([(100, 10), (200, 20)]):
+            for comp in self.my_other_circuit.component_list:
+                if comp.refdes == 'R5':
+                    comp.z, comp.y = r5, 1./r5
+                elif comp.refdes == 'Vb':
+                    comp.v = vb
+            my_solver.solve_numeric()
+            for node_index in range(self.my_other_circuit.num_nodes):
+                self.assertAlmostEqual(voltages[row, node_index], my_solver.solution[-1].node_voltages[node_index])
+            for branch_index in range(len(self.my_other_circuit.branchlist)):
+                self.assertAlmostEqual(branch_currents[row, branch_index],
+                                       my_solver.solution[-1].branch_currents[branch_index])
+
+    def test_sweep_reactive(self):
+        rlc = circuit.Circuit("AutoSchaum/resources/rlc.crt")
+        rlc.create_nodes()
+        rlc.populate_nodes()
+        rlc.set_frequency(1e3)
+        my_solver = solver.Solver(rlc, mode='numeric')
+        my_solver.set_reference_voltage(rlc.nodedict[0])
+        voltages, branch_currents = my_solver.sweep({'C1': [2e-6], 'L1': [20e-3]})
+        my_solver.update_value('C1', 2e-6)
+        self.assertTrue(numpy.allclose(voltages[0], my_solver.update_value('L1', 20e-3)))
+
+    def test_sweep_errors(self):
+        my_solver = solver.Solver(self.my_other_circuit, mode='numeric')
+        self.assertRaises(ValueError, my_solver.sweep, {'R99': [1, 2]})
+        self.assertRaises(ValueError, my_solver.sweep, {'R5': [1, 2], 'Vb': [1]})
+
+    def test_sweep_npz(self):
+        my_solver = solver.Solver(self.my_other_circuit, mode='numeric')
+        handle, filename = tempfile.mkstemp(suffix='.npz')
+        os.close(handle)
+        try:
+            voltages, branch_currents = my_solver.sweep({'R5': [100, 200]}, filename)
+            saved = numpy.load(filename)
+            self.assertTrue(numpy.allclose(saved['node_voltages'], voltages))
+            self.assertTrue(numpy.allclose(saved['branch_currents'], branch_currents))
+        finally:
+            os.remove(filename)
+
+    def test_ac_sweep(self):
+        rlc = circuit.Circuit("AutoSchaum/resources/rlc.crt")
+        rlc.create_nodes()
+        rlc.populate_nodes()
+        my_solver = solver.Solver(rlc, mode='numeric')
+        my_solver.set_reference_voltage(rlc.nodedict[0])
+        frequencies = numpy.logspace(0, 6, 50)
+        voltages = my_solver.ac_sweep(frequencies)
+        self.assertEqual((50, rlc.num_nodes), voltages.shape)
+        omega = 2*numpy.pi*frequencies
+        z_c, z_l = 1/(1j*omega*1e-6), 1j*omega*10e-3 + 50
+        z_parallel = z_c*z_l/(z_c + z_l)
+        self.assertTrue(numpy.allclose(voltages[:, rlc.nodedict[2].index], z_parallel/(1000 + z_parallel)))
+        rlc.set_frequency(frequencies[10])
+        my_solver.solve_numeric()
+        self.assertAlmostEqual(voltages[10, rlc.nodedict[3].index],
+                               my_solver.solution[-1].node_voltages[rlc.nodedict[3].index])
+
+    def test_update_value(self):
+        my_solver = solver.Solver(self.my_other_circuit, mode='numeric')
+        my_solver.set_reference_voltage(self.my_other_circuit.nodedict[0])
+        nodedict = self.my_other_circuit.nodedict
+        y_connected = nodedict[3].y_connected
+        for refdes, value in [('R5', 200), ('Vb', 20), ('R1', 5), ('R5', 50), ('Va', 1+1j)]:
+            voltages = my_solver.update_value(refdes, value)
+        currents = my_solver.solution[-1].component_currents
+        self.assertAlmostEqual(y_connected + 1/50. - 1/100., nodedict[3].y_connected)
+        my_solver.solve_numeric()
+        self.assertTrue(numpy.allclose(voltages, my_solver.solution[-1].node_voltages))
+        self.assertTrue(numpy.allclose(currents, my_solver.solution[-1].component_currents))
+        self.assertRaises(ValueError, my_solver.update_value, 'R99', 1)
+
+    def test_subcircuits(self):
+        hierarchical = solver.prepare_circuit("AutoSchaum/resources/subcircuits.crt", 'numeric')
+        flat = solver.prepare_circuit("AutoSchaum/resources/subcircuits_flat.crt", 'numeric')
+        self.assertEqual(4, hierarchical.num_nodes)  # the nodes inside the instances are not part of the system
+        voltages = []
+        for my_circuit in (hierarchical, flat):
+            my_solver = solver.Solver(my_circuit, mode='numeric')
+            my_solver.solve()
+            voltages.append([my_solver.solution[-1].node_voltages[my_circuit.nodedict[name].index]
+                             for name in [0, 'in', 'mid', 'out']])
+        self.assertTrue(numpy.allclose(voltages[1], voltages[0]))
+        definition = hierarchical.instance_list[0].definition
+        self.assertIs(definition, hierarchical.instance_list[1].definition)
+        self.assertEqual([hierarchical.store.omega], list(definition.equivalents))  # reduced once for both
+        equivalent = definition.equivalents[hierarchical.store.omega]
+        self.assertTrue(numpy.allclose(0, equivalent.y.sum(axis=0)))
+        self.assertAlmostEqual(0, equivalent.j.sum())
+        symbolic = solver.Solver(solver.prepare_circuit("AutoSchaum/resources/subcircuits.crt"))  # flattened
+        symbolic.solve()
+        solved = symbolic.solution[-1].solved_subbed_eq
+        for name, flat_name in [('X1.m', 'm1'), ('X2.m', 'm2')]:  # my_solver solved the flat circuit last
+            self.assertAlmostEqual(my_solver.solution[-1].node_voltages[flat.nodedict[flat_name].index],
+                                   complex(solved[symbolic.circuit.symbols.voltage(symbolic.circuit.nodedict[name])]))
+        equivalents = symbolic.thevenin([('out', 0)])
+        self.assertIn('R.X2.X1.R1', set(str(symbol) for symbol in equivalents[0].voltage.free_symbols))
+        values = symbolic.known_substitutions()
+        self.assertAlmostEqual(voltages[0][3], complex(equivalents[0].voltage.subs(values)))
+        unflattened = circuit.Circuit("AutoSchaum/resources/subcircuits.crt")
+        unflattened.create_nodes()
+        unflattened.populate_nodes()
+        unflattened.identify_nontrivial_nodes()
+        unflattened.create_branches()
+        unflattened.create_supernodes()
+        unflattened.identify_nontrivial_nonsuper_nodes()
+        rejected = solver.Solver(unflattened)
+        self.assertRaises(NotImplementedError, rejected.solve)
+        self.assertRaises(NotImplementedError, rejected.thevenin, [('out', 0)])
+        self.assertEqual([None, None], [rejected.find_step(name) for name in ('choose_method', 'thevenin')])
+
+    def test_unsupported_component(self):
+        self.my_circuit.component_list.append(circuit.components.CurrentSource(
+            (self.my_circuit.nodedict[0], self.my_circuit.nodedict[1]), 'I1'))
+        self.assertRaises(NotImplementedError, numeric.NodalSystem, self.my_circuit, self.my_circuit.nodedict[0])
+
+    def test_component_store(self):
+        store = self.my_circuit.store
+        self.assertEqual(len(self.my_circuit.component_list), store.size)
+        for row, comp in enumerate(self.my_circuit.component_list):
+            self.assertEqual(row, comp.index)
+            self.assertEqual(comp.refdes, store.refdes[row])
+            self.assertEqual((comp.neg.index, comp.pos.index), (store.neg[row], store.pos[row]))
+        resistor = self.my_circuit.component_list[0]
+        self.assertFalse(hasattr(resistor, '__dict__'))
+        resistor.set_value(20)
+        self.assertEqual(20, store.value[resistor.index])
+        self.assertAlmostEqual(1/20., numeric.NodalSystem(self.my_circuit, self.my_circuit.nodedict[0]).admittances()[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,7 +24,148 @@ class SolverTest(unittest.TestCase):
         self.assertEqual(self.my_solver.circuit.nodedict[1].voltage, 1)
         self.assertEqual(self.my_solver.circuit.nodedict[2].voltage, 5)
         self.assertEqual(self.my_other_solver.circuit.nodedict[2].voltage, 10)
-        
+
+    def test_history_is_journaled(self):
+        self.my_solver.identify_voltages()
+        self.my_solver.set_reference_voltage(self.my_circuit.nodedict[0])
+        self.assertEqual(3, len(self.my_solver.solution))
+        self.assertIs(self.my_solver.solution[0].circuit, self.my_solver.solution[-1].circuit)
+        self.assertEqual({}, self.my_solver.solution[0].voltages)
+        self.assertEqual({0: 0, 1: 1, 2: 5}, self.my_solver.find_step('identify_voltages').voltages)
+        replayed = list(self.my_solver.replay())
+        self.assertEqual({}, replayed[0][1])
+        self.assertEqual(5, replayed[-1][1][2])
+        self.assertEqual('set_reference_voltage', replayed[-1][0].name)
+
+    def test_no_history(self):
+        my_solver = solver.Solver(self.my_circuit, keep_history=False)
+        my_solver.identify_voltages()
+        my_solver.set_reference_voltage(self.my_circuit.nodedict[0])
+        self.assertEqual(1, len(my_solver.solution))
+        self.assertEqual(5, my_solver.find_step('identify_voltages').voltages[2])
+
+    def test_mesh_matches_nodal(self):
+        nodal = solver.Solver(solver.prepare_circuit("AutoSchaum/resources/node_voltage.crt"), method='nodal')
+        nodal.solve()
+        mesh = solver.Solver(solver.prepare_circuit("AutoSchaum/resources/node_voltage.crt"), method='mesh')
+        mesh.solve()
+        loops = mesh.circuit.looplist
+        endpoints = set(node for branch in mesh.circuit.branchlist for node in branch.ending_nodes())
+        self.assertEqual(mesh.circuit.num_branches - len(endpoints) + 1, len(loops))
+        self.assertEqual(len(loops), len(mesh.solution[-1].mesh_eqs))
+        for loop in loops:  # each loop closes: it ends on the node it started from
+            branch, direction = loop.branches[0]
+            start = branch.nodelist[0] if direction == 1 else branch.nodelist[-1]
+            node = start
+            for branch, direction in loop.branches:
+                node = branch.nodelist[-1] if direction == 1 else branch.nodelist[0]
+            self.assertIs(start, node)
+        for var, voltage in nodal.solution[-1].solved_subbed_eq.items():
+            self.assertAlmostEqual(complex(voltage), complex(mesh.solution[-1].solved_subbed_eq[var]))
+        self.assertEqual([], [branch for branch in mesh.circuit.branchlist if not branch.current_is_defined()])
+        self.assertRaises(ValueError, solver.Solver, mesh.circuit, method='loop')
+
+    def test_source_named_like_node(self):
+        numeric = solver.Solver(solver.prepare_circuit("AutoSchaum/resources/source_names.crt", 'numeric'),
+                                mode='numeric')
+        numeric.solve()
+        nodedict = numeric.circuit.nodedict
+        self.assertAlmostEqual(13/3., numeric.solution[-1].node_voltages[nodedict[2].index])
+        for method in ('nodal', 'mesh'):  # the source V2 and the voltage of node 2, V(2), are different symbols
+            my_solver = solver.Solver(solver.prepare_circuit("AutoSchaum/resources/source_names.crt"), method=method)
+            my_solver.solve()
+            voltage = my_solver.solution[-1].solved_subbed_eq[my_solver.circuit.symbols.voltage(
+                my_solver.circuit.nodedict[2])]
+            self.assertAlmostEqual(13/3., complex(voltage))
+
+    def test_choose_method(self):
+        nodal = solver.Solver(solver.prepare_circuit("AutoSchaum/resources/node_voltage.crt"))
+        self.assertEqual('nodal', nodal.choose_method())
+        cube = solver.Solver(solver.prepare_circuit("AutoSchaum/resources/cube.crt"))
+        costs = cube.predict_costs()
+        self.assertEqual((7, 5), (costs['nodal']['unknowns'], costs['mesh']['unknowns']))
+        cube.solve()
+        self.assertEqual('mesh', cube.find_step('choose_method').method)
+        self.assertIn('5 loop currents', cube.find_step('choose_method').method_reason)
+        self.assertEqual(5, len(cube.solution[-1].mesh_eqs))
+        forced = solver.Solver(solver.prepare_circuit("AutoSchaum/resources/cube.crt"), method='nodal')
+        forced.solve()
+        self.assertEqual('nodal', forced.find_step('choose_method').method)
+        for var, voltage in forced.solution[-1].solved_subbed_eq.items():
+            self.assertAlmostEqual(complex(voltage), complex(cube.solution[-1].solved_subbed_eq[var]))
+        ladder = solver.Solver(solver.prepare_circuit("AutoSchaum/resources/ladder.crt"))
+        self.assertTrue(ladder.trivial_reference())  # node 0 lies inside the branch 2-1-0-5
+        self.assertEqual(['mesh'], list(ladder.predict_costs()))
+        ladder.solve()
+        self.assertEqual('mesh', ladder.find_step('choose_method').method)
+        self.assertIn('inside a branch', ladder.find_step('choose_method').method_reason)
+        self.assertEqual([], [var for var, voltage in ladder.solution[-1].solved_subbed_eq.items()
+                              if voltage.free_symbols])
+        forced = solver.Solver(solver.prepare_circuit("AutoSchaum/resources/ladder.crt"), method='nodal')
+        self.assertRaises(ValueError, forced.solve)
+        supernodes = solver.Solver(solver.prepare_circuit("AutoSchaum/resources/supernodes.crt"))
+        self.assertEqual([[3, 4]], [[node.node_num for node in sn.nodelist] for sn in supernodes.floating_supernodes()])
+        self.assertEqual(['mesh'], list(supernodes.predict_costs()))
+        supernodes.solve()
+        self.assertEqual('mesh', supernodes.find_step('choose_method').method)
+        self.assertIn('do not hold node 0', supernodes.find_step('choose_method').method_reason)
+        numeric = solver.Solver(solver.prepare_circuit("AutoSchaum/resources/supernodes.crt", 'numeric'),
+                                mode='numeric')
+        numeric.solve()
+        for node_num, node in numeric.circuit.nodedict.items():
+            self.assertAlmostEqual(numeric.solution[-1].node_voltages[node.index],
+                                   complex(supernodes.circuit.nodedict[node_num].voltage))
+        forced = solver.Solver(solver.prepare_circuit("AutoSchaum/resources/supernodes.crt"), method='nodal')
+        self.assertRaises(ValueError, forced.solve)
+
+    def test_thevenin(self):
+        values = {'V1': 10, 'R1': 5, 'R2': 5}
+        pairs = [(2, 0), (1, 2), (0, 2)]
+        for mode in ('numeric', 'symbolic'):
+            my_solver = solver.Solver(solver.prepare_circuit("AutoSchaum/resources/loop.crt", mode), mode=mode)
+            equivalents = my_solver.thevenin(pairs)
+            self.assertIs(equivalents, my_solver.find_step('thevenin').equivalents)
+            self.assertEqual(pairs, [(eq.pos, eq.neg) for eq in equivalents])
+            if mode == 'symbolic':
+                self.assertEqual(set(['V1', 'R1', 'R2']),
+                                 set(str(symbol) for symbol in equivalents[0].voltage.free_symbols))
+                equivalents = [solver.Equivalent(eq.pos, eq.neg, complex(eq.voltage.subs(values)),
+                                                 complex(eq.impedance.subs(values))) for eq in equivalents]
+            for equivalent, voltage in zip(equivalents, [5, 5, -5]):
+                self.assertAlmostEqual(voltage, equivalent.voltage)
+                self.assertAlmostEqual(2.5, equivalent.impedance)
+                self.assertAlmostEqual(voltage/2.5, equivalent.current)
+        self.assertRaises(ValueError, my_solver.thevenin, [(2, 'nowhere')])
+
+    def test_series_parallel(self):
+        full = solver.Solver(solver.prepare_circuit("AutoSchaum/resources/series_parallel.crt"), method='nodal')
+        full.solve()
+        reduced = solver.Solver(solver.prepare_circuit("AutoSchaum/resources/series_parallel.crt"), method='nodal',
+                                series_parallel=True)
+        reduced.solve()
+        self.assertEqual([('Zeq1', 'parallel', [['R2'], ['R3'], ['R4', 'R5'], ['R6']])],
+                         reduced.find_step('reduce_series_parallel').reductions)
+        self.assertEqual([2], [len(exps) for exps in reduced.solution[-1].node_voltage_kcl])
+        self.assertEqual([5], [len(exps) for exps in full.solution[-1].node_voltage_kcl])
+        for var, voltage in full.solution[-1].solved_subbed_eq.items():
+            self.assertAlmostEqual(complex(voltage), complex(reduced.solution[-1].solved_subbed_eq[var]))
+        nodes = reduced.circuit.nodedict
+        self.assertAlmostEqual(400/130.0, abs(nodes[2].voltage))
+        self.assertAlmostEqual(nodes[2].voltage/2, nodes[3].voltage)
+        for comp in reduced.circuit.component_list:
+            if comp.refdes in ('R2', 'R3', 'R4', 'R5', 'R6'):
+                self.assertAlmostEqual(comp.z*comp.current, comp.voltage)
+        closed = solver.Solver(solver.prepare_circuit("AutoSchaum/resources/series_parallel.crt"), method='nodal')
+        closed.set_reference_voltage(closed.circuit.nodedict[0])
+        closed.identify_voltages()
+        closed.identify_currents()
+        closed.reduce_series_parallel()
+        closed.gen_node_voltage_eq()
+        closed.solve_eqs()
+        self.assertEqual(set(['V(0)', 'V1', 'R1', 'R2', 'R3', 'R4', 'R5', 'R6']),
+                         set(str(symbol) for expr in closed.solution[-1].solved_eq.values()
+                             for symbol in expr.free_symbols))
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,69 @@
+from nose2.compat import unittest
+import numpy
+import sympy
+from AutoSchaum.AutoSchaum import solver, circuit, symbolic
+
+class SymbolicSolverTest(unittest.TestCase):
+    def setUp(self):
+        self.my_circuit = circuit.Circuit("AutoSchaum/resources/node_voltage.crt")
+        self.my_circuit.create_nodes()
+        self.my_circuit.populate_nodes()
+        self.my_circuit.identify_nontrivial_nodes()
+        self.my_circuit.create_branches()
+        self.my_circuit.create_supernodes()
+        self.my_circuit.identify_nontrivial_nonsuper_nodes()
+        self.my_solver = solver.Solver(self.my_circuit)
+        self.my_solver.set_reference_voltage(self.my_circuit.nodedict[0])
+        self.my_solver.identify_voltages()
+        self.my_solver.identify_currents()
+        self.my_solver.gen_node_voltage_eq()
+        self.my_solver.determine_known_vars()
+
+    def test_equations_match_strings(self):
+        step = self.my_solver.solution[-1]
+        self.assertEqual(len(step.node_voltage_eqs), len(step.node_voltage_eqs_str))
+        node_voltage = dict(V=lambda node_num: self.my_circuit.symbols.voltage(self.my_circuit.nodedict[int(node_num)]))
+        for eq, eq_str in zip(step.node_voltage_eqs, step.node_voltage_eqs_str):
+            self.assertEqual(sympy.sympify(eq_str, locals=node_voltage), eq)
+        self.assertIs(self.my_circuit.symbols.voltage(self.my_circuit.nodedict[1]),
+                      self.my_circuit.symbols.symbol('V(1)'))
+
+    def test_solve_subbed_eqs(self):
+        self.my_solver.sub_into_eqs()
+        self.my_solver.solve_subbed_eqs()
+        solved = self.my_solver.solution[-1].solved_subbed_eq
+        self.assertEqual([sympy.Symbol('V(1)'), sympy.Symbol('V(3)')], sorted(solved, key=str))
+        self.assertAlmostEqual(complex(solved[sympy.Symbol('V(1)')]), 16.2121212121212)
+        self.assertAlmostEqual(complex(solved[sympy.Symbol('V(3)')]), 0.757575757575758)
+
+    def test_solve_eqs(self):
+        self.my_solver.solve_eqs()
+        solved = self.my_solver.solution[-1].solved_eq
+        known = self.my_solver.solution[-1].known_vars
+        self.assertAlmostEqual(complex(solved[sympy.Symbol('V(1)')].subs(known)), 16.2121212121212)
+        self.assertAlmostEqual(complex(solved[sympy.Symbol('V(3)')].subs(known)), 0.757575757575758)
+        self.assertEqual(set(), solved[sympy.Symbol('V(3)')].free_symbols - {var for var, value in known})
+
+    def test_compile_solution(self):
+        self.my_solver.solve_eqs()
+        compiled = self.my_solver.compile_solution()
+        self.assertIs(compiled, self.my_solver.compile_solution())
+        voltages = self.my_solver.evaluate_solution({'R5': numpy.array([100, 200]), 'R1': 10})
+        self.assertEqual((2,), voltages[sympy.Symbol('V(3)')].shape)
+        self.assertAlmostEqual(voltages[sympy.Symbol('V(1)')][0], 16.2121212121212)
+        self.assertAlmostEqual(voltages[sympy.Symbol('V(3)')][0], 0.757575757575758)
+        known = self.my_solver.known_substitutions()
+        known[sympy.Symbol('R5')] = 200
+        self.assertAlmostEqual(voltages[sympy.Symbol('V(3)')][1],
+                               complex(self.my_solver.solution[-1].solved_eq[sympy.Symbol('V(3)')].xreplace(known)))
+        self.assertRaises(ValueError, compiled, {sympy.Symbol('R5'): 100})
+
+    def test_partly_symbolic(self):
+        values = dict((var, value) for var, value in self.my_solver.solution[-1].known_vars if str(var) != 'R5')
+        solved = symbolic.NodalEquations(self.my_solver.solution[-1].node_voltage_kcl, self.my_solver.unknown_nodes(),
+                                         values).solve()
+        self.assertEqual({sympy.Symbol('R5')}, solved[sympy.Symbol('V(3)')].free_symbols)
+        self.assertAlmostEqual(complex(solved[sympy.Symbol('V(3)')].subs('R5', 100)), 0.757575757575758)
+
+if __name__ == '__main__':
+    unittest.main()